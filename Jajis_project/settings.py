@@ -3,6 +3,7 @@ from pathlib import Path
 
 
 import os
+import sys
 
 from dotenv import load_dotenv
 
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'app',
     'rest_framework',
     'rest_framework.authtoken',
@@ -58,13 +60,18 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication",
-    ]
+    ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "app.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -103,10 +110,19 @@ DATABASES = {
     "default": dj_database_url.config(
         default=os.getenv("DATABASE_URL"),
         conn_max_age=600,
-        ssl_require=True,
+        ssl_require=os.getenv("DATABASE_SSL_REQUIRE", "True") == "True",
     )
 }
 
+if DATABASES["default"].get("ENGINE") == "django.db.backends.sqlite3" and "test" in sys.argv:
+    # the threaded cart tests need concurrent writers to wait on SQLite's
+    # lock instead of failing at once: transactions take the write lock up
+    # front (a read lock can't be upgraded while another writer waits), and
+    # a file replaces the in-memory default, whose table locks ignore the
+    # busy timeout
+    DATABASES["default"].setdefault("OPTIONS", {}).update(transaction_mode="IMMEDIATE", timeout=30)
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
+
 
 
 
@@ -115,15 +131,29 @@ DATABASES = {
 
 REDIS_URL = os.getenv("REDIS_URL")
 
-CACHES = {
-    "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": REDIS_URL,
-        "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            }
         }
     }
-}
+else:
+    # Local development / test runs without Redis
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Carts: "database" (CartItem rows) or "redis" (hashes in CART_REDIS_URL,
+# written back to the rows in the background and at checkout; without a
+# URL an in-process stand-in, for single-process development only)
+CART_STORAGE = os.getenv("CART_STORAGE", "database")
+CART_REDIS_URL = os.getenv("CART_REDIS_URL", REDIS_URL)
 
 # Use Redis for sessions (recommended for ecommerce)
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
@@ -188,7 +218,7 @@ MEDIA_URL = "/media/"
 
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": "app.storage.ResponsiveCloudinaryStorage",
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -6,3 +6,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Jajis_project.settings')
 
 application = get_wsgi_application()
+
+# Build per-worker in-memory indexes and page snapshots before the first request
+from app.cartstore import cart_flusher  # noqa: E402
+from app.geo import salon_locator  # noqa: E402
+from app.snapshots import content_snapshot  # noqa: E402
+from app.suggest import suggest_index  # noqa: E402
+
+suggest_index.warm()
+content_snapshot.warm()
+salon_locator.warm()
+# Write carts kept in Redis (CART_STORAGE = "redis") back to the database
+cart_flusher.start()
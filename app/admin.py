@@ -4,8 +4,9 @@ from django.db.models import Sum, F, DecimalField, ExpressionWrapper
 from django.contrib.auth.models import Group, User
 from django.contrib.auth.admin import GroupAdmin, UserAdmin
 
+from .storage import image_url
 from .models import (
-    BannerImage, Saloon, FoodMenu, Cosmetics, Courses,
+    BannerImage, Saloon, SaloonImage, FoodMenu, Cosmetics, Courses,
     Category, Product, ProductVariant,
     Cart, CartItem, Wishlist, WishlistItem,
     Address, Order, OrderItem, PaymentTransaction
@@ -22,7 +23,7 @@ def _thumb(img_field, size=56):
         return "-"
     return format_html(
         '<img src="{}" style="width:{}px;height:{}px;object-fit:cover;border-radius:8px;border:1px solid #e5e7eb;" />',
-        img_field.url, size, size
+        image_url(img_field, "thumb"), size, size
     )
 
 
@@ -57,8 +58,21 @@ class BannerImageAdmin(admin.ModelAdmin):
     preview.short_description = "Image"
 
 
+class SaloonImageInline(admin.TabularInline):
+    model = SaloonImage
+    extra = 1
+    fields = ("preview", "image", "position")
+    readonly_fields = ("preview",)
+    ordering = ("position", "id")
+
+    def preview(self, obj):
+        return _thumb(obj.image)
+    preview.short_description = "Image"
+
+
 @admin.register(Saloon)
 class SaloonAdmin(admin.ModelAdmin):
+    inlines = (SaloonImageInline,)
     list_display = ("id", "name", "location", "preview")
     search_fields = ("name", "location")
     readonly_fields = ("preview",)
@@ -139,18 +153,19 @@ class ProductAdmin(admin.ModelAdmin):
 
     list_display = (
         "id", "preview", "title", "category", "brand",
-        "variants_count", "total_stock", "created_at", "updated_at"
+        "variants_count", "lowest_price", "total_stock", "created_at", "updated_at"
     )
     list_filter = ("category", "brand", "created_at")
     search_fields = ("title", "description", "brand")
     autocomplete_fields = ("category",)
-    readonly_fields = ("preview", "created_at", "updated_at")
+    readonly_fields = ("preview", "lowest_price", "highest_price", "total_stock", "created_at", "updated_at")
     ordering = ("-created_at",)
     date_hierarchy = "created_at"
 
     fieldsets = (
         ("Product", {"fields": ("title", "category", "brand", "description")}),
         ("Images", {"fields": ("preview", "image1", "image2", "image3", "image4")}),
+        ("Pricing & stock", {"fields": ("lowest_price", "highest_price", "total_stock")}),
         ("Timestamps", {"fields": ("created_at", "updated_at")}),
     )
 
@@ -162,10 +177,6 @@ class ProductAdmin(admin.ModelAdmin):
         return obj.variants.count()
     variants_count.short_description = "Variants"
 
-    def total_stock(self, obj):
-        return sum(v.stock for v in obj.variants.all())
-    total_stock.short_description = "Total stock"
-
     def has_delete_permission(self, request, obj=None):
         return True
 
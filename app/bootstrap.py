@@ -0,0 +1,144 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils.http import quote_etag
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .cache import (
+    BANNER, CATALOG, COURSES, FOOD, RESPONSE_CACHE_TIMEOUT, SALONS, conditional_response,
+    get_last_modified, response_cache_key, validator_headers,
+)
+from .fastpath import paginate_representation
+from .models import Category, Product
+from .pagination import ProductCursorPagination
+from .serializers import CategorySerializer, ProductListSerializer, absolute_url_prefix
+from .snapshots import academy_page, food_court_page, home_page, salons_page
+
+
+# ======================================================
+# APP BOOTSTRAP
+# ======================================================
+#
+# Everything the app's landing screen needs in one round trip. Sections
+# are independent: each is cached under its own namespace version (so a
+# new course doesn't rebuild the product page), and the ones missing from
+# the cache are built concurrently, one DB connection per worker thread.
+
+BOOTSTRAP_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=BOOTSTRAP_WORKERS, thread_name_prefix="bootstrap")
+
+
+def _banner(request):
+    return home_page(request)["video"]
+
+
+def _salons(request):
+    return salons_page(request)["data"]
+
+
+def _courses(request):
+    return academy_page(request)["data"]
+
+
+def _food(request):
+    return food_court_page(request)["data"]
+
+
+def _categories(request):
+    return CategorySerializer(Category.objects.all(), many=True).data
+
+
+def _products(request):
+    """First page of /api/products/?page_size=…, `next` links back there."""
+    products = ProductListSerializer.setup_eager_loading(Product.objects.all())
+    paginator = ProductCursorPagination()
+    serializer = ProductListSerializer(products, many=True, context={"request": request})
+    page = paginate_representation(serializer, paginator, request)
+    return {
+        "next": paginator.get_next_link(),
+        "products": page,
+    }
+
+
+# name -> (namespace, build(request))
+BOOTSTRAP_SECTIONS = {
+    "banner": (BANNER, _banner),
+    "salons": (SALONS, _salons),
+    "courses": (COURSES, _courses),
+    "food": (FOOD, _food),
+    "categories": (CATALOG, _categories),
+    "products": (CATALOG, _products),
+}
+
+
+def _section_request(request):
+    """
+    A bare GET for /api/products/ on the caller's host: sections don't
+    depend on the caller's query string (their cache keys don't either),
+    and each worker thread gets a request object of its own.
+    """
+    http_request = HttpRequest()
+    http_request.method = "GET"
+    http_request.META = {**request.META, "QUERY_STRING": ""}
+    http_request.path = http_request.path_info = reverse("product-list")
+    http_request._absolute_url_prefix = absolute_url_prefix(request)
+    return Request(http_request)
+
+
+def _build_in_thread(build, request):
+    close_old_connections()
+    try:
+        return build(request)
+    finally:
+        close_old_connections()
+
+
+def build_sections(request, names):
+    """{name: data} for the given sections, built concurrently."""
+    if len(names) < 2 or connection.in_atomic_block:
+        # inside a transaction other connections can't see its writes
+        return {name: BOOTSTRAP_SECTIONS[name][1](_section_request(request)) for name in names}
+    futures = {
+        name: _executor.submit(_build_in_thread, BOOTSTRAP_SECTIONS[name][1], _section_request(request))
+        for name in names
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def bootstrap_response(request):
+    """
+    The combined payload, with an ETag over every section's versioned key
+    and Last-Modified of the most recently changed namespace.
+    """
+    keys = {
+        name: response_cache_key(namespace, f"bootstrap-{name}", request)
+        for name, (namespace, _) in BOOTSTRAP_SECTIONS.items()
+    }
+    etag = quote_etag(hashlib.md5("|".join(keys.values()).encode(), usedforsecurity=False).hexdigest())
+    last_modified = max(get_last_modified(namespace) for namespace, _ in BOOTSTRAP_SECTIONS.values())
+
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    # values are boxed in a 1-tuple: a section can be None (no banner),
+    # which some backends' get_many can't tell apart from a miss
+    cached = cache.get_many(keys.values())
+    data = {name: cached[key][0] for name, key in keys.items() if key in cached}
+    missing = [name for name in keys if name not in data]
+    if missing:
+        built = build_sections(request, missing)
+        cache.set_many({keys[name]: (built[name],) for name in missing}, RESPONSE_CACHE_TIMEOUT)
+        data.update(built)
+
+    response = Response({name: data[name] for name in BOOTSTRAP_SECTIONS})
+    response["X-Cache"] = "MISS" if missing else "HIT"
+    for header, value in validator_headers(etag, last_modified).items():
+        response[header] = value
+    return response
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+# ======================================================
+# VERSIONED RESPONSE CACHE
+# ======================================================
+#
+# Each namespace ("catalog", "salons", ...) has a version counter in the
+# shared cache. Model signals bump it, which orphans every cached entry and
+# ETag of that namespace at once (old entries age out via TTL) without
+# scanning or deleting keys. The bump also records when the namespace last
+# changed, which is served as Last-Modified.
+
+CATALOG = "catalog"
+BANNER = "banner"
+SALONS = "salons"
+COURSES = "courses"
+FOOD = "food"
+COSMETICS = "cosmetics"
+# typeahead labels only (titles, brands, category names); not a response cache
+SUGGEST = "suggest"
+
+RESPONSE_CACHE_TIMEOUT = 60 * 15
+# clients keep versioned responses but revalidate them on every use (a 304
+# costs no queries) instead of reusing them on heuristic freshness
+VERSIONED_CACHE_CONTROL = "no-cache"
+
+
+def _version_key(namespace):
+    return f"{namespace}:version"
+
+
+def _modified_key(namespace):
+    return f"{namespace}:modified"
+
+
+def _initial_version():
+    # Seeded from the clock rather than 1, so a version key that was evicted
+    # (or flushed) never comes back as a number that ETags, cached entries
+    # and per-worker snapshots already saw.
+    return time.time_ns() // 1000
+
+
+def get_cache_version(namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        initial = _initial_version()
+        cache.add(_version_key(namespace), initial, timeout=None)
+        version = cache.get(_version_key(namespace), initial)
+    return version
+
+
+def bump_cache_version(namespace):
+    cache.set(_modified_key(namespace), int(time.time()), timeout=None)
+    try:
+        return cache.incr(_version_key(namespace))
+    except ValueError:
+        # key evicted or never set; any fresh value orphans old entries
+        cache.add(_version_key(namespace), _initial_version(), timeout=None)
+        return cache.incr(_version_key(namespace))
+
+
+def get_last_modified(namespace):
+    modified = cache.get(_modified_key(namespace))
+    if modified is None:
+        # unknown (cold cache): treat "now" as the change time
+        modified = int(time.time())
+        cache.add(_modified_key(namespace), modified, timeout=None)
+    return modified
+
+
+def _incr_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_cache_stats(namespace):
+    hits = cache.get(f"{namespace}:stats:hits", 0)
+    misses = cache.get(f"{namespace}:stats:misses", 0)
+    total = hits + misses
+    return {
+        "version": get_cache_version(namespace),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+def _normalize_param(name, value):
+    value = value.strip()
+    if name in ("category", "search"):
+        value = value.lower()
+    elif name in ("min_price", "max_price"):
+        try:
+            value = str(Decimal(value).normalize())
+        except InvalidOperation:
+            pass
+    return value
+
+
+def response_cache_key(namespace, name, request, params=(), **kwargs):
+    """
+    Build a cache key from the namespace version, view name, URL kwargs
+    and the whitelisted query params. Params are normalized so equivalent
+    queries share an entry (``?category=Hair`` == ``?category=hair``).
+    """
+    # payloads carry absolute URLs, which follow the scheme and host
+    parts = {
+        "scheme": request.scheme, "host": request.get_host(),
+        **{k: str(v) for k, v in kwargs.items()},
+    }
+    for param in params:
+        value = request.query_params.get(param)
+        if value is None:
+            continue
+        value = _normalize_param(param, value)
+        if value and not (param == "category" and value == "all"):
+            parts[param] = value
+
+    digest = hashlib.md5(
+        json.dumps(parts, sort_keys=True).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"{namespace}:v{get_cache_version(namespace)}:{name}:{digest}"
+
+
+def validator_headers(etag, last_modified):
+    """Headers a versioned 200 carries, and its 304 repeats."""
+    return {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": VERSIONED_CACHE_CONTROL,
+    }
+
+
+def conditional_response(request, etag, last_modified):
+    """
+    The 304 (or 412) answering the request's preconditions, or None.
+
+    If-Modified-Since is only looked at without If-None-Match: it has
+    one-second resolution, so two bumps within a second share a date.
+    The 304 repeats ETag, Last-Modified and Cache-Control (RFC 9110
+    section 15.4.5).
+    """
+    response = HttpResponse(headers=validator_headers(etag, last_modified))
+    if request.META.get("HTTP_IF_NONE_MATCH"):
+        last_modified = None
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified, response=response)
+    return None if conditional is response else conditional
+
+
+def versioned_response(request, namespace, name, build, params=(), cache_data=True, **kwargs):
+    """
+    Serve a GET through the namespace version.
+
+    The ETag is derived from the versioned cache key and Last-Modified from
+    the namespace's last bump, so If-None-Match / If-Modified-Since are
+    answered with a 304 before any query or serialization runs. With
+    ``cache_data`` the payload itself is cached too; otherwise ``build()``
+    (which must return a Response) runs on every full request.
+    """
+    key = response_cache_key(namespace, name, request, params, **kwargs)
+    etag = quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+    last_modified = get_last_modified(namespace)
+
+    not_modified = conditional_response(request, etag, last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = cache.get(key) if cache_data else None
+    if data is not None:
+        _incr_counter(f"{namespace}:stats:hits")
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+    else:
+        response = build()
+        if cache_data:
+            _incr_counter(f"{namespace}:stats:misses")
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, response.data, RESPONSE_CACHE_TIMEOUT)
+            response["X-Cache"] = "MISS"
+
+    if response.status_code == 200:
+        for header, value in validator_headers(etag, last_modified).items():
+            response[header] = value
+    return response
@@ -0,0 +1,633 @@
+import atexit
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from redis.exceptions import WatchError
+
+from .models import Cart, CartItem, ProductVariant
+
+logger = logging.getLogger(__name__)
+
+
+# ======================================================
+# LOCAL REDIS STAND-IN
+# ======================================================
+
+class LocalRedis:
+    """
+    In-process stand-in for the part of redis-py the cart store uses
+    (hashes, sets, SET NX/EX, expiry and WATCH / MULTI pipelines), for
+    tests and single-process development. Values come back as str, as with
+    ``decode_responses=True``. Nothing is shared between processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = {}
+        self._expires = {}      # key -> time.monotonic() deadline
+        self._versions = {}     # key -> change count, checked by WATCH
+
+    def _changed(self, key):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _get(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            del self._expires[key]
+            self._data.pop(key, None)
+            self._changed(key)
+        return self._data.get(key)
+
+    def _version(self, key):
+        with self._lock:
+            self._get(key)
+            return self._versions.get(key, 0)
+
+    def _hash(self, key):
+        value = self._get(key)
+        if value is None:
+            value = self._data[key] = {}
+        return value
+
+    def _set(self, key):
+        value = self._get(key)
+        if value is None:
+            value = self._data[key] = set()
+        return value
+
+    # keys
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._get(key) is not None:
+                return None
+            self._data[key] = str(value)
+            self._expires.pop(key, None)
+            if ex is not None:
+                self._expires[key] = time.monotonic() + ex
+            self._changed(key)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            deleted = 0
+            for key in keys:
+                if self._get(key) is not None:
+                    del self._data[key]
+                    self._expires.pop(key, None)
+                    self._changed(key)
+                    deleted += 1
+            return deleted
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._get(key) is None:
+                return False
+            self._expires[key] = time.monotonic() + seconds
+            return True
+
+    def flushall(self):
+        with self._lock:
+            for key in list(self._data):
+                self._changed(key)
+            self._data.clear()
+            self._expires.clear()
+            return True
+
+    # hashes
+
+    def hget(self, key, field):
+        with self._lock:
+            return (self._get(key) or {}).get(field)
+
+    def hmget(self, key, fields):
+        with self._lock:
+            value = self._get(key) or {}
+            return [value.get(field) for field in fields]
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._get(key) or {})
+
+    def hexists(self, key, field):
+        with self._lock:
+            return field in (self._get(key) or {})
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        items = dict(mapping or {})
+        if field is not None:
+            items[field] = value
+        with self._lock:
+            current = self._hash(key)
+            added = sum(1 for field in items if field not in current)
+            current.update((field, str(item)) for field, item in items.items())
+            self._changed(key)
+            return added
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            value = self._get(key)
+            if not value:
+                return 0
+            deleted = sum(1 for field in fields if value.pop(field, None) is not None)
+            if not value:
+                self.delete(key)
+            if deleted:
+                self._changed(key)
+            return deleted
+
+    # sets
+
+    def sadd(self, key, *members):
+        with self._lock:
+            value = self._set(key)
+            members = {str(member) for member in members}
+            added = len(members - value)
+            value |= members
+            self._changed(key)
+            return added
+
+    def spop(self, key, count=None):
+        with self._lock:
+            value = self._get(key)
+            if not value:
+                return [] if count is not None else None
+            popped = [value.pop() for _ in range(min(count or 1, len(value)))]
+            if not value:
+                self.delete(key)
+            self._changed(key)
+            return popped if count is not None else popped[0]
+
+    def pipeline(self, transaction=True):
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline:
+    """
+    redis-py pipeline semantics: commands are queued until execute(),
+    except between watch() and multi() where they run immediately, and
+    execute() raises WatchError if a watched key changed since watch().
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def reset(self):
+        self._watched = {}
+        self._queue = []
+
+    def watch(self, *keys):
+        for key in keys:
+            self._watched[key] = self._client._version(key)
+        self._queue = None
+
+    def multi(self):
+        self._queue = []
+
+    def __getattr__(self, name):
+        command = getattr(self._client, name)
+        if self._queue is None:
+            return command
+
+        def queue(*args, **kwargs):
+            self._queue.append((command, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            try:
+                for key, version in self._watched.items():
+                    if self._client._version(key) != version:
+                        raise WatchError("Watched variable changed.")
+                return [command(*args, **kwargs) for command, args, kwargs in self._queue or ()]
+            finally:
+                self.reset()
+
+
+# ======================================================
+# REDIS CART STORE
+# ======================================================
+#
+# With CART_STORAGE = "redis" each active cart is one Redis hash:
+#
+#     cart:<user id>   cart       -> Cart pk
+#                      q:<variant>  -> quantity (0: removed, not flushed yet)
+#                      id:<variant> -> CartItem pk
+#                      item:<pk>    -> variant id
+#
+# Cart reads and writes are hash operations; changed carts are queued in
+# a set and written to CartItem rows in batches by CartFlusher, and right
+# before checkout reads them. New lines still insert their rows (one batch
+# per write) on the first add, since the endpoints address lines by
+# CartItem id.
+
+CART_KEY_TTL = 60 * 60 * 24 * 7
+DIRTY_CARTS = "cart:dirty"
+FLUSH_INTERVAL = 2.0
+FLUSH_BATCH = 200
+FLUSH_LOCK_TIMEOUT = 30
+WRITE_ATTEMPTS = 50
+
+
+class CartConflict(Exception):
+    """The cart line kept changing under a write; the client should retry."""
+
+
+def _cart_key(user_id):
+    return f"cart:{user_id}"
+
+
+def _flush_lock_key(user_id):
+    return f"cart:{user_id}:flushing"
+
+
+def _prefetched(manager, instances):
+    """Queryset for `manager` pre-filled with `instances`, as prefetch_related leaves it."""
+    queryset = manager.get_queryset()
+    queryset._result_cache = instances
+    queryset._prefetch_done = True
+    return queryset
+
+
+class RedisCartStore:
+    def __init__(self, client):
+        self.client = client
+
+    def _load(self, user):
+        """Copy the user's cart rows into its hash, unless the hash exists."""
+        key = _cart_key(user.pk)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.hexists(key, "cart"):
+                    return
+                cart, created = Cart.objects.get_or_create(user=user)
+                fields = {"cart": cart.pk}
+                for pk, variant_id, quantity in cart.items.values_list("pk", "variant_id", "quantity"):
+                    fields.update({f"q:{variant_id}": quantity, f"id:{variant_id}": pk, f"item:{pk}": variant_id})
+                pipe.multi()
+                pipe.hset(key, mapping=fields)
+                pipe.expire(key, CART_KEY_TTL)
+                pipe.execute()
+            except WatchError:
+                pass    # loaded (or cleared) by a concurrent request
+
+    def _fields(self, user):
+        while True:
+            fields = self.client.hgetall(_cart_key(user.pk))
+            if "cart" in fields:
+                return fields
+            self._load(user)
+
+    def lines(self, user):
+        """(cart pk, {variant id: (item pk, quantity)}) of the lines in the cart."""
+        fields = self._fields(user)
+        lines = {}
+        for field, value in fields.items():
+            if field.startswith("q:") and int(value) > 0:
+                variant_id = int(field[2:])
+                lines[variant_id] = (int(fields[f"id:{variant_id}"]), int(value))
+        return int(fields["cart"]), lines
+
+    def item_variant(self, user, item_id):
+        """Variant of cart line `item_id`, or None if the cart has no such line."""
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        fields = self._fields(user)
+        variant_id = fields.get(f"item:{item_id}")
+        if variant_id is None or int(fields.get(f"q:{variant_id}", 0)) <= 0:
+            return None
+        return int(variant_id)
+
+    def update_lines(self, user, variant_ids, compute):
+        """
+        Read-check-write of some lines of the cart as one optimistic
+        transaction: WATCH the hash, read the lines, and write them in a
+        MULTI that fails (and is retried) if the cart changed meanwhile.
+
+        `compute({variant id: quantity})` gets the current quantities (0 for
+        lines not in the cart) and returns ``(new quantities, result)``;
+        nothing is written when the new quantities are None. Returns result.
+        """
+        key = _cart_key(user.pk)
+        variant_ids = list(variant_ids)
+        fields = ["cart"] + [f"q:{v}" for v in variant_ids] + [f"id:{v}" for v in variant_ids]
+        for _ in range(WRITE_ATTEMPTS):
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(key)
+                    values = pipe.hmget(key, fields)
+                    if values[0] is None:
+                        self._load(user)
+                        continue
+                    cart_id = int(values[0])
+                    count = len(variant_ids)
+                    current = {v: int(q or 0) for v, q in zip(variant_ids, values[1:count + 1])}
+                    ids = {v: int(pk) for v, pk in zip(variant_ids, values[count + 1:]) if pk is not None}
+
+                    quantities, result = compute(current)
+                    if quantities is None:
+                        return result
+                    changes, new_lines, replaced = {}, {}, []
+                    for variant_id, quantity in quantities.items():
+                        if quantity == current.get(variant_id, 0):
+                            continue
+                        changes[f"q:{variant_id}"] = quantity
+                        if quantity > 0 and current.get(variant_id, 0) <= 0:
+                            new_lines[variant_id] = quantity
+                            if variant_id in ids:
+                                replaced.append(ids[variant_id])
+                    if not changes:
+                        return result
+                    if new_lines:
+                        changes.update(self._new_lines(cart_id, new_lines, replaced))
+
+                    pipe.multi()
+                    if replaced:
+                        pipe.hdel(key, *(f"item:{pk}" for pk in replaced))
+                    pipe.hset(key, mapping=changes)
+                    pipe.expire(key, CART_KEY_TTL)
+                    pipe.sadd(DIRTY_CARTS, user.pk)
+                    pipe.execute()
+                    return result
+                except WatchError:
+                    continue
+        raise CartConflict()
+
+    @staticmethod
+    def _new_lines(cart_id, quantities, removed_pks=()):
+        """
+        Hash fields of the lines entering the cart, with their rows
+        inserted in one batch for the ids. Lines removed but not flushed
+        yet get new rows, as they would with rows: ids (and so the order
+        of lines) match either way.
+        """
+        if removed_pks:
+            CartItem.objects.filter(pk__in=removed_pks).delete()
+        # a row a raced first add already inserted is kept, as get_or_create would
+        CartItem.objects.bulk_create(
+            [CartItem(cart_id=cart_id, variant_id=v, quantity=q) for v, q in quantities.items()],
+            ignore_conflicts=True,
+        )
+        fields = {}
+        rows = CartItem.objects.filter(cart_id=cart_id, variant_id__in=quantities).values_list("variant_id", "pk")
+        for variant_id, pk in rows:
+            fields.update({f"id:{variant_id}": pk, f"item:{pk}": variant_id})
+        return fields
+
+    def add(self, user, variant_id, quantity, stock):
+        """Add to a line if `stock` covers the new quantity; rows affected (0 or 1)."""
+        def compute(current):
+            if current[variant_id] + quantity > stock:
+                return None, 0
+            return {variant_id: current[variant_id] + quantity}, 1
+        return self.update_lines(user, [variant_id], compute)
+
+    def set_quantity(self, user, variant_id, quantity, stock=None):
+        """
+        Set (or with 0, remove) an existing line: rows affected, 0 if
+        `stock` doesn't cover it, None if the line isn't in the cart.
+        """
+        def compute(current):
+            if current[variant_id] <= 0:
+                return None, None
+            if stock is not None and quantity > stock:
+                return None, 0
+            return {variant_id: quantity}, 1
+        return self.update_lines(user, [variant_id], compute)
+
+    def cart(self, user):
+        """
+        The user's Cart with its items prefetched and annotated as
+        CartSerializer.setup_eager_loading does, for CartSerializer.
+        """
+        cart_id, lines = self.lines(user)
+        variants = ProductVariant.objects.select_related("product").in_bulk(lines)
+        items = []
+        for variant_id, (pk, quantity) in lines.items():
+            variant = variants.get(variant_id)
+            if variant is None:
+                continue    # deleted; its row goes with it (on_delete=CASCADE)
+            item = CartItem(pk=pk, cart_id=cart_id, variant=variant, quantity=quantity)
+            item.line_total = quantity * variant.price
+            item.low_stock = variant.stock < quantity
+            items.append(item)
+        items.sort(key=lambda item: item.pk)
+        cart_total = sum(item.line_total for item in items)
+        for item in items:
+            item.cart_total = cart_total
+
+        cart = Cart(pk=cart_id, user=user)
+        cart._prefetched_objects_cache = {"items": _prefetched(cart.items, items)}
+        return cart
+
+    # ---- write-behind ----
+
+    def _lock_flush(self, user_id, wait):
+        deadline = time.monotonic() + FLUSH_LOCK_TIMEOUT
+        while not self.client.set(_flush_lock_key(user_id), 1, nx=True, ex=FLUSH_LOCK_TIMEOUT):
+            if not wait or time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def flush(self, user_ids, wait=False, hold=False):
+        """
+        Write the given users' carts to CartItem rows. Carts another
+        flusher is writing are queued again, or with `wait` waited for.
+        With `hold` the carts stay locked against flushing until clear()
+        (checkout: nothing may write the rows back once they're ordered).
+        """
+        locked = [user_id for user_id in user_ids if self._lock_flush(user_id, wait)]
+        busy = set(user_ids) - set(locked)
+        if busy:
+            self.client.sadd(DIRTY_CARTS, *busy)
+        if not locked:
+            return
+
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for user_id in locked:
+                pipe.hgetall(_cart_key(user_id))
+            hashes = dict(zip(locked, pipe.execute()))
+            self._write_rows(hashes.values())
+        except Exception:
+            self.client.sadd(DIRTY_CARTS, *locked)
+            raise
+        finally:
+            if not hold:
+                self.client.delete(*(_flush_lock_key(user_id) for user_id in locked))
+
+        for user_id, fields in hashes.items():
+            self._forget_removed(user_id, fields)
+
+    def _write_rows(self, hashes):
+        """Make the carts' CartItem rows match the hashes, in one transaction."""
+        wanted = {}     # item pk -> (cart pk, variant id, quantity)
+        cart_ids = set()
+        for fields in hashes:
+            if "cart" not in fields:
+                continue    # cleared by checkout (or expired) since
+            cart_id = int(fields["cart"])
+            cart_ids.add(cart_id)
+            for field, value in fields.items():
+                if field.startswith("id:"):
+                    variant_id = int(field[3:])
+                    wanted[int(value)] = (cart_id, variant_id, int(fields.get(f"q:{variant_id}", 0)))
+        if not cart_ids:
+            return
+
+        with transaction.atomic():
+            existing = dict(CartItem.objects.filter(cart_id__in=cart_ids).values_list("pk", "quantity"))
+            variant_ids = set(
+                ProductVariant.objects.filter(
+                    pk__in={variant_id for _, variant_id, _ in wanted.values()}
+                ).values_list("pk", flat=True)
+            )
+            # rows the hash doesn't know are leftovers of a raced first add
+            stale = [pk for pk in existing if wanted.get(pk, (0, 0, 0))[2] <= 0]
+            changed = [
+                CartItem(pk=pk, quantity=quantity)
+                for pk, (_, _, quantity) in wanted.items()
+                if quantity > 0 and pk in existing and existing[pk] != quantity
+            ]
+            missing = [
+                CartItem(pk=pk, cart_id=cart_id, variant_id=variant_id, quantity=quantity)
+                for pk, (cart_id, variant_id, quantity) in wanted.items()
+                if quantity > 0 and pk not in existing and variant_id in variant_ids
+            ]
+            if stale:
+                CartItem.objects.filter(pk__in=stale).delete()
+            if changed:
+                CartItem.objects.bulk_update(changed, ["quantity"])
+            if missing:
+                CartItem.objects.bulk_create(missing)
+
+    def _forget_removed(self, user_id, fields):
+        """Drop removed lines (flushed as deleted rows) from the hash."""
+        removed = [field[2:] for field, value in fields.items() if field.startswith("q:") and int(value) <= 0]
+        if not removed:
+            return
+        key = _cart_key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                quantities = pipe.hmget(key, [f"q:{variant_id}" for variant_id in removed])
+                gone = [v for v, quantity in zip(removed, quantities) if quantity is not None and int(quantity) <= 0]
+                if not gone:
+                    return
+                stale = []
+                for variant_id in gone:
+                    stale += [f"q:{variant_id}", f"id:{variant_id}"]
+                    if fields.get(f"id:{variant_id}"):
+                        stale.append(f"item:{fields[f'id:{variant_id}']}")
+                pipe.multi()
+                pipe.hdel(key, *stale)
+                pipe.execute()
+            except WatchError:
+                pass    # re-added meanwhile; that write queued the cart again
+
+    def flush_dirty(self, batch=FLUSH_BATCH):
+        """Flush up to `batch` queued carts; returns how many were taken."""
+        user_ids = [int(user_id) for user_id in self.client.spop(DIRTY_CARTS, batch)]
+        if user_ids:
+            self.flush(user_ids)
+        return len(user_ids)
+
+    def clear(self, user):
+        """Forget the user's cart (after checkout emptied its rows)."""
+        self.client.delete(_cart_key(user.pk), _flush_lock_key(user.pk))
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def cart_store():
+    """
+    The Redis cart store when ``settings.CART_STORAGE == "redis"``, else
+    None (carts are read and written as rows). Without CART_REDIS_URL the
+    store runs on a per-process LocalRedis.
+    """
+    if settings.CART_STORAGE != "redis":
+        return None
+    url = settings.CART_REDIS_URL
+    store = _stores.get(url)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(url)
+            if store is None:
+                client = redis.Redis.from_url(url, decode_responses=True) if url else LocalRedis()
+                store = _stores[url] = RedisCartStore(client)
+    return store
+
+
+class CartFlusher:
+    """
+    Per-worker background thread writing queued carts to the database
+    every `interval` seconds, and once more at interpreter exit.
+    """
+    interval = FLUSH_INTERVAL
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start at worker start; a no-op unless carts live in Redis."""
+        if cart_store() is None:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cart-flusher", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+        self.flush()
+
+    def flush(self):
+        store = cart_store()
+        if store is None:
+            return
+        try:
+            while store.flush_dirty() == FLUSH_BATCH:
+                pass
+        except Exception:
+            logger.exception("Could not flush carts")
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+cart_flusher = CartFlusher()
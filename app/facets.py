@@ -0,0 +1,57 @@
+from django.db.models import Case, Count, IntegerField, Value, When
+
+
+# Lower bounds of the price histogram buckets (on Product.lowest_price);
+# the last bucket is open-ended.
+PRICE_BUCKETS = [0, 250, 500, 1000, 2000]
+
+
+def _price_bucket():
+    whens = [When(lowest_price__isnull=True, then=Value(-1))]
+    for index, upper in enumerate(PRICE_BUCKETS[1:]):
+        whens.append(When(lowest_price__lt=upper, then=Value(index)))
+    return Case(*whens, default=Value(len(PRICE_BUCKETS) - 1), output_field=IntegerField())
+
+
+def compute_product_facets(queryset):
+    """
+    Category, brand and price-bucket counts for `queryset` (the already
+    filtered product list).
+
+    Runs one GROUP BY over (category, brand, price bucket); the handful of
+    combination rows it returns are rolled up into the three facets here,
+    instead of issuing a COUNT per category / brand / bucket.
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=_price_bucket())
+        .values("category_id", "category__name", "brand", "price_bucket")
+        .annotate(count=Count("id"))
+    )
+
+    categories, brands = {}, {}
+    prices = [0] * len(PRICE_BUCKETS)
+    for row in rows:
+        count = row["count"]
+        category = categories.setdefault(
+            row["category_id"],
+            {"id": row["category_id"], "name": row["category__name"], "count": 0},
+        )
+        category["count"] += count
+        if row["brand"]:
+            brands[row["brand"]] = brands.get(row["brand"], 0) + count
+        if row["price_bucket"] >= 0:
+            prices[row["price_bucket"]] += count
+
+    bounds = PRICE_BUCKETS + [None]
+    return {
+        "categories": sorted(categories.values(), key=lambda c: c["name"]),
+        "brands": [
+            {"name": name, "count": count}
+            for name, count in sorted(brands.items(), key=lambda b: (-b[1], b[0]))
+        ],
+        "price": [
+            {"min": bounds[i], "max": bounds[i + 1], "count": prices[i]}
+            for i in range(len(PRICE_BUCKETS))
+        ],
+    }
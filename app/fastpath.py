@@ -0,0 +1,563 @@
+import decimal
+from operator import itemgetter
+from types import MethodType
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Prefetch
+from django.db.models.fields.files import FieldFile
+from rest_framework import relations, serializers
+from rest_framework.fields import Field, SkipField
+from rest_framework.settings import api_settings
+
+from .serializers import (
+    AbsoluteImageField, ImageSizesField, absolute_image_url, absolute_url, image_sizes,
+)
+from .storage import IMAGE_SIZES, concrete_storage, storage_url
+
+
+# ======================================================
+# COMPILED READ-ONLY SERIALIZATION
+# ======================================================
+#
+# `serializer.data` walks every field of every row through DRF's generic
+# get_attribute / to_representation machinery. For read-only lists the
+# field set is fixed once the serializer is bound, so fast_representation()
+# turns it into a flat list of (name, getter) closures once per call and
+# runs those over the rows. Output is the same as `serializer.data`
+# (checked by the parity tests); fields without a fast getter fall back to
+# DRF's own code path.
+#
+# Given an unevaluated queryset, it goes further: compile_rows() maps every
+# field onto a `.values()` column (joins for nested foreign keys, one extra
+# query per nested reverse relation) with a precomputed converter, so no
+# model instance is built and no DRF field is called per row. Serializers
+# that need instances (method fields, properties, custom fields) keep the
+# instance path.
+
+_SKIP = object()
+_MISSING = object()
+
+_CONVERTERS = {
+    serializers.IntegerField: int,
+    serializers.BooleanField: bool,
+    serializers.FloatField: float,
+}
+
+
+def _resolver(source_attrs):
+    """Instance -> attribute along `source_attrs`, like DRF's get_attribute."""
+    if not source_attrs:
+        return lambda instance: instance
+    if len(source_attrs) == 1:
+        attr = source_attrs[0]
+
+        def resolve(instance):
+            value = getattr(instance, attr)
+            return value() if type(value) is MethodType else value
+        return resolve
+
+    def resolve(instance):
+        for attr in source_attrs:
+            if instance is None:
+                return None
+            instance = getattr(instance, attr)
+            if type(instance) is MethodType:
+                instance = instance()
+        return instance
+    return resolve
+
+
+def _column_names(serializer):
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return frozenset()
+    return frozenset(f.attname for f in model._meta.concrete_fields)
+
+
+def _drf_getter(field):
+    """Exactly what Serializer.to_representation does for one field."""
+    def getter(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        check = attribute.pk if isinstance(attribute, relations.PKOnlyObject) else attribute
+        return None if check is None else field.to_representation(attribute)
+    getter.may_skip = True
+    return getter
+
+
+def _nested_getter(resolve, represent):
+    def getter(instance):
+        value = resolve(instance)
+        return None if value is None else represent(value)
+    return getter
+
+
+def _many_getter(resolve, represent):
+    def getter(instance):
+        value = resolve(instance)
+        if value is None:
+            return None
+        if isinstance(value, models.manager.BaseManager):
+            value = value.all()
+        return [represent(item) for item in value]
+    return getter
+
+
+def _pk_getter(source_attrs):
+    resolve_parent = _resolver(source_attrs[:-1])
+    attr = source_attrs[-1]
+
+    def getter(instance):
+        parent = resolve_parent(instance)
+        # serializable_value() reads the FK column without loading the row
+        return None if parent is None else parent.serializable_value(attr)
+    return getter
+
+
+def _many_pk_getter(resolve):
+    def getter(instance):
+        value = resolve(instance)
+        if hasattr(value, "all"):
+            value = value.all()
+        return [item.pk for item in value]
+    return getter
+
+
+def _image_getter(field):
+    """
+    Image URL (or renditions) straight from the stored file name, without
+    wrapping each value in a FieldFile first.
+    """
+    resolve_parent = _resolver(field.source_attrs[:-1])
+    attr = field.source_attrs[-1]
+    request = field.context.get("request")
+    sizes = isinstance(field, ImageSizesField)
+    storages = {}   # model class -> storage of its `attr` field
+
+    def getter(instance):
+        parent = resolve_parent(instance)
+        if parent is None:
+            return None
+        name = parent.__dict__.get(attr, _MISSING)
+        if name is _MISSING:
+            # deferred column: let the descriptor load it
+            image = getattr(parent, attr)
+            return field.get_abs_sizes(request, image) if sizes else absolute_image_url(request, image)
+        if isinstance(name, FieldFile):
+            storage, name = concrete_storage(name.storage), name.name
+        else:
+            storage = storages.get(type(parent))
+            if storage is None:
+                storage = storages[type(parent)] = concrete_storage(parent._meta.get_field(attr).storage)
+        if not name:
+            return None
+        if sizes:
+            return image_sizes({
+                size: absolute_url(request, storage_url(storage, name, size)) for size in IMAGE_SIZES
+            })
+        # size passed like image_url() does, so both share one memo entry
+        return absolute_url(request, storage_url(storage, name, None))
+    return getter
+
+
+def _field_getter(field):
+    resolve = _resolver(field.source_attrs)
+
+    if isinstance(field, serializers.ListSerializer):
+        return _many_getter(resolve, compile_serializer(field.child))
+    if isinstance(field, serializers.BaseSerializer):
+        return _nested_getter(resolve, compile_serializer(field))
+    if isinstance(field, AbsoluteImageField) and field.source_attrs:
+        return _image_getter(field)
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(field.parent, field.method_name)
+    if (
+        type(field) is relations.PrimaryKeyRelatedField
+        and field.pk_field is None and field.source_attrs
+    ):
+        return _pk_getter(field.source_attrs)
+    if (
+        type(field) is relations.ManyRelatedField
+        and type(field.child_relation) is relations.PrimaryKeyRelatedField
+        and field.child_relation.pk_field is None
+    ):
+        return _many_pk_getter(resolve)
+
+    if (
+        isinstance(field, serializers.CharField)
+        and type(field).to_representation is serializers.CharField.to_representation
+    ):
+        convert = str
+    elif type(field) in _CONVERTERS:
+        convert = _CONVERTERS[type(field)]
+    elif type(field).get_attribute is Field.get_attribute:
+        convert = field.to_representation
+    else:
+        return _drf_getter(field)
+
+    if len(field.source_attrs) == 1 and field.source_attrs[0] in _column_names(field.parent):
+        # a plain model column: no method to call, no relation to walk
+        attr = field.source_attrs[0]
+
+        def getter(instance):
+            value = getattr(instance, attr)
+            return None if value is None else convert(value)
+        return getter
+    return _nested_getter(resolve, convert)
+
+
+def compile_serializer(serializer):
+    """
+    Representation function for one instance of the bound (child)
+    serializer, equivalent to ``serializer.to_representation``.
+    """
+    plan = [(field.field_name, _field_getter(field)) for field in serializer._readable_fields]
+    skippable = any(getattr(getter, "may_skip", False) for _, getter in plan)
+
+    def represent(instance):
+        ret = {name: getter(instance) for name, getter in plan}
+        if skippable:
+            for name in [name for name, value in ret.items() if value is _SKIP]:
+                del ret[name]
+        return ret
+    return represent
+
+
+# ======================================================
+# .values() ROWS
+# ======================================================
+
+_UNSUPPORTED = object()
+
+
+def _decimal_converter(field, model_field):
+    """DecimalField.to_representation for a coerced-to-string, non-localized field."""
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if (
+        not coerce_to_string or field.localize or getattr(field, "normalize_output", False)
+        or field.decimal_places is None
+    ):
+        return _UNSUPPORTED
+    if (model_field.decimal_places, model_field.max_digits) == (field.decimal_places, field.max_digits):
+        # the backends return the column at its own scale: already quantized
+        return "{:f}".format
+
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        return f"{value.quantize(exponent, rounding=rounding, context=context):f}"
+    return convert
+
+
+def _column_converter(field, model_field):
+    """
+    Converter from the `.values()` value of `model_field` (None: an
+    annotation) to what `field` renders; None when the value is already it.
+    """
+    if (
+        isinstance(field, serializers.CharField)
+        and type(field).to_representation is serializers.CharField.to_representation
+    ):
+        return None if isinstance(model_field, (models.CharField, models.TextField)) else str
+    if type(field) is serializers.IntegerField:
+        return None if isinstance(model_field, models.IntegerField) else int
+    if type(field) is serializers.BooleanField:
+        return None if isinstance(model_field, models.BooleanField) else bool
+    if type(field) is serializers.FloatField:
+        return float
+    if type(field) is serializers.DecimalField and isinstance(model_field, models.DecimalField):
+        return _decimal_converter(field, model_field)
+    return _UNSUPPORTED
+
+
+def _forward_path(model, source_attrs):
+    """
+    (model, model field) at the end of `source_attrs`, walking only
+    non-null forward foreign keys, or None. A null hop would make DRF skip
+    the field rather than render None.
+    """
+    field = None
+    for i, attr in enumerate(source_attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if i == len(source_attrs) - 1:
+            break
+        if not (field.concrete and field.is_relation and not field.many_to_many) or field.null:
+            return None
+        model = field.related_model
+    return model, field
+
+
+def _reverse_relation(model, source_attrs):
+    if len(source_attrs) != 1:
+        return None
+    try:
+        field = model._meta.get_field(source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    return field if field.one_to_many else None
+
+
+def _child_queryset(queryset, name, related_model):
+    """The queryset `queryset` would prefetch `name` with (ordering, only(), filters)."""
+    for lookup in queryset._prefetch_related_lookups:
+        if (
+            isinstance(lookup, Prefetch) and lookup.prefetch_through == name
+            and lookup.to_attr is None and lookup.queryset is not None
+        ):
+            return lookup.queryset
+    return related_model._default_manager.all()
+
+
+class RowPlan:
+    """
+    A serializer compiled against `.values()` rows: the `columns` to
+    select, the reverse relations to fetch for a list of rows and
+    `represent(row)`.
+    """
+
+    def __init__(self, model, columns, relations, represent):
+        self.model = model
+        self.columns = columns
+        # [(row key, reverse relation, child plan or None for pk lists,
+        #   {child column: parent column} copied from the parent row)]
+        self.relations = relations
+        self.represent = represent
+
+    def values(self, queryset, extra=(), inherited=()):
+        """
+        `queryset` as a lazy queryset of rows, e.g. to paginate, without
+        the `inherited` columns.
+        """
+        columns = dict.fromkeys(c for c in (*self.columns, *extra) if c not in inherited)
+        if self.relations:
+            columns[self.model._meta.pk.attname] = None
+        return queryset.prefetch_related(None).values(*columns)
+
+    def represent_rows(self, rows, queryset):
+        """Representations of `rows` (from `values(queryset)`), reverse relations included."""
+        rows = list(rows)
+        pk = self.model._meta.pk.attname
+        for key, relation, child, inherited in self.relations:
+            groups = {row[pk]: [] for row in rows}
+            if groups:
+                fk = relation.field.attname
+                child_qs = _child_queryset(queryset, relation.name, relation.related_model)
+                child_qs = child_qs.filter(**{f"{relation.field.name}__in": list(groups)})
+                if child is None:
+                    child_pk = relation.related_model._meta.pk.attname
+                    for item in child_qs.values_list(fk, child_pk):
+                        groups[item[0]].append(item[1])
+                else:
+                    child_rows = list(child.values(child_qs, extra=(fk,), inherited=inherited))
+                    if inherited:
+                        parents = {row[pk]: row for row in rows}
+                        for item in child_rows:
+                            parent = parents[item[fk]]
+                            for child_column, parent_column in inherited.items():
+                                item[child_column] = parent[parent_column]
+                    for item, data in zip(child_rows, child.represent_rows(child_rows, child_qs)):
+                        groups[item[fk]].append(data)
+            for row in rows:
+                row[key] = groups[row[pk]]
+        return [self.represent(row) for row in rows]
+
+
+def _image_row_getter(field, lookup, model_field, urls):
+    request = field.context.get("request")
+    storage = concrete_storage(model_field.storage)
+    sizes = isinstance(field, ImageSizesField)
+    # one image often shows up several times per page (a product and each
+    # of its variants), so the URLs are built once per name
+    built = urls.setdefault((storage, sizes), {})
+
+    def getter(row):
+        name = row[lookup]
+        if not name:
+            return None
+        value = built.get(name)
+        if value is None:
+            if sizes:
+                value = image_sizes({
+                    size: absolute_url(request, storage_url(storage, name, size)) for size in IMAGE_SIZES
+                })
+            else:
+                value = absolute_url(request, storage_url(storage, name, None))
+            built[name] = value
+        return dict(value) if sizes else value
+    return getter
+
+
+def _row_field(field, model, prefix, queryset, urls, columns, fetches):
+    """
+    Row -> representation of one field, adding what it selects to `columns`
+    and the reverse relations it needs to `fetches`; _UNSUPPORTED when it
+    needs model instances.
+    """
+    source_attrs = field.source_attrs
+    many = isinstance(field, serializers.ListSerializer)
+    if many or type(field) is relations.ManyRelatedField:
+        relation = None if prefix else _reverse_relation(model, source_attrs)
+        if relation is None:
+            return _UNSUPPORTED
+        inherited = {}
+        if many:
+            child_qs = _child_queryset(queryset, relation.name, relation.related_model)
+            child = _compile_rows(field.child, child_qs, urls)
+            if child is None:
+                return _UNSUPPORTED
+            # the child's columns of its own parent (variant.product.title)
+            # come from the parent row instead of a join back to it
+            back = relation.field.name
+            for column in child.columns:
+                if column == back:
+                    inherited[column] = model._meta.pk.attname
+                elif column.startswith(back + "__"):
+                    inherited[column] = column[len(back) + 2:]
+            columns.extend(inherited.values())
+        elif (
+            type(field.child_relation) is relations.PrimaryKeyRelatedField
+            and field.child_relation.pk_field is None
+        ):
+            child = None
+        else:
+            return _UNSUPPORTED
+        key = ("relation", field.field_name)
+        fetches.append((key, relation, child, inherited))
+        return lambda row: row[key]
+
+    if not source_attrs:
+        return _UNSUPPORTED
+    if not prefix and len(source_attrs) == 1 and source_attrs[0] in queryset.query.annotations:
+        lookup, model_field = source_attrs[0], None
+    else:
+        path = _forward_path(model, source_attrs)
+        if path is None or not path[1].concrete or path[1].many_to_many:
+            return _UNSUPPORTED
+        model_field = path[1]
+        lookup = prefix + "__".join(source_attrs)
+
+    if isinstance(field, serializers.BaseSerializer):
+        nested_model = getattr(getattr(field, "Meta", None), "model", None)
+        if model_field is None or not model_field.is_relation or model_field.related_model is not nested_model:
+            return _UNSUPPORTED
+        nested = _compile_row_fields(field, nested_model, lookup + "__", queryset, urls, columns, fetches)
+        if nested is None:
+            return _UNSUPPORTED
+        columns.append(lookup)
+        # the foreign key itself tells a missing related row
+        return lambda row: None if row[lookup] is None else nested(row)
+
+    if isinstance(field, AbsoluteImageField):
+        if not isinstance(model_field, models.FileField):
+            return _UNSUPPORTED
+        columns.append(lookup)
+        return _image_row_getter(field, lookup, model_field, urls)
+
+    if model_field is not None and model_field.is_relation:
+        if type(field) is not relations.PrimaryKeyRelatedField or field.pk_field is not None:
+            return _UNSUPPORTED
+        converter = None
+    else:
+        converter = _column_converter(field, model_field)
+        if converter is _UNSUPPORTED:
+            return _UNSUPPORTED
+
+    columns.append(lookup)
+    if converter is None:
+        return itemgetter(lookup)
+
+    def getter(row):
+        value = row[lookup]
+        return None if value is None else converter(value)
+    return getter
+
+
+def _compile_row_fields(serializer, model, prefix, queryset, urls, columns, fetches):
+    plan = []
+    for field in serializer._readable_fields:
+        getter = _row_field(field, model, prefix, queryset, urls, columns, fetches)
+        if getter is _UNSUPPORTED:
+            return None
+        plan.append((field.field_name, getter))
+
+    def represent(row):
+        return {name: getter(row) for name, getter in plan}
+    return represent
+
+
+def _compile_rows(serializer, queryset, urls):
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None or not isinstance(queryset, models.QuerySet) or queryset.model is not model:
+        return None
+    columns, fetches = [], []
+    represent = _compile_row_fields(serializer, model, "", queryset, urls, columns, fetches)
+    if represent is None:
+        return None
+    return RowPlan(model, tuple(dict.fromkeys(columns)), fetches, represent)
+
+
+def compile_rows(serializer, queryset):
+    """
+    RowPlan rendering the bound (child) model serializer from rows of
+    `queryset`, or None when one of its fields needs model instances.
+    """
+    return _compile_rows(serializer, queryset, {})
+
+
+def _unevaluated_queryset(instances):
+    return isinstance(instances, models.QuerySet) and instances._result_cache is None
+
+
+def fast_representation(serializer):
+    """
+    Drop-in for ``serializer.data`` on read-only serializers (single or
+    ``many=True``) that skips DRF's per-field dispatch, and for an
+    unevaluated queryset renders straight from `.values()` rows.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        queryset = serializer.instance
+        if _unevaluated_queryset(queryset):
+            plan = compile_rows(serializer.child, queryset)
+            if plan is not None:
+                return plan.represent_rows(plan.values(queryset), queryset)
+        return list(iter_representation(serializer))
+    return compile_serializer(serializer)(serializer.instance)
+
+
+def paginate_representation(serializer, paginator, request, view=None):
+    """
+    ``paginator.paginate_queryset()`` over the queryset of a ``many=True``
+    serializer and fast_representation() of the page, paging `.values()`
+    rows when the serializer compiles to them.
+    """
+    queryset = serializer.instance
+    plan = compile_rows(serializer.child, queryset)
+    if plan is None:
+        page = paginator.paginate_queryset(queryset, request, view=view)
+        return fast_representation(type(serializer.child)(page, many=True, context=serializer.context))
+    extra = paginator.get_row_fields() if hasattr(paginator, "get_row_fields") else ()
+    rows = paginator.paginate_queryset(plan.values(queryset, extra), request, view=view)
+    return plan.represent_rows(rows, queryset)
+
+
+def iter_representation(serializer):
+    """
+    Lazily represent the instances of a ``many=True`` serializer, one at a
+    time; pair with ``queryset.iterator()`` to stream large lists.
+    """
+    represent = compile_serializer(serializer.child)
+    instances = serializer.instance
+    if isinstance(instances, models.manager.BaseManager):
+        instances = instances.all()
+    for instance in instances:
+        yield represent(instance)
@@ -0,0 +1,181 @@
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .cache import SALONS, get_cache_version
+from .models import Saloon
+
+logger = logging.getLogger(__name__)
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+# ======================================================
+# COORDINATES FROM GOOGLE MAPS LINKS
+# ======================================================
+
+_NUMBER = r"(-?\d{1,3}(?:\.\d+)?)"
+# "!3d<lat>!4d<lng>" is the place itself; "@<lat>,<lng>" the map viewport
+_PLACE_RE = re.compile(rf"!3d{_NUMBER}!4d{_NUMBER}")
+_VIEWPORT_RE = re.compile(rf"@{_NUMBER},{_NUMBER}")
+_PAIR_RE = re.compile(rf"^\s*{_NUMBER}\s*,\s*{_NUMBER}\s*$")
+_QUERY_PARAMS = ("q", "query", "ll", "center", "destination", "daddr")
+
+
+def _valid(lat, lng):
+    lat, lng = float(lat), float(lng)
+    if -90 <= lat <= 90 and -180 <= lng <= 180:
+        return lat, lng
+    return None
+
+
+def coordinates_from_map_url(url):
+    """
+    (lat, lng) from a Google Maps link, or None when the link doesn't carry
+    them (e.g. maps.app.goo.gl short links, which need a network round trip
+    to resolve).
+    """
+    if not url:
+        return None
+    url = unquote(url)
+    for pattern in (_PLACE_RE, _VIEWPORT_RE):
+        match = pattern.search(url)
+        if match:
+            return _valid(*match.groups())
+    params = parse_qs(urlsplit(url).query)
+    for name in _QUERY_PARAMS:
+        for value in params.get(name, ()):
+            match = _PAIR_RE.match(value)
+            if match:
+                return _valid(*match.groups())
+    return None
+
+
+# ======================================================
+# NEAREST-SALON INDEX
+# ======================================================
+
+def _unit_vector(lat, lng):
+    lat, lng = math.radians(lat), math.radians(lng)
+    return (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def _build_tree(points, depth=0):
+    """k-d tree node: (point, pk, axis, left, right) or None."""
+    if not points:
+        return None
+    axis = depth % 3
+    points.sort(key=lambda entry: entry[0][axis])
+    mid = len(points) // 2
+    point, pk = points[mid]
+    return (
+        point, pk, axis,
+        _build_tree(points[:mid], depth + 1),
+        _build_tree(points[mid + 1:], depth + 1),
+    )
+
+
+class SalonLocator:
+    """
+    Per-process k-d tree over salon coordinates for nearest-salon lookups.
+
+    Points are unit vectors on the sphere, so straight-line (chord) distance
+    orders salons the same way great-circle distance does and a plain 3-d
+    tree gives exact answers, with no special cases at the antimeridian or
+    the poles.
+
+    Local salon writes drop the tree through signals; writes made by other
+    workers are picked up by comparing the shared salons version (at most
+    every `version_check_interval` seconds) and rebuilding when it moved.
+    """
+    version_check_interval = 5.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self._version = None
+        self._checked_at = 0.0
+        self.built = False
+        self.size = 0
+
+    def rebuild(self):
+        version = get_cache_version(SALONS)
+        rows = Saloon.objects.filter(
+            latitude__isnull=False, longitude__isnull=False,
+        ).values_list("pk", "latitude", "longitude")
+        points = [(_unit_vector(lat, lng), pk) for pk, lat, lng in rows]
+
+        tree = _build_tree(points)
+        with self._lock:
+            self._tree = tree
+            self.size = len(points)
+            self._version = version
+            self._checked_at = time.monotonic()
+            self.built = True
+
+    def warm(self):
+        """Build at worker start; a failure just leaves the lazy build."""
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Could not warm the salon locator")
+
+    def clear(self):
+        with self._lock:
+            self._tree = None
+            self._version = None
+            self.built = False
+            self.size = 0
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self.built and now - self._checked_at < self.version_check_interval:
+            return
+        self._checked_at = now
+        if not self.built or get_cache_version(SALONS) != self._version:
+            self.rebuild()
+
+    def nearest(self, lat, lng, limit=5):
+        """[(salon pk, distance in km)] of the `limit` closest salons."""
+        self.ensure_fresh()
+        target = _unit_vector(lat, lng)
+        best = []   # max-heap of (-squared chord, pk)
+
+        def visit(node):
+            if node is None:
+                return
+            point, pk, axis, left, right = node
+            dist = (
+                (point[0] - target[0]) ** 2
+                + (point[1] - target[1]) ** 2
+                + (point[2] - target[2]) ** 2
+            )
+            if len(best) < limit:
+                heapq.heappush(best, (-dist, pk))
+            elif dist < -best[0][0]:
+                heapq.heapreplace(best, (-dist, pk))
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            # the other side can only help if the splitting plane is closer
+            # than the current worst match
+            if len(best) < limit or diff * diff < -best[0][0]:
+                visit(far)
+
+        tree = self._tree
+        if limit > 0:
+            visit(tree)
+        return [(pk, _chord_to_km(math.sqrt(dist))) for dist, pk in sorted((-d, pk) for d, pk in best)]
+
+
+salon_locator = SalonLocator()
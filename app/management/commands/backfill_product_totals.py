@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute lowest_price, highest_price and total_stock for existing products"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+
+        updated = 0
+        for start in range(0, len(ids), batch_size):
+            updated += Product.refresh_variant_totals(ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} products"))
@@ -0,0 +1,126 @@
+import contextlib
+import gc
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from app import serializers
+from app.fastpath import fast_representation
+from app.models import Category, Product, ProductVariant
+from app.serializers import ProductListSerializer
+from app.storage import storage_url, resized_image_url
+
+
+def _uncached_image_url(request, image, size=None):
+    """The per-field URL building used before AbsoluteImageField."""
+    if not image:
+        return None
+    url = resized_image_url(image, size) if size else image.url
+    return request.build_absolute_uri(url) if request else url
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time loading and rendering ProductListSerializer over a synthetic "
+        "catalog (created in a transaction that is rolled back): uncached vs "
+        "memoized image URLs, serializer.data vs the compiled fast path over "
+        "model instances, and the fast path over .values() rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--variants", type=int, default=2)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--query", default="",
+            help="query string for the simulated request, e.g. 'omit=image_sizes'",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                products = self._make_catalog(options["products"], options["variants"])
+                request = APIRequestFactory().get("/api/products/", QUERY_STRING=options["query"])
+                modes = self._modes()
+                # rounds interleave the modes, so load drift on the machine
+                # hits them all alike
+                best = {}
+                for _ in range(options["repeat"]):
+                    for label, patch, cold, render in modes:
+                        elapsed = self._time(products, request, patch, cold, render)
+                        best[label] = min(best.get(label, elapsed), elapsed)
+                for label, *_ in modes:
+                    self.stdout.write(
+                        f"{label:<16} {best[label] * 1000:9.1f} ms  "
+                        f"{best['warm memo'] / best[label]:5.1f}x warm memo  ({options['products']} products)"
+                    )
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _modes(self):
+        """
+        (label, patch, cold, render): `cold` empties the URL memo before each
+        run. `render` gets the serializer over the unevaluated queryset.
+        """
+        uncached = lambda: mock.patch.object(serializers, "absolute_image_url", _uncached_image_url)  # noqa: E731
+        data = lambda serializer: serializer.data  # noqa: E731
+
+        def instances(serializer):
+            serializer.instance = list(serializer.instance)
+            return fast_representation(serializer)
+
+        return [
+            ("uncached", uncached, True, data),
+            ("cold memo", contextlib.nullcontext, True, data),
+            ("warm memo", contextlib.nullcontext, False, data),
+            ("fast instances", contextlib.nullcontext, False, instances),
+            ("fast rows", contextlib.nullcontext, False, fast_representation),
+        ]
+
+    def _time(self, products, request, patch, cold, render):
+        if cold:
+            storage_url.cache_clear()
+        # a fresh request per run, so the scheme/host prefix is resolved again
+        context = {"request": Request(request.__class__(request.environ))}
+        # like timeit: no collection pauses landing on whichever mode runs
+        gc.collect()
+        gc.disable()
+        try:
+            with patch():
+                start = time.perf_counter()
+                render(ProductListSerializer(products.all(), many=True, context=context))
+                return time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    def _make_catalog(self, count, variants):
+        category = Category.objects.create(name="Benchmark")
+        products = Product.objects.bulk_create([
+            Product(
+                category=category, title=f"Benchmark product {i}", description="",
+                brand="bench",
+                **{f"image{n}": f"product_images/bench_{i}_{n}.jpg" for n in range(1, 5)},
+            )
+            for i in range(count)
+        ])
+        ProductVariant.objects.bulk_create([
+            ProductVariant(
+                product=product, quantity_label=f"{v + 1}00ml",
+                mrp=Decimal("120.00"), price=Decimal("100.00"), stock=10,
+            )
+            for product in products
+            for v in range(variants)
+        ])
+        return ProductListSerializer.setup_eager_loading(
+            Product.objects.filter(category=category).order_by("-created_at")
+        )
@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+import re
+import secrets
+
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+from .cache import RESPONSE_CACHE_TIMEOUT
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+# ======================================================
+# RESPONSE COMPRESSION
+# ======================================================
+
+COMPRESSIBLE_TYPES = ("application/json",)
+# below this a response isn't worth the CPU and headers
+COMPRESSION_MIN_SIZE = 1024
+BROTLI_QUALITY = 5
+# BREACH mitigation, as in django.middleware.gzip.GZipMiddleware
+GZIP_MAX_RANDOM_BYTES = 100
+
+_accept_encoding_re = re.compile(r"\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?")
+
+
+def no_compression(view):
+    """Opt a function view out of response compression."""
+    view.compress_response = False
+    return view
+
+
+def accepted_encoding(request):
+    """'br' or 'gzip' (in that order of preference) if the client takes it."""
+    accepted = set()
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        match = _accept_encoding_re.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compress(content, encoding):
+    """Compressed body, without the per-response gzip padding (see _pad)."""
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return compress_string(content)
+
+
+def _pad(compressed, encoding):
+    """
+    BREACH padding: a random-length file name in the gzip header, as
+    compress_string(max_random_bytes=...) adds. Applied per response, after
+    the cache lookup, so cached bodies don't share one padding.
+    """
+    if encoding != "gzip":
+        return compressed
+    header = bytearray(compressed[:10])
+    header[3] = gzip.FNAME
+    filename = b"a" * secrets.randbelow(GZIP_MAX_RANDOM_BYTES) + b"\x00"
+    return bytes(header) + filename + compressed[10:]
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == "gzip":
+        yield from compress_sequence(chunks, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+        return
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        # flush per chunk so the client keeps receiving data as it's produced
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    gzip / brotli for JSON responses.
+
+    * Responses under COMPRESSION_MIN_SIZE are left alone; streaming
+      responses are compressed chunk by chunk.
+    * Views opt out with ``compress_response = False`` on the class (or
+      ``@no_compression`` on a function view), e.g. responses carrying
+      secrets next to user input (BREACH).
+    * Strong ETags are weakened, as GZipMiddleware does; conditional
+      requests still match since If-None-Match uses weak comparison.
+    * Responses with an ETag are representations of a versioned cache
+      entry (see app.cache.versioned_response), so their compressed body
+      is cached under the ETag and reused instead of compressing again.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        compress = getattr(view_func, "compress_response", getattr(view_class, "compress_response", True))
+        if not compress:
+            request._compress_response = False
+
+    def process_response(self, request, response):
+        if not getattr(request, "_compress_response", True):
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            response.streaming_content = _compress_stream(response.streaming_content, encoding)
+            del response.headers["Content-Length"]
+        else:
+            compressed = self._compressed_content(request, response, encoding)
+            if compressed is None:
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def _compressed_content(self, request, response, encoding):
+        """Compressed body, or None when compressing doesn't make it smaller."""
+        key = self._cache_key(request, response, encoding)
+        compressed = cache.get(key) if key is not None else None
+        if compressed is None:
+            compressed = _compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                compressed = b""
+            if key is not None:
+                cache.set(key, compressed, RESPONSE_CACHE_TIMEOUT)
+        return _pad(compressed, encoding) if compressed else None
+
+    def _cache_key(self, request, response, encoding):
+        etag = response.get("ETag")
+        if request.method != "GET" or response.status_code != 200 or not etag:
+            return None
+        # the same ETag is served as JSON and as the browsable API; absolute
+        # URLs in the body follow the scheme and host, and a view may shape
+        # the body from query params its ETag doesn't cover
+        digest = hashlib.md5(
+            f"{etag}|{response['Content-Type']}|{request.build_absolute_uri()}".encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        return f"compressed:{encoding}:{digest}"
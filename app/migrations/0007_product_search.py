@@ -0,0 +1,55 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:00
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# GIN indexes and pg_trgm only exist on PostgreSQL; SQLite (tests) just gets
+# the nullable column and uses the icontains fallback in app.search.
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS product_search_vector_gin "
+        "ON app_product USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS product_title_trgm_gin "
+        "ON app_product USING gin (title gin_trgm_ops)"
+    )
+    schema_editor.execute(
+        """
+        UPDATE app_product p SET search_vector =
+            setweight(to_tsvector('english', coalesce(p.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(p.brand, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(c.name, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(p.description, '')), 'C')
+        FROM app_category c
+        WHERE c.id = p.category_id
+        """
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS product_title_trgm_gin")
+    schema_editor.execute("DROP INDEX IF EXISTS product_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_product_variant_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:37
+
+import re
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from django.db import migrations, models
+
+
+# Frozen copy of app.geo.coordinates_from_map_url as of this migration, so
+# later changes to the app code can't change what the backfill does.
+_NUMBER = r"(-?\d{1,3}(?:\.\d+)?)"
+_PLACE_RE = re.compile(rf"!3d{_NUMBER}!4d{_NUMBER}")
+_VIEWPORT_RE = re.compile(rf"@{_NUMBER},{_NUMBER}")
+_PAIR_RE = re.compile(rf"^\s*{_NUMBER}\s*,\s*{_NUMBER}\s*$")
+_QUERY_PARAMS = ("q", "query", "ll", "center", "destination", "daddr")
+
+
+def _valid(lat, lng):
+    lat, lng = float(lat), float(lng)
+    if -90 <= lat <= 90 and -180 <= lng <= 180:
+        return lat, lng
+    return None
+
+
+def coordinates_from_map_url(url):
+    if not url:
+        return None
+    url = unquote(url)
+    for pattern in (_PLACE_RE, _VIEWPORT_RE):
+        match = pattern.search(url)
+        if match:
+            return _valid(*match.groups())
+    params = parse_qs(urlsplit(url).query)
+    for name in _QUERY_PARAMS:
+        for value in params.get(name, ()):
+            match = _PAIR_RE.match(value)
+            if match:
+                return _valid(*match.groups())
+    return None
+
+
+def backfill_coordinates(apps, schema_editor):
+    Saloon = apps.get_model("app", "Saloon")
+    salons = []
+    for salon in Saloon.objects.filter(latitude__isnull=True).exclude(google_map_url__isnull=True).exclude(google_map_url=""):
+        coordinates = coordinates_from_map_url(salon.google_map_url)
+        if coordinates:
+            salon.latitude, salon.longitude = coordinates
+            salons.append(salon)
+    Saloon.objects.bulk_update(salons, ["latitude", "longitude"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saloon',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='saloon',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_coordinates, migrations.RunPython.noop),
+    ]
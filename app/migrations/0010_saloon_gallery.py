@@ -0,0 +1,59 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+GALLERY_COLUMNS = ("image1", "image2", "image3", "image4", "image5", "image6")
+
+
+def copy_columns_to_gallery(apps, schema_editor):
+    Saloon = apps.get_model("app", "Saloon")
+    SaloonImage = apps.get_model("app", "SaloonImage")
+    images = []
+    for salon in Saloon.objects.only("id", *GALLERY_COLUMNS).iterator():
+        names = [getattr(salon, column).name for column in GALLERY_COLUMNS]
+        images.extend(
+            SaloonImage(salon_id=salon.pk, image=name, position=position)
+            for position, name in enumerate(name for name in names if name)
+        )
+    SaloonImage.objects.bulk_create(images, batch_size=500)
+
+
+def copy_gallery_to_columns(apps, schema_editor):
+    # only the first six images fit back into the old columns
+    Saloon = apps.get_model("app", "Saloon")
+    SaloonImage = apps.get_model("app", "SaloonImage")
+    salons = {}
+    for image in SaloonImage.objects.order_by("salon_id", "position", "id").iterator():
+        salons.setdefault(image.salon_id, []).append(image.image.name)
+    updated = []
+    for salon in Saloon.objects.filter(pk__in=salons):
+        for column, name in zip(GALLERY_COLUMNS, salons[salon.pk]):
+            setattr(salon, column, name)
+        updated.append(salon)
+    Saloon.objects.bulk_update(updated, GALLERY_COLUMNS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_saloon_coordinates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaloonImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to='saloon_images/')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('salon', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='gallery', to='app.saloon')),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+                'indexes': [models.Index(fields=['salon', 'position'], name='saloonimage_salon_pos_idx')],
+            },
+        ),
+        migrations.RunPython(copy_columns_to_gallery, copy_gallery_to_columns),
+    ]
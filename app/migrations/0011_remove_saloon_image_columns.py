@@ -0,0 +1,40 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:39
+
+from django.db import migrations
+
+
+# Separate from 0010 so the table isn't altered in the same transaction as
+# the data copy (PostgreSQL rejects that with pending trigger events).
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_saloon_gallery'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='saloon',
+            name='image1',
+        ),
+        migrations.RemoveField(
+            model_name='saloon',
+            name='image2',
+        ),
+        migrations.RemoveField(
+            model_name='saloon',
+            name='image3',
+        ),
+        migrations.RemoveField(
+            model_name='saloon',
+            name='image4',
+        ),
+        migrations.RemoveField(
+            model_name='saloon',
+            name='image5',
+        ),
+        migrations.RemoveField(
+            model_name='saloon',
+            name='image6',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+# ?search= filters with title__icontains, i.e. UPPER(title) LIKE UPPER('%term%');
+# a trigram GIN index on UPPER(title) serves that on PostgreSQL.
+
+def create_title_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS cosmetics_title_upper_trgm_gin "
+        "ON app_cosmetics USING gin (UPPER(title) gin_trgm_ops)"
+    )
+
+
+def drop_title_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS cosmetics_title_upper_trgm_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_remove_saloon_image_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cosmetics',
+            index=models.Index(fields=['price', 'id'], name='cosmetics_price_id_idx'),
+        ),
+        migrations.RunPython(create_title_index, drop_title_index),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.db import transaction
+from django.db.models.functions import Coalesce, Upper
 from django.utils import timezone
 
 
@@ -17,15 +19,13 @@ class Saloon(models.Model):
 
     name = models.CharField(max_length=200)
     description = models.TextField()
+    # cover image; the rest of the photos are in SaloonImage (salon.gallery)
     image = models.ImageField(upload_to='saloon_images/')
-    image1=models.ImageField(upload_to='saloon_images/',blank=True,null=True)
-    image2=models.ImageField(upload_to='saloon_images/',blank=True,null=True)
-    image3=models.ImageField(upload_to='saloon_images/',blank=True,null=True)
-    image4=models.ImageField(upload_to='saloon_images/',blank=True,null=True)
-    image5=models.ImageField(upload_to='saloon_images/',blank=True,null=True)
-    image6=models.ImageField(upload_to='saloon_images/',blank=True,null=True)
     google_map_url=models.CharField(max_length=1000,null=True,blank=True)
     location = models.CharField(max_length=300)
+    # filled from google_map_url when left blank (see app.signals)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -33,6 +33,22 @@ class Saloon(models.Model):
     class Meta:
         verbose_name = "Saloon"
         verbose_name_plural = "Saloon"
+
+
+class SaloonImage(models.Model):
+
+    salon = models.ForeignKey(Saloon, on_delete=models.CASCADE, related_name="gallery")
+    image = models.ImageField(upload_to='saloon_images/')
+    position = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.salon} image {self.position}"
+
+    class Meta:
+        ordering = ["position", "id"]
+        indexes = [
+            models.Index(fields=["salon", "position"], name="saloonimage_salon_pos_idx"),
+        ]
     
 
 class FoodMenu(models.Model):
@@ -63,6 +79,10 @@ class Cosmetics(models.Model):
     class Meta:
         verbose_name = "Cosmetic"
         verbose_name_plural = "Cosmetics"
+        indexes = [
+            # price range filter and the (price, id) keyset pagination
+            models.Index(fields=["price", "id"], name="cosmetics_price_id_idx"),
+        ]
 
 
 class Courses(models.Model):
@@ -84,6 +104,10 @@ class Category(models.Model):
 
     class Meta:
         verbose_name_plural = "Categories"
+        indexes = [
+            # ?category= filters with name__iexact (UPPER(name) = UPPER(%s))
+            models.Index(Upper("name"), name="category_name_upper_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -101,12 +125,50 @@ class Product(models.Model):
     image3 = models.ImageField(upload_to='product_images/', blank=True, null=True)
     image4 = models.ImageField(upload_to='product_images/', blank=True, null=True)
 
+    # Denormalized from variants; kept current by app.signals
+    lowest_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    highest_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+    total_stock = models.PositiveIntegerField(default=0, editable=False)
+
+    # Weighted title/brand/category/description vector, maintained by
+    # app.search on PostgreSQL. GIN + trigram indexes live in migration 0007.
+    search_vector = SearchVectorField(null=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # keyset pagination order used by ProductCursorPagination
+            models.Index(fields=["-created_at", "id"], name="product_created_id_idx"),
+            models.Index(fields=["lowest_price"], name="product_lowest_price_idx"),
+            models.Index(fields=["highest_price"], name="product_highest_price_idx"),
+            models.Index(fields=["total_stock"], name="product_total_stock_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
+    @classmethod
+    def refresh_variant_totals(cls, product_ids):
+        """
+        Recompute lowest_price / highest_price / total_stock for the given
+        products in a single UPDATE with correlated subqueries.
+        """
+        variants = (
+            ProductVariant.objects.filter(product=models.OuterRef("pk"))
+            .order_by()
+            .values("product")
+        )
+        return cls.objects.filter(pk__in=product_ids).update(
+            lowest_price=models.Subquery(variants.annotate(v=models.Min("price")).values("v")),
+            highest_price=models.Subquery(variants.annotate(v=models.Max("price")).values("v")),
+            total_stock=Coalesce(
+                models.Subquery(variants.annotate(v=models.Sum("stock")).values("v")), 0
+            ),
+            updated_at=timezone.now(),
+        )
+
 
 class ProductVariant(models.Model):
     product = models.ForeignKey(Product, related_name='variants', on_delete=models.CASCADE)
@@ -187,6 +249,14 @@ class Address(models.Model):
     is_default = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # address book: filter(user).order_by("-is_default", "-created_at")
+            models.Index(fields=["user", "-is_default", "-created_at"], name="address_user_default_idx"),
+            # clearing the previous default: filter(user, is_default=True)
+            models.Index(fields=["user"], condition=models.Q(is_default=True), name="address_user_is_default_idx"),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.label or self.line1}"
 
@@ -220,6 +290,12 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # order history: filter(user).order_by("-created_at")
+            models.Index(fields=["user", "-created_at"], name="order_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
@@ -251,6 +327,16 @@ class PaymentTransaction(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # payment verification: get(razorpay_order_id, user)
+            models.Index(fields=["razorpay_order_id", "user"], name="paytx_rzp_order_user_idx"),
+            # latest transaction of an order: filter(order).order_by("-created_at")
+            models.Index(fields=["order", "-created_at"], name="paytx_order_created_idx"),
+            # dropping stale pending transactions: filter(user, status="created")
+            models.Index(fields=["user"], condition=models.Q(status="created"), name="paytx_user_pending_idx"),
+        ]
+
 
 class PasswordResetOTP(models.Model):
     email = models.EmailField()
@@ -264,3 +350,7 @@ class PasswordResetOTP(models.Model):
     class Meta:
         verbose_name = "Password Reset OTP"
         verbose_name_plural = "Password Reset OTPs"
+        indexes = [
+            # reset: get(email, otp)
+            models.Index(fields=["email", "otp"], name="otp_email_otp_idx"),
+        ]
@@ -1,6 +1,229 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
 
 class StandardResultsPagination(PageNumberPagination):
-    page_size = 2                  
+    page_size = 2
+    page_size_query_param = "page_size"
+    max_page_size = 50
+
+
+class SalonGalleryPagination(PageNumberPagination):
+    page_size = 12
     page_size_query_param = "page_size"
     max_page_size = 50
+
+
+class ProductCursorPagination(BasePagination):
+    """
+    Keyset pagination over (-created_at, id).
+
+    The opaque cursor carries the sort key of the boundary row, so every page
+    is an index range scan from that key instead of an OFFSET over all the
+    rows before it. Page 500 costs the same as page 1.
+
+    Subclasses page over another (key, id) pair by setting `key_field`,
+    `ordering` and the key's cursor encoding.
+    """
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    key_field = "created_at"
+    ordering = ("-created_at", "id")
+    # name of the key in the cursor's JSON
+    cursor_key = "c"
+
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request):
+        return self.ordering
+
+    def encode_key(self, value):
+        return value.isoformat()
+
+    def decode_key(self, raw):
+        return datetime.fromisoformat(raw)
+
+    def get_row_fields(self):
+        """Columns each row of a `.values()` page needs for the cursor links."""
+        return (self.key_field, "id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = bool(self.cursor and self.cursor["reverse"])
+        ordering = self.get_ordering(request)
+        if reverse:
+            # walking back to the previous page scans the other way
+            ordering = tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+        key_order, id_order = ordering
+        if self.cursor:
+            key, pk = self.cursor["key"], self.cursor["id"]
+            key_lookup = f"{self.key_field}__{'lt' if key_order.startswith('-') else 'gt'}"
+            id_lookup = f"id__{'lt' if id_order.startswith('-') else 'gt'}"
+            queryset = queryset.filter(
+                Q(**{key_lookup: key}) | Q(**{self.key_field: key, id_lookup: pk})
+            )
+
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return results
+
+    @property
+    def is_first_page(self):
+        return not self.has_previous
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            return {
+                "key": self.decode_key(raw[self.cursor_key]),
+                "id": int(raw["i"]),
+                "reverse": bool(raw.get("r")),
+            }
+        except (TypeError, ValueError, KeyError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        if isinstance(obj, dict):
+            key, pk = obj[self.key_field], obj["id"]
+        else:
+            key, pk = getattr(obj, self.key_field), obj.pk
+        raw = {self.cursor_key: self.encode_key(key), "i": pk}
+        if reverse:
+            raw["r"] = 1
+        encoded = urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class CosmeticsCursorPagination(ProductCursorPagination):
+    """
+    Keyset pagination over (price, id), cheapest first or, with
+    ``?sort=-price``, most expensive first.
+
+    With the (price, id) index, a page (price range filter included) is a
+    single index range scan starting at the cursor row.
+    """
+    key_field = "price"
+    ordering = ("price", "id")
+    cursor_key = "p"
+    sort_query_param = "sort"
+
+    def get_ordering(self, request):
+        if request.query_params.get(self.sort_query_param) == "-price":
+            return ("-price", "-id")
+        return self.ordering
+
+    def encode_key(self, value):
+        return str(value)
+
+    def decode_key(self, raw):
+        return Decimal(raw)
+
+
+class SearchResultsPagination(ProductCursorPagination):
+    """
+    Pages ranked search results in the queryset's own relevance order.
+
+    Relevance isn't a stable, indexable key, so the opaque cursor carries
+    the offset of the page instead of a boundary row. A search only matches
+    a small slice of the catalog, so the OFFSET stays cheap.
+    """
+    cursor_key = "o"
+
+    def get_row_fields(self):
+        return ()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.offset = self.decode_cursor(request)
+
+        results = list(queryset[self.offset:self.offset + self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.has_previous = self.offset > 0
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.offset + self.page_size)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(max(self.offset - self.page_size, 0))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return 0
+        try:
+            raw = json.loads(urlsafe_b64decode(encoded.encode("ascii")))
+            offset = int(raw[self.cursor_key])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def encode_cursor(self, offset):
+        raw = {self.cursor_key: offset}
+        encoded = urlsafe_b64encode(json.dumps(raw, separators=(",", ":")).encode()).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
@@ -0,0 +1,72 @@
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import Category
+
+
+# Text search configuration used for both the stored vector and queries
+SEARCH_CONFIG = "english"
+
+
+def uses_postgres_search():
+    return connection.vendor == "postgresql"
+
+
+def _product_search_vector():
+    # category name comes through a subquery because UPDATE can't join
+    category_name = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("name")[:1]
+    )
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("brand", weight="B", config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    """
+    Rebuild the stored Product.search_vector for every row in `queryset`
+    with a single UPDATE. No-op outside PostgreSQL.
+    """
+    if not uses_postgres_search():
+        return 0
+    return queryset.update(search_vector=_product_search_vector())
+
+
+def search_products(queryset, term):
+    """
+    Filter and rank `queryset` by `term`.
+
+    On PostgreSQL this matches the GIN-indexed search_vector (title, brand,
+    description, category name) and falls back to the trigram index on
+    title for misspellings; results come back ordered by relevance.
+    Elsewhere it degrades to icontains over the same columns so the test
+    suite runs on SQLite.
+    """
+    term = term.strip()
+    if not term:
+        return queryset
+
+    if not uses_postgres_search():
+        return queryset.filter(
+            Q(title__icontains=term)
+            | Q(brand__icontains=term)
+            | Q(description__icontains=term)
+            | Q(category__name__icontains=term)
+        )
+
+    query = SearchQuery(term, search_type="websearch", config=SEARCH_CONFIG)
+    return (
+        queryset
+        .filter(Q(search_vector=query) | Q(title__trigram_word_similar=term))
+        .annotate(
+            search_rank=SearchRank(F("search_vector"), query),
+            title_similarity=TrigramWordSimilarity(term, "title"),
+        )
+        .order_by("-search_rank", "-title_similarity", "-created_at", "id")
+    )
@@ -1,10 +1,12 @@
 from rest_framework import serializers
+from django.db.models import BooleanField, Count, DecimalField, ExpressionWrapper, F, Prefetch, Q, Sum, Window
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 
+from .storage import IMAGE_SIZES, SRCSET_SIZES, image_url
 from .models import (
-    BannerImage, Cosmetics, Saloon, FoodMenu, Courses,
+    BannerImage, Cosmetics, Saloon, SaloonImage, FoodMenu, Courses,
     Product, ProductVariant, Category, Cart, CartItem,
     Wishlist, WishlistItem, Address, Order, OrderItem,
     PaymentTransaction, PasswordResetOTP,
@@ -14,82 +16,264 @@ from .models import (
 # COMMON IMAGE HELPER (DRY + SAFE)
 # ======================================================
 
+def absolute_url_prefix(request):
+    """Scheme + host of `request`, resolved once and kept on the request."""
+    http_request = getattr(request, "_request", request)
+    prefix = getattr(http_request, "_absolute_url_prefix", None)
+    if prefix is None:
+        prefix = http_request.build_absolute_uri("/")[:-1]
+        http_request._absolute_url_prefix = prefix
+    return prefix
+
+
+def absolute_url(request, url):
+    if url is None or request is None:
+        return url
+    if url.startswith("/") and not url.startswith("//"):
+        return absolute_url_prefix(request) + url
+    if url.startswith(("https://", "http://")):
+        # CDN URL, already IRI-encoded by app.storage.storage_url()
+        return url
+    return request.build_absolute_uri(url)
+
+
+def absolute_image_url(request, image, size=None):
+    return absolute_url(request, image_url(image, size))
+
+
+def image_sizes(urls):
+    """
+    {size: url} for every IMAGE_SIZES entry -> the image_sizes payload, with a
+    srcset over the uncropped SRCSET_SIZES.
+    """
+    sizes = dict(urls)
+    sizes["srcset"] = ", ".join(f"{urls[size]} {IMAGE_SIZES[size][0]}w" for size in SRCSET_SIZES)
+    return sizes
+
+
 class AbsoluteImageMixin:
     def get_abs_url(self, request, image):
-        if image:
-            return request.build_absolute_uri(image.url) if request else image.url
-        return None
+        return absolute_image_url(request, image)
+
+    def get_abs_sizes(self, request, image):
+        """Resized renditions of `image` (see app.storage.IMAGE_SIZES) plus a srcset string."""
+        if not image:
+            return None
+        return image_sizes({size: absolute_image_url(request, image, size) for size in IMAGE_SIZES})
+
+
+class AbsoluteImageField(AbsoluteImageMixin, serializers.Field):
+    """
+    Read-only absolute URL of an image field. The storage URL is memoized
+    per image name (app.storage.image_url) and the scheme/host prefix per
+    request, so rendering a page of images skips the repeated storage and
+    build_absolute_uri work.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        return self.get_abs_url(self.context.get("request"), image)
+
+
+class ImageSizesField(AbsoluteImageField):
+    """Read-only renditions (thumb, card, small, medium, full) of an image field."""
+
+    def to_representation(self, image):
+        return self.get_abs_sizes(self.context.get("request"), image)
+
+
+# ======================================================
+# SPARSE FIELDSETS (?fields= / ?omit= / ?expand=)
+# ======================================================
+
+def _parse_field_paths(value):
+    """'id,variants.price' -> {'id': {}, 'variants': {'price': {}}}"""
+    tree = {}
+    for path in (value or "").split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for part in path.split("."):
+            node = node.setdefault(part, {})
+    return tree
+
+
+# query params that shape a DynamicFieldsMixin payload; responses built from
+# one must vary their cache keys and ETags on these
+FIELDSET_PARAMS = ("fields", "omit", "expand")
+
+
+class DynamicFieldsMixin:
+    """
+    Lets the client shape the response from the query string:
+
+    * ``?fields=id,title,variants.price`` keeps only the listed fields
+    * ``?omit=description,variants.product`` drops fields
+    * ``?expand=category`` renders only the listed nested serializers in
+      full; every other nested relation collapses to its primary key(s).
+      Without ``expand`` everything nests as before.
+
+    Dotted paths reach into nested serializers. Only the root serializer
+    reads the request; nested ones get their slice of the spec from it.
+    """
+
+    def get_field_spec(self):
+        spec = getattr(self, "_field_spec", None)
+        if spec is not None:
+            return spec
+
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        request = self.context.get("request")
+        if parent is not None or request is None:
+            return None
+
+        params = request.query_params
+        if not any(p in params for p in FIELDSET_PARAMS):
+            return None
+        return (
+            _parse_field_paths(params.get("fields")) or None,
+            _parse_field_paths(params.get("omit")),
+            _parse_field_paths(params["expand"]) if "expand" in params else None,
+        )
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.get_field_spec()
+        if spec is None:
+            return fields
+
+        only, omit, expand = spec
+        for name in list(fields):
+            if only is not None and name not in only:
+                del fields[name]
+                continue
+            if name in omit and not omit[name]:
+                del fields[name]
+                continue
+
+            field = fields[name]
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, DynamicFieldsMixin):
+                continue
+
+            if expand is not None and name not in expand:
+                kwargs = {"read_only": True, "many": many}
+                if field.source not in (None, name):
+                    kwargs["source"] = field.source
+                fields[name] = serializers.PrimaryKeyRelatedField(**kwargs)
+                continue
+
+            nested._field_spec = (
+                (only[name] or None) if only is not None else None,
+                omit.get(name, {}),
+                expand.get(name, {}) if expand is not None else None,
+            )
+        return fields
+
+    @classmethod
+    def fields_for_request(cls, request):
+        """The field set this serializer would render for `request`."""
+        return cls(context={"request": request}).fields
+
+
+def _model_attrs(fields, model):
+    """Concrete model fields that the given (bound) serializer fields read."""
+    attrs = set()
+    for name, field in fields.items():
+        source = field.source or name
+        attrs.add(name if source == "*" else source.split(".")[0])
+    return attrs & {f.name for f in model._meta.concrete_fields}
+
+
+class DynamicFieldsModelSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    pass
 
 
 # ======================================================
 # BASIC MODELS
 # ======================================================
 
-class BannerImageSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
-    image = serializers.SerializerMethodField()
+class BannerImageSerializer(DynamicFieldsModelSerializer):
+    image = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image")
 
     class Meta:
         model = BannerImage
         fields = "__all__"
 
-    def get_image(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.image)
 
+class SaloonImageSerializer(DynamicFieldsModelSerializer):
+    image = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image")
 
-class SaloonSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
-    image = serializers.SerializerMethodField()
-    image1 = serializers.SerializerMethodField()
-    image2 = serializers.SerializerMethodField()
-    image3 = serializers.SerializerMethodField()
-    image4 = serializers.SerializerMethodField()
-    image5 = serializers.SerializerMethodField()
-    image6 = serializers.SerializerMethodField()
+    class Meta:
+        model = SaloonImage
+        fields = ["id", "image", "image_sizes", "position"]
+
+
+class SaloonListSerializer(DynamicFieldsModelSerializer):
+    """Salon card: the cover image and how many gallery photos there are."""
+    image = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image")
+    gallery_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Saloon
-        fields = "__all__"
+        fields = [
+            "id", "name", "description", "image", "image_sizes", "gallery_count",
+            "google_map_url", "location", "latitude", "longitude",
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.annotate(gallery_count=Count("gallery"))
+
 
-    def get_image(self, obj): return self.get_abs_url(self.context.get("request"), obj.image)
-    def get_image1(self, obj): return self.get_abs_url(self.context.get("request"), obj.image1)
-    def get_image2(self, obj): return self.get_abs_url(self.context.get("request"), obj.image2)
-    def get_image3(self, obj): return self.get_abs_url(self.context.get("request"), obj.image3)
-    def get_image4(self, obj): return self.get_abs_url(self.context.get("request"), obj.image4)
-    def get_image5(self, obj): return self.get_abs_url(self.context.get("request"), obj.image5)
-    def get_image6(self, obj): return self.get_abs_url(self.context.get("request"), obj.image6)
+class SaloonSerializer(SaloonListSerializer):
+    """Salon detail, with the whole gallery."""
+    gallery = SaloonImageSerializer(many=True, read_only=True)
 
+    class Meta(SaloonListSerializer.Meta):
+        fields = SaloonListSerializer.Meta.fields + ["gallery"]
 
-class FoodMenuSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
-    image = serializers.SerializerMethodField()
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return SaloonListSerializer.setup_eager_loading(queryset).prefetch_related("gallery")
+
+
+class FoodMenuSerializer(DynamicFieldsModelSerializer):
+    image = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image")
 
     class Meta:
         model = FoodMenu
-        fields = ["id", "title", "description", "image", "price"]
-
-    def get_image(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.image)
+        fields = ["id", "title", "description", "image", "image_sizes", "price"]
 
 
-class CosmeticsSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
-    image = serializers.SerializerMethodField()
+class CosmeticsSerializer(DynamicFieldsModelSerializer):
+    image = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image")
 
     class Meta:
         model = Cosmetics
-        fields = ["id", "title", "description", "image", "price"]
+        fields = ["id", "title", "description", "image", "image_sizes", "price"]
 
-    def get_image(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.image)
 
-
-class CourseSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
-    image = serializers.SerializerMethodField()
+class CourseSerializer(DynamicFieldsModelSerializer):
+    image = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image")
 
     class Meta:
         model = Courses
         fields = "__all__"
 
-    def get_image(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.image)
-
 
 # ======================================================
 # AUTH SERIALIZERS
@@ -155,24 +339,22 @@ class UserProfileSerializer(serializers.ModelSerializer):
 # CATEGORY / PRODUCT / VARIANT
 # ======================================================
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Category
         fields = ["id", "name"]
 
 
-class ProductInCartSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
-    image1 = serializers.SerializerMethodField()
+class ProductInCartSerializer(DynamicFieldsModelSerializer):
+    image1 = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image1")
 
     class Meta:
         model = Product
-        fields = ["id", "title", "brand", "image1"]
+        fields = ["id", "title", "brand", "image1", "image_sizes"]
 
-    def get_image1(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.image1)
 
-
-class ProductVariantSerializer(serializers.ModelSerializer):
+class ProductVariantSerializer(DynamicFieldsModelSerializer):
     product = ProductInCartSerializer(read_only=True)
 
     class Meta:
@@ -180,27 +362,61 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         fields = ["id", "quantity_label", "mrp", "price", "stock", "sku", "product"]
 
 
-class ProductListSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
+class ProductListSerializer(DynamicFieldsModelSerializer):
     category = CategorySerializer(read_only=True)
     category_name = serializers.CharField(source="category.name", read_only=True)
     variants = ProductVariantSerializer(many=True, read_only=True)
-    image1 = serializers.SerializerMethodField()
-    image2 = serializers.SerializerMethodField()
-    image3 = serializers.SerializerMethodField()
-    image4 = serializers.SerializerMethodField()
+    image1 = AbsoluteImageField()
+    image2 = AbsoluteImageField()
+    image3 = AbsoluteImageField()
+    image4 = AbsoluteImageField()
+    image_sizes = ImageSizesField(source="image1")
 
     class Meta:
         model = Product
         fields = [
             "id", "title", "brand",
-            "image1", "image2", "image3", "image4",
-            "category", "category_name", "variants",
+            "image1", "image2", "image3", "image4", "image_sizes",
+            "category", "category_name", "variants", "lowest_price",
         ]
 
-    def get_image1(self, obj): return self.get_abs_url(self.context.get("request"), obj.image1)
-    def get_image2(self, obj): return self.get_abs_url(self.context.get("request"), obj.image2)
-    def get_image3(self, obj): return self.get_abs_url(self.context.get("request"), obj.image3)
-    def get_image4(self, obj): return self.get_abs_url(self.context.get("request"), obj.image4)
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None):
+        """
+        Load category and variants up front so serializing N products costs
+        a fixed number of queries. The reverse-FK prefetch also fills
+        variant.product with the parent row, so the nested product inside
+        each variant never hits the DB again.
+
+        Given the rendered field set (see ``fields_for_request``), only the
+        columns and relations those fields read are loaded.
+        """
+        if fields is None:
+            return queryset.select_related("category").defer("search_vector").prefetch_related(
+                Prefetch("variants", queryset=ProductVariant.objects.order_by("id"))
+            )
+
+        # created_at is the pagination cursor key
+        product_attrs = _model_attrs(fields, Product) | {"id", "created_at"}
+        variants = fields.get("variants")
+        if variants is not None:
+            variant_qs = ProductVariant.objects.order_by("id")
+            if isinstance(variants, serializers.ListSerializer):
+                variant_fields = variants.child.fields
+                variant_qs = variant_qs.only(
+                    "id", "product", *_model_attrs(variant_fields, ProductVariant)
+                )
+                # variant.product is the parent row, so load what it renders too
+                nested_product = variant_fields.get("product")
+                if isinstance(nested_product, serializers.Serializer):
+                    product_attrs |= _model_attrs(nested_product.fields, Product)
+            else:
+                variant_qs = variant_qs.only("id", "product")
+            queryset = queryset.prefetch_related(Prefetch("variants", queryset=variant_qs))
+
+        if "category" in product_attrs:
+            queryset = queryset.select_related("category")
+        return queryset.only(*product_attrs)
 
 
 class ProductDetailSerializer(ProductListSerializer):
@@ -212,56 +428,106 @@ class ProductDetailSerializer(ProductListSerializer):
 # CART
 # ======================================================
 
-class CartItemSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
+_LINE_TOTAL = ExpressionWrapper(
+    F("quantity") * F("variant__price"), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+class CartItemSerializer(DynamicFieldsModelSerializer):
     variant = ProductVariantSerializer(read_only=True)
-    total_price = serializers.FloatField(read_only=True)
+    total_price = serializers.FloatField(source="line_total", read_only=True)
+    low_stock = serializers.BooleanField(read_only=True)
     product_title = serializers.CharField(source="variant.product.title", read_only=True)
     product_brand = serializers.CharField(source="variant.product.brand", read_only=True)
-    product_image = serializers.SerializerMethodField()
+    product_image = AbsoluteImageField(source="variant.product.image1")
+    product_image_sizes = ImageSizesField(source="variant.product.image1")
 
     class Meta:
         model = CartItem
         fields = [
             "id", "variant",
             "product_title", "product_brand",
-            "product_image", "quantity", "total_price",
+            "product_image", "product_image_sizes", "quantity", "total_price", "low_stock",
         ]
 
-    def get_product_image(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.variant.product.image1)
-
-
-class CartSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Variant and product in the same query, with the line total, the
+        whole cart's total (a window over the cart's rows) and a flag for
+        lines asking for more than is left in stock computed in SQL.
+        """
+        return queryset.select_related("variant__product").annotate(
+            line_total=_LINE_TOTAL,
+            cart_total=Window(Sum(_LINE_TOTAL), partition_by=[F("cart_id")]),
+            low_stock=ExpressionWrapper(Q(variant__stock__lt=F("quantity")), output_field=BooleanField()),
+        ).order_by("pk")
+
+
+class CartSerializer(DynamicFieldsModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     cart_total = serializers.SerializerMethodField()
+    has_low_stock = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
-        fields = ["id", "items", "cart_total"]
+        fields = ["id", "items", "cart_total", "has_low_stock"]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """The cart and its annotated items: two queries, whatever the size."""
+        return queryset.prefetch_related(
+            Prefetch("items", queryset=CartItemSerializer.setup_eager_loading(CartItem.objects.all()))
+        )
 
     def get_cart_total(self, obj):
-        return sum(item.total_price for item in obj.items.all())
+        items = obj.items.all()
+        return float(items[0].cart_total) if items else 0
+
+    def get_has_low_stock(self, obj):
+        return any(item.low_stock for item in obj.items.all())
+
+
+class CartOperationSerializer(serializers.Serializer):
+    ADD, SET, REMOVE = "add", "set", "remove"
+
+    op = serializers.ChoiceField(choices=[ADD, SET, REMOVE])
+    variant_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        if attrs["op"] == self.ADD:
+            attrs.setdefault("quantity", 1)
+            if attrs["quantity"] < 1:
+                raise serializers.ValidationError({"quantity": "Must be at least 1 for add."})
+        elif attrs["op"] == self.SET and "quantity" not in attrs:
+            raise serializers.ValidationError({"quantity": "Required for set."})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=CartOperationSerializer(), allow_empty=False, max_length=100,
+    )
 
 
 # ======================================================
 # WISHLIST
 # ======================================================
 
-class WishlistItemSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
+class WishlistItemSerializer(DynamicFieldsModelSerializer):
     variant = ProductVariantSerializer(read_only=True)
     product_title = serializers.CharField(source="variant.product.title", read_only=True)
     product_brand = serializers.CharField(source="variant.product.brand", read_only=True)
-    product_image = serializers.SerializerMethodField()
+    product_image = AbsoluteImageField(source="variant.product.image1")
+    product_image_sizes = ImageSizesField(source="variant.product.image1")
 
     class Meta:
         model = WishlistItem
-        fields = ["id", "variant", "product_title", "product_brand", "product_image"]
-
-    def get_product_image(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.variant.product.image1)
+        fields = ["id", "variant", "product_title", "product_brand", "product_image", "product_image_sizes"]
 
 
-class WishlistSerializer(serializers.ModelSerializer):
+class WishlistSerializer(DynamicFieldsModelSerializer):
     items = WishlistItemSerializer(many=True, read_only=True, source="wishlist_items")
 
     class Meta:
@@ -273,7 +539,7 @@ class WishlistSerializer(serializers.ModelSerializer):
 # ADDRESS / ORDER
 # ======================================================
 
-class AddressSerializer(serializers.ModelSerializer):
+class AddressSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Address
         fields = ['id', 'label', 'line1', 'line2', 'city', 'state', 'postal_code', 'country', 'phone', 'is_default']
@@ -292,25 +558,23 @@ class AddressSerializer(serializers.ModelSerializer):
 
         
 
-class OrderItemSerializer(serializers.ModelSerializer, AbsoluteImageMixin):
+class OrderItemSerializer(DynamicFieldsModelSerializer):
     variant = ProductVariantSerializer(read_only=True)
     product_title = serializers.CharField(source="variant.product.title", read_only=True)
     product_brand = serializers.CharField(source="variant.product.brand", read_only=True)
-    product_image = serializers.SerializerMethodField()
+    product_image = AbsoluteImageField(source="variant.product.image1")
+    product_image_sizes = ImageSizesField(source="variant.product.image1")
 
     class Meta:
         model = OrderItem
         fields = [
             "id", "variant", "product_title",
-            "product_brand", "product_image",
+            "product_brand", "product_image", "product_image_sizes",
             "quantity", "unit_price", "total_price",
         ]
 
-    def get_product_image(self, obj):
-        return self.get_abs_url(self.context.get("request"), obj.variant.product.image1)
 
-
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     shipping_address = AddressSerializer(read_only=True)
     billing_address = AddressSerializer(read_only=True)
@@ -323,6 +587,10 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "created_at", "updated_at"]
 
     def _tx(self, obj):
+        # filled by OrderListSerializer.setup_eager_loading
+        transactions = getattr(obj, "latest_transactions", None)
+        if transactions is not None:
+            return transactions[0] if transactions else None
         return PaymentTransaction.objects.filter(order=obj).order_by("-created_at").first()
 
     def get_razorpay_order_id(self, obj):
@@ -334,7 +602,7 @@ class OrderSerializer(serializers.ModelSerializer):
         return tx.razorpay_payment_id if tx else None
 
 
-class OrderListSerializer(OrderSerializer):
+class OrderListSerializer(OrderSerializer, AbsoluteImageMixin):
     first_product_image = serializers.SerializerMethodField()
     first_product_title = serializers.SerializerMethodField()
     items_count = serializers.SerializerMethodField()
@@ -350,10 +618,26 @@ class OrderListSerializer(OrderSerializer):
             "shipping_address", "billing_address",
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Addresses, items (with variant and product) and the latest payment
+        transaction up front. Items are ordered by pk, so items.first()
+        and items.count() are answered from the prefetch cache.
+        """
+        return queryset.select_related("shipping_address", "billing_address").prefetch_related(
+            Prefetch("items", queryset=OrderItem.objects.select_related("variant__product").order_by("pk")),
+            Prefetch(
+                "paymenttransaction_set",
+                queryset=PaymentTransaction.objects.order_by("-created_at"),
+                to_attr="latest_transactions",
+            ),
+        )
+
     def get_first_product_image(self, obj):
         first_item = obj.items.first()
         if first_item:
-            return self.context.get("request").build_absolute_uri(first_item.variant.product.image1.url)
+            return self.get_abs_url(self.context.get("request"), first_item.variant.product.image1)
         return None
 
     def get_first_product_title(self, obj):
@@ -0,0 +1,186 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import BANNER, CATALOG, COSMETICS, COURSES, FOOD, SALONS, bump_cache_version
+from .models import (
+    BannerImage, Category, Cosmetics, Courses, FoodMenu, Product, ProductVariant, Saloon, SaloonImage,
+)
+from .geo import coordinates_from_map_url, salon_locator
+from .search import update_search_vectors
+from .snapshots import content_snapshot
+from .suggest import suggest_index
+
+
+# --------------------------------------------------
+# PRODUCT PRICE / STOCK TOTALS
+# --------------------------------------------------
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def refresh_product_totals(sender, instance, **kwargs):
+    Product.refresh_variant_totals([instance.product_id])
+
+
+# --------------------------------------------------
+# PRODUCT SEARCH VECTOR
+# --------------------------------------------------
+
+@receiver(post_save, sender=Product)
+def refresh_product_search_vector(sender, instance, **kwargs):
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def refresh_category_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(instance.products.all())
+
+
+# --------------------------------------------------
+# RESPONSE CACHE / ETAG INVALIDATION
+# --------------------------------------------------
+# Versions are bumped after commit, so a concurrent reader can't re-cache
+# the old rows under the new version.
+
+def _bump_after_commit(namespace):
+    transaction.on_commit(lambda: bump_cache_version(namespace))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog(sender, **kwargs):
+    _bump_after_commit(CATALOG)
+
+
+@receiver(post_save, sender=BannerImage)
+@receiver(post_delete, sender=BannerImage)
+def invalidate_banner(sender, **kwargs):
+    _bump_after_commit(BANNER)
+
+
+@receiver(post_save, sender=Saloon)
+@receiver(post_delete, sender=Saloon)
+@receiver(post_save, sender=SaloonImage)
+@receiver(post_delete, sender=SaloonImage)
+def invalidate_salons(sender, **kwargs):
+    _bump_after_commit(SALONS)
+
+
+@receiver(post_save, sender=Courses)
+@receiver(post_delete, sender=Courses)
+def invalidate_courses(sender, **kwargs):
+    _bump_after_commit(COURSES)
+
+
+@receiver(post_save, sender=FoodMenu)
+@receiver(post_delete, sender=FoodMenu)
+def invalidate_food(sender, **kwargs):
+    _bump_after_commit(FOOD)
+
+
+@receiver(post_save, sender=Cosmetics)
+@receiver(post_delete, sender=Cosmetics)
+def invalidate_cosmetics(sender, **kwargs):
+    _bump_after_commit(COSMETICS)
+
+
+# --------------------------------------------------
+# TYPEAHEAD INDEX
+# --------------------------------------------------
+
+@receiver(post_save, sender=Product)
+def suggest_index_product_saved(sender, instance, **kwargs):
+    pk, title, brand = instance.pk, instance.title, instance.brand
+    transaction.on_commit(lambda: suggest_index.update_product(pk, title, brand))
+
+
+@receiver(post_delete, sender=Product)
+def suggest_index_product_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove_product(pk))
+
+
+@receiver(post_save, sender=Category)
+def suggest_index_category_saved(sender, instance, **kwargs):
+    pk, name = instance.pk, instance.name
+    transaction.on_commit(lambda: suggest_index.update_category(pk, name))
+
+
+@receiver(post_delete, sender=Category)
+def suggest_index_category_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove_category(pk))
+
+
+# --------------------------------------------------
+# CONTENT PAGE SNAPSHOT
+# --------------------------------------------------
+# Other workers notice the version bump above; this one drops its pages
+# straight away.
+
+def _drop_snapshot_after_commit(namespace):
+    transaction.on_commit(lambda: content_snapshot.invalidate(namespace))
+
+
+@receiver(post_save, sender=BannerImage)
+@receiver(post_delete, sender=BannerImage)
+def snapshot_banner_changed(sender, **kwargs):
+    _drop_snapshot_after_commit(BANNER)
+
+
+@receiver(post_save, sender=Saloon)
+@receiver(post_delete, sender=Saloon)
+@receiver(post_save, sender=SaloonImage)
+@receiver(post_delete, sender=SaloonImage)
+def snapshot_salons_changed(sender, **kwargs):
+    _drop_snapshot_after_commit(SALONS)
+
+
+@receiver(post_save, sender=Courses)
+@receiver(post_delete, sender=Courses)
+def snapshot_courses_changed(sender, **kwargs):
+    _drop_snapshot_after_commit(COURSES)
+
+
+@receiver(post_save, sender=FoodMenu)
+@receiver(post_delete, sender=FoodMenu)
+def snapshot_food_changed(sender, **kwargs):
+    _drop_snapshot_after_commit(FOOD)
+
+
+# --------------------------------------------------
+# SALON COORDINATES / NEAREST-SALON INDEX
+# --------------------------------------------------
+
+@receiver(pre_save, sender=Saloon)
+def fill_salon_coordinates(sender, instance, update_fields=None, **kwargs):
+    """
+    Coordinates from google_map_url when they're blank, and again when the
+    URL changes, unless the same save sets the coordinates as well.
+    """
+    if update_fields is not None and "google_map_url" not in update_fields:
+        return
+    refill = instance.latitude is None or instance.longitude is None
+    if not refill and not instance._state.adding:
+        stored = Saloon.objects.filter(pk=instance.pk).values_list(
+            "google_map_url", "latitude", "longitude"
+        ).first()
+        refill = (
+            stored is not None
+            and stored[0] != instance.google_map_url
+            and stored[1:] == (instance.latitude, instance.longitude)
+        )
+    if refill:
+        # a link without coordinates clears them rather than keep stale ones
+        instance.latitude, instance.longitude = coordinates_from_map_url(instance.google_map_url) or (None, None)
+
+
+@receiver(post_save, sender=Saloon)
+@receiver(post_delete, sender=Saloon)
+def salon_locator_changed(sender, **kwargs):
+    transaction.on_commit(salon_locator.clear)
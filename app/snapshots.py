@@ -0,0 +1,180 @@
+import logging
+import threading
+
+from django.http import HttpRequest, HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .cache import BANNER, COURSES, FOOD, SALONS, get_cache_version
+from .fastpath import fast_representation
+from .models import BannerImage, Courses, FoodMenu, Saloon
+from .renderers import dumps
+from .serializers import (
+    BannerImageSerializer, CourseSerializer, FoodMenuSerializer, SaloonListSerializer,
+    SaloonSerializer, FIELDSET_PARAMS, absolute_url_prefix,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ======================================================
+# CONTENT PAGES
+# ======================================================
+# Payloads of the home / salons / food court / academy pages, used both
+# by the views' regular path and to pre-render the snapshot.
+
+def home_page(request):
+    latest_image = BannerImage.objects.order_by('-uploaded_at').first()
+    serializer = (
+        BannerImageSerializer(latest_image, context={'request': request})
+        if latest_image else None
+    )
+    return {
+        "page": "Home",
+        "content": "This is the Home page.",
+        "video": serializer.data if serializer else None
+    }
+
+
+def salons_page(request, salons=None):
+    if salons is None:
+        salons = SaloonListSerializer.setup_eager_loading(Saloon.objects.all())
+    serializer = SaloonListSerializer(salons, many=True, context={'request': request})
+    return {
+        "page": "Salons page",
+        "data": fast_representation(serializer)
+    }
+
+
+def salon_detail_page(request, salon):
+    """`salon` as loaded by SaloonSerializer.setup_eager_loading."""
+    serializer = SaloonSerializer(salon, context={'request': request})
+    return {
+        "page": "Salon Detail",
+        "data": serializer.data
+    }
+
+
+def food_court_page(request):
+    food_items = FoodMenu.objects.all()
+    serializer = FoodMenuSerializer(food_items, many=True, context={'request': request})
+    return {
+        "page": "Food Menu",
+        "data": serializer.data
+    }
+
+
+def academy_page(request):
+    courses = Courses.objects.all()
+    course_serializer = CourseSerializer(courses, many=True, context={"request": request})
+    return {
+        "page": "course",
+        "data": course_serializer.data
+    }
+
+
+def _render_salons(request):
+    # one query for the cards (and gallery counts) plus one for every gallery
+    salons = list(SaloonSerializer.setup_eager_loading(Saloon.objects.all()))
+    pages = {"salons": dumps(salons_page(request, salons))}
+    for salon in salons:
+        pages[f"salon:{salon.pk}"] = dumps(salon_detail_page(request, salon))
+    return pages
+
+
+# namespace -> request -> {page key: rendered JSON}
+PAGE_RENDERERS = {
+    BANNER: lambda request: {"home": dumps(home_page(request))},
+    SALONS: _render_salons,
+    FOOD: lambda request: {"food-court": dumps(food_court_page(request))},
+    COURSES: lambda request: {"academy": dumps(academy_page(request))},
+}
+
+
+# ======================================================
+# PER-WORKER SNAPSHOT
+# ======================================================
+
+# Stand-in for the scheme + host while pre-rendering; swapped for the real
+# request's prefix when a page is served. ".invalid" can't be a real host.
+SNAPSHOT_URL_PREFIX = "http://snapshot.invalid"
+
+
+def _snapshot_request():
+    http_request = HttpRequest()
+    http_request._absolute_url_prefix = SNAPSHOT_URL_PREFIX
+    return Request(http_request)
+
+
+class ContentSnapshot:
+    """
+    Per-worker, pre-rendered JSON of the content pages, so a hit costs one
+    version lookup in the shared cache, no queries and no serialization.
+
+    Each namespace's pages are stored with the namespace version they were
+    built under. The version is compared on every read, so a bump from any
+    worker (model signals, see app.signals) is seen immediately; local
+    writes also drop the namespace right away.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pages = {}    # namespace -> (version, {page key: bytes})
+
+    def warm(self):
+        """Build at worker start; a failure just leaves the lazy build."""
+        for namespace in PAGE_RENDERERS:
+            try:
+                self._load(namespace, get_cache_version(namespace))
+            except Exception:
+                logger.exception("Could not warm the %s content snapshot", namespace)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._pages.pop(namespace, None)
+
+    def _load(self, namespace, version):
+        with self._lock:
+            entry = self._pages.get(namespace)
+            if entry is not None and entry[0] == version:
+                return entry
+            # rows read after the version: at worst newer than it, and
+            # the next bump rebuilds anyway
+            entry = (version, PAGE_RENDERERS[namespace](_snapshot_request()))
+            self._pages[namespace] = entry
+            return entry
+
+    def get(self, namespace, key, request):
+        """Rendered page for `request`, or None if the page doesn't exist."""
+        version = get_cache_version(namespace)
+        entry = self._pages.get(namespace)
+        if entry is None or entry[0] != version:
+            entry = self._load(namespace, version)
+        body = entry[1].get(key)
+        if body is None:
+            return None
+        return body.replace(SNAPSHOT_URL_PREFIX.encode(), absolute_url_prefix(request).encode())
+
+
+content_snapshot = ContentSnapshot()
+
+
+def snapshot_response(request, namespace, key):
+    """
+    The page straight from the snapshot, or None when the request needs the
+    regular path (sparse fieldsets, browsable API / indented JSON, or a
+    page the snapshot doesn't have).
+    """
+    if any(param in request.query_params for param in FIELDSET_PARAMS):
+        return None
+    renderer = getattr(request, "accepted_renderer", None)
+    if not isinstance(renderer, JSONRenderer) or request.accepted_media_type != renderer.media_type:
+        return None
+    body = content_snapshot.get(namespace, key, request)
+    if body is None:
+        return None
+    return HttpResponse(body, content_type="application/json")
@@ -0,0 +1,133 @@
+import functools
+import os
+from io import BytesIO
+
+import cloudinary
+from cloudinary_storage.storage import MediaCloudinaryStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import DefaultStorage, FileSystemStorage, storages
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import iri_to_uri
+from PIL import Image, ImageOps
+
+
+# ======================================================
+# RESPONSIVE IMAGE SIZES
+# ======================================================
+# name -> (width, height, crop). "fill" crops to the exact box, "limit"
+# only scales down and keeps the aspect ratio.
+
+IMAGE_SIZES = {
+    "thumb": (128, 128, "fill"),
+    "card": (480, 480, "fill"),
+    "small": (480, None, "limit"),
+    "medium": (960, None, "limit"),
+    "full": (1600, None, "limit"),
+}
+
+# srcset candidates must be the same picture at different widths, so only
+# the width-only renditions go in; the square crops stay named URLs.
+SRCSET_SIZES = tuple(sorted(
+    (size for size, (_, height, crop) in IMAGE_SIZES.items() if height is None and crop == "limit"),
+    key=lambda size: IMAGE_SIZES[size][0],
+))
+
+
+# Storage name -> URL memo shared by every request of the worker. Image
+# names are unique per upload, so an entry only goes stale if the storage
+# configuration itself changes.
+IMAGE_URL_CACHE_SIZE = 20_000
+
+
+def resized_image_url(image, size):
+    """
+    URL of `image` rendered at one of IMAGE_SIZES. Falls back to the
+    original upload when the storage can't produce resized variants.
+    """
+    if not image:
+        return None
+    storage = image.storage
+    if hasattr(storage, "resized_url"):
+        return storage.resized_url(image.name, size)
+    return image.url
+
+
+@functools.lru_cache(maxsize=IMAGE_URL_CACHE_SIZE)
+def storage_url(storage, name, size=None):
+    """Memoized URL of the stored file `name` (resized with `size`)."""
+    if size is not None and hasattr(storage, "resized_url"):
+        url = storage.resized_url(name, size)
+    else:
+        url = storage.url(name)
+    return iri_to_uri(url)
+
+
+def concrete_storage(storage):
+    """The backend behind the `default_storage` proxy, which is slow to hash."""
+    if isinstance(storage, DefaultStorage):
+        return storages["default"]
+    return storage
+
+
+def image_url(image, size=None):
+    """
+    Memoized `image.url` (or resized_image_url with `size`). Computing the
+    URL means a Cloudinary URL build or a filesystem check per call; with
+    thousands of images per page that adds up.
+    """
+    if not image:
+        return None
+    return storage_url(concrete_storage(image.storage), image.name, size)
+
+
+@receiver(setting_changed)
+def _clear_image_urls(setting, **kwargs):
+    if setting in ("STORAGES", "MEDIA_URL", "MEDIA_ROOT", "CLOUDINARY_STORAGE"):
+        storage_url.cache_clear()
+
+
+class ResponsiveCloudinaryStorage(MediaCloudinaryStorage):
+    """
+    MediaCloudinaryStorage that can also build transformation URLs, so
+    clients fetch a CDN-resized, auto-format (WebP/AVIF) rendition instead
+    of the full-size original.
+    """
+
+    def resized_url(self, name, size):
+        width, height, crop = IMAGE_SIZES[size]
+        options = {"width": width, "crop": crop, "fetch_format": "auto", "quality": "auto"}
+        if height:
+            options["height"] = height
+
+        name = self._prepend_prefix(name)
+        resource = cloudinary.CloudinaryResource(name, default_resource_type=self._get_resource_type(name))
+        return resource.build_url(**options)
+
+
+class ResizingFileSystemStorage(FileSystemStorage):
+    """
+    Local stand-in for ResponsiveCloudinaryStorage (development and tests):
+    writes each rendition once as WebP under ``_resized/<size>/`` and serves
+    it from MEDIA_URL.
+    """
+    resized_dir = "_resized"
+
+    def resized_url(self, name, size):
+        width, height, crop = IMAGE_SIZES[size]
+        resized_name = f"{self.resized_dir}/{size}/{os.path.splitext(name)[0]}.webp"
+
+        if not self.exists(resized_name):
+            try:
+                with self.open(name) as source, Image.open(source) as img:
+                    if crop == "fill":
+                        img = ImageOps.fit(img, (width, height))
+                    else:
+                        img.thumbnail((width, height or img.height))
+                    buffer = BytesIO()
+                    img.save(buffer, "WEBP")
+            except (OSError, ValueError):
+                return self.url(name)
+            self.save(resized_name, ContentFile(buffer.getvalue()))
+
+        return self.url(resized_name)
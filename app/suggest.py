@@ -0,0 +1,232 @@
+import bisect
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, connection
+
+from .cache import SUGGEST, bump_cache_version, get_cache_version
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+
+PRODUCT = "product"
+BRAND = "brand"
+CATEGORY = "category"
+
+
+def _normalize(text):
+    return " ".join((text or "").casefold().split())
+
+
+def _keys(label):
+    """
+    Every word-suffix of the label, so "sham" and "herbal sha" both hit
+    "Herbal Shampoo".
+    """
+    words = _normalize(label).split()
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """
+    Per-process typeahead index over product titles, brands and category
+    names: a sorted list of (key, kind, ident) searched with bisect, so a
+    lookup never touches the DB.
+
+    Local writes are applied incrementally through signals and, when a
+    label actually changed, bump the shared suggest version; this worker
+    records the bump as already applied. Writes made by other workers are
+    picked up by comparing that version (at most every
+    `version_check_interval` seconds) and rebuilding in a background thread
+    while the stale index keeps serving. Only the first build blocks.
+    """
+    version_check_interval = 5.0
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._version = None
+        self._checked_at = 0.0
+        self._rebuilding = False
+        self.built = False
+
+    def _reset(self):
+        self._entries = []      # sorted (key, kind, ident)
+        self._labels = {}       # (kind, ident) -> display text
+        self._products = {}     # product id -> (title, brand)
+        self._brand_refs = {}   # normalized brand -> number of products
+
+    # ---------------- mutation (caller holds the lock) ----------------
+
+    def _add(self, kind, ident, label, bulk=False):
+        self._labels[(kind, ident)] = label
+        for key in _keys(label):
+            if bulk:
+                self._entries.append((key, kind, ident))
+            else:
+                bisect.insort(self._entries, (key, kind, ident))
+
+    def _remove(self, kind, ident):
+        label = self._labels.pop((kind, ident), None)
+        if label is None:
+            return
+        for key in _keys(label):
+            entry = (key, kind, ident)
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def _add_product(self, pk, title, brand, bulk=False):
+        self._products[pk] = (title, brand)
+        self._add(PRODUCT, pk, title, bulk)
+        brand_key = _normalize(brand)
+        if brand_key:
+            if not self._brand_refs.get(brand_key):
+                self._add(BRAND, brand_key, brand, bulk)
+            self._brand_refs[brand_key] = self._brand_refs.get(brand_key, 0) + 1
+
+    def _remove_product(self, pk):
+        if pk not in self._products:
+            return
+        title, brand = self._products.pop(pk)
+        self._remove(PRODUCT, pk)
+        brand_key = _normalize(brand)
+        if brand_key in self._brand_refs:
+            self._brand_refs[brand_key] -= 1
+            if not self._brand_refs[brand_key]:
+                del self._brand_refs[brand_key]
+                self._remove(BRAND, brand_key)
+
+    # ---------------- public API ----------------
+
+    def _publish(self, changed):
+        """
+        Tell other workers about a local change. Our own bump is recorded as
+        applied unless it skipped a version, i.e. another worker's write we
+        haven't loaded yet.
+        """
+        if not changed:
+            return
+        version = bump_cache_version(SUGGEST)
+        with self._lock:
+            if self.built and version == self._version + 1:
+                self._version = version
+
+    def rebuild(self):
+        version = get_cache_version(SUGGEST)
+        products = list(Product.objects.values_list("pk", "title", "brand"))
+        categories = list(Category.objects.values_list("pk", "name"))
+
+        with self._lock:
+            self._reset()
+            for pk, title, brand in products:
+                self._add_product(pk, title, brand, bulk=True)
+            for pk, name in categories:
+                self._add(CATEGORY, pk, name, bulk=True)
+            self._entries.sort()
+            self._version = version
+            self._checked_at = time.monotonic()
+            self.built = True
+
+    def warm(self):
+        """Build at worker start; a failure just leaves the lazy build."""
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Could not warm the product suggest index")
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._version = None
+            self.built = False
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        if self.built and now - self._checked_at < self.version_check_interval:
+            return
+        self._checked_at = now
+        if not self.built:
+            self.rebuild()
+        elif get_cache_version(SUGGEST) != self._version:
+            if connection.in_atomic_block:
+                # other connections can't see this transaction's writes
+                self.rebuild()
+            else:
+                self._rebuild_in_background()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_rebuild, name="suggest-rebuild", daemon=True).start()
+
+    def _background_rebuild(self):
+        close_old_connections()
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Could not rebuild the product suggest index")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            close_old_connections()
+
+    def update_product(self, pk, title, brand):
+        with self._lock:
+            changed = not self.built or self._products.get(pk) != (title, brand)
+            if self.built and changed:
+                self._remove_product(pk)
+                self._add_product(pk, title, brand)
+        self._publish(changed)
+
+    def remove_product(self, pk):
+        with self._lock:
+            changed = not self.built or pk in self._products
+            if self.built:
+                self._remove_product(pk)
+        self._publish(changed)
+
+    def update_category(self, pk, name):
+        with self._lock:
+            changed = not self.built or self._labels.get((CATEGORY, pk)) != name
+            if self.built and changed:
+                self._remove(CATEGORY, pk)
+                self._add(CATEGORY, pk, name)
+        self._publish(changed)
+
+    def remove_category(self, pk):
+        with self._lock:
+            changed = not self.built or (CATEGORY, pk) in self._labels
+            if self.built:
+                self._remove(CATEGORY, pk)
+        self._publish(changed)
+
+    def search(self, query, limit=10):
+        self.ensure_fresh()
+        prefix = _normalize(query)
+        if not prefix:
+            return []
+
+        results, seen = [], set()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(results) < limit:
+                key, kind, ident = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                if (kind, ident) not in seen:
+                    seen.add((kind, ident))
+                    results.append({
+                        "type": kind,
+                        "id": None if kind == BRAND else ident,
+                        "text": self._labels[(kind, ident)],
+                    })
+                i += 1
+        return results
+
+
+suggest_index = PrefixIndex()
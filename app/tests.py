@@ -1,3 +1,2149 @@
-from django.test import TestCase
+import contextlib
+import gzip
+import importlib
+import json
+import math
+import random
+import re
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.http import HttpRequest, JsonResponse
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models.functions import Length
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from django.urls import reverse
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+import cloudinary
+from redis.exceptions import WatchError
+
+from . import bootstrap, middleware
+from .admin import _thumb
+from .cartstore import LocalRedis, cart_store
+from .cache import CATALOG, COURSES, FOOD, SALONS, SUGGEST, bump_cache_version, get_cache_stats
+from .facets import compute_product_facets
+from .middleware import brotli
+from .fastpath import compile_rows, fast_representation, paginate_representation
+from .geo import EARTH_RADIUS_KM, coordinates_from_map_url, salon_locator
+from .renderers import STREAM_CHUNK_SIZE, ORJSONRenderer, dumps, stream_json
+from .pagination import CosmeticsCursorPagination, ProductCursorPagination
+from .serializers import (
+    BannerImageSerializer, CartSerializer, CosmeticsSerializer, CourseSerializer, FoodMenuSerializer,
+    OrderListSerializer, ProductDetailSerializer, ProductListSerializer, SaloonImageSerializer,
+    SaloonListSerializer, SaloonSerializer,
+)
+from .snapshots import content_snapshot
+from .storage import ResponsiveCloudinaryStorage, storage_url, resized_image_url
+from .suggest import suggest_index
+from .models import (
+    Address, BannerImage, Cart, CartItem, Category, Cosmetics, Courses, FoodMenu, Order, OrderItem, PasswordResetOTP, PaymentTransaction,
+    Product, ProductVariant, Saloon, SaloonImage, Wishlist, WishlistItem,
+)
+
+
+TEST_STORAGES = {
+    "default": {"BACKEND": "app.storage.ResizingFileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def make_catalog(count, variants_per_product=2):
+    """Bulk-create `count` products spread over a few categories."""
+    categories = Category.objects.bulk_create(
+        [Category(name=f"Category {i}") for i in range(3)]
+    )
+    products = Product.objects.bulk_create([
+        Product(
+            category=categories[i % len(categories)],
+            title=f"Product {i}",
+            description=f"Description {i}",
+            brand="jajis",
+            image1=f"product_images/p{i}.jpg",
+        )
+        for i in range(count)
+    ])
+    ProductVariant.objects.bulk_create([
+        ProductVariant(
+            product=product,
+            quantity_label=f"{v + 1}00ml",
+            mrp=Decimal("120.00") + v,
+            price=Decimal("100.00") + v,
+            stock=10,
+        )
+        for product in products
+        for v in range(variants_per_product)
+    ])
+    # bulk_create skips signals, so fill the denormalized totals by hand
+    Product.refresh_variant_totals([p.pk for p in products])
+    return products
+
+
+@override_settings(STORAGES=TEST_STORAGES, MEDIA_ROOT=tempfile.gettempdir())
+class CatalogTestCase(TestCase):
+    """Local file storage and an empty cache for every test."""
+
+    def setUp(self):
+        cache.clear()
+        content_snapshot.clear()
+        self.client = APIClient()
+
+
+class ProductQueryCountTests(CatalogTestCase):
+    # products + prefetched variants + categories sidecar + facets
+    LIST_QUERIES = 4
+    # product + prefetched variants
+    DETAIL_QUERIES = 2
+
+    def assert_list_queries(self, count):
+        make_catalog(count)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(reverse("product-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["products"]), count)
+
+    def test_list_queries_10_products(self):
+        self.assert_list_queries(10)
+
+    def test_list_queries_1000_products(self):
+        self.assert_list_queries(1000)
+
+    def test_list_queries_10000_products(self):
+        self.assert_list_queries(10000)
+
+    def test_detail_queries(self):
+        product = make_catalog(1, variants_per_product=5)[0]
+        with self.assertNumQueries(self.DETAIL_QUERIES):
+            response = self.client.get(reverse("product-detail", args=[product.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["variants"]), 5)
+        self.assertEqual(response.data["variants"][0]["product"]["id"], product.pk)
+
+
+class ProductCursorPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = make_catalog(25, variants_per_product=1)
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data["next"]
+        return pages
+
+    def test_pages_cover_catalog_once_in_order(self):
+        pages = self.walk(reverse("product-list") + "?page_size=10")
+        ids = [p["id"] for page in pages for p in page["products"]]
+        expected = list(
+            Product.objects.order_by("-created_at", "id").values_list("id", flat=True)
+        )
+        self.assertEqual([len(page["products"]) for page in pages], [10, 10, 5])
+        self.assertEqual(ids, expected)
+
+    def test_categories_only_on_first_page(self):
+        pages = self.walk(reverse("product-list") + "?page_size=10")
+        self.assertIn("categories", pages[0])
+        self.assertIsNone(pages[0]["previous"])
+        for page in pages[1:]:
+            self.assertNotIn("categories", page)
+
+    def test_previous_link_returns_same_page(self):
+        pages = self.walk(reverse("product-list") + "?page_size=10")
+        response = self.client.get(pages[2]["previous"])
+        self.assertEqual(
+            [p["id"] for p in response.data["products"]],
+            [p["id"] for p in pages[1]["products"]],
+        )
+
+    def test_no_offset_in_page_query(self):
+        first = self.client.get(reverse("product-list") + "?page_size=10")
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(first.data["next"])
+        self.assertFalse(any("OFFSET" in q["sql"] for q in ctx.captured_queries))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("product-list") + "?cursor=garbage")
+        self.assertEqual(response.status_code, 404)
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get(reverse("product-list"))
+        self.assertEqual(len(response.data["products"]), 25)
+        self.assertNotIn("next", response.data)
+
+
+class ProductVariantTotalsTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name="Hair")
+        self.product = Product.objects.create(
+            category=self.category, title="Oil", description="d", image1="product_images/oil.jpg"
+        )
+
+    def add_variant(self, price, stock):
+        return ProductVariant.objects.create(
+            product=self.product, quantity_label="x", mrp=price, price=price, stock=stock
+        )
+
+    def test_totals_follow_variant_changes(self):
+        cheap = self.add_variant(Decimal("50.00"), 3)
+        self.add_variant(Decimal("90.00"), 4)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.lowest_price, Decimal("50.00"))
+        self.assertEqual(self.product.highest_price, Decimal("90.00"))
+        self.assertEqual(self.product.total_stock, 7)
+
+        cheap.stock = 0
+        cheap.save(update_fields=["stock"])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.total_stock, 4)
+
+        cheap.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.lowest_price, Decimal("90.00"))
+
+    def test_totals_reset_without_variants(self):
+        self.add_variant(Decimal("50.00"), 3).delete()
+        self.product.refresh_from_db()
+        self.assertIsNone(self.product.lowest_price)
+        self.assertEqual(self.product.total_stock, 0)
+
+    def test_backfill_command(self):
+        self.add_variant(Decimal("70.00"), 2)
+        Product.objects.update(lowest_price=None, total_stock=0)
+        call_command("backfill_product_totals", stdout=StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.lowest_price, Decimal("70.00"))
+        self.assertEqual(self.product.total_stock, 2)
+
+    def test_price_filter_uses_lowest_price(self):
+        self.add_variant(Decimal("70.00"), 2)
+        url = reverse("product-list")
+        self.assertEqual(len(self.client.get(url + "?min_price=60").data["products"]), 1)
+        self.assertEqual(len(self.client.get(url + "?min_price=80").data["products"]), 0)
+        self.assertEqual(len(self.client.get(url + "?max_price=60").data["products"]), 0)
+
+
+class ProductSearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        hair = Category.objects.create(name="Hair Care")
+        skin = Category.objects.create(name="Skin")
+        Product.objects.create(
+            category=hair, title="Herbal Shampoo", description="Mild wash",
+            brand="jajis", image1="product_images/a.jpg",
+        )
+        Product.objects.create(
+            category=skin, title="Face Cream", description="With aloe vera",
+            brand="Glow", image1="product_images/b.jpg",
+        )
+
+    def search(self, term):
+        response = self.client.get(reverse("product-list"), {"search": term})
+        return sorted(p["title"] for p in response.data["products"])
+
+    def test_matches_title(self):
+        self.assertEqual(self.search("shampoo"), ["Herbal Shampoo"])
+
+    def test_matches_brand_description_and_category(self):
+        self.assertEqual(self.search("glow"), ["Face Cream"])
+        self.assertEqual(self.search("aloe"), ["Face Cream"])
+        self.assertEqual(self.search("hair care"), ["Herbal Shampoo"])
+
+    def test_blank_term_returns_everything(self):
+        self.assertEqual(len(self.search("  ")), 2)
+
+    def test_ranked_results_keep_their_order_across_pages(self):
+        # SQLite has no ranking: stand in a relevance order that disagrees
+        # with the paginator's default (-created_at, id)
+        def ranked(queryset, term):
+            return (
+                queryset.filter(title__icontains=term)
+                .annotate(search_rank=Length("title"))
+                .order_by("-search_rank", "id")
+            )
+
+        expected = list(Product.objects.order_by(Length("title").desc(), "id").values_list("title", flat=True))
+        self.assertNotEqual(
+            expected, list(Product.objects.order_by("-created_at", "id").values_list("title", flat=True))
+        )
+        titles = []
+        url = reverse("product-list") + "?search=a&page_size=1"
+        with mock.patch("app.views.uses_postgres_search", return_value=True), \
+                mock.patch("app.views.search_products", side_effect=ranked):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                titles += [p["title"] for p in response.data["products"]]
+                url = response.data["next"]
+            previous = self.client.get(response.data["previous"])
+        self.assertEqual(titles, expected)
+        self.assertEqual([p["title"] for p in previous.data["products"]], expected[:1])
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_catalog(3, variants_per_product=1)[0]
+
+    def test_second_request_is_a_hit(self):
+        url = reverse("product-list")
+        first = self.client.get(url, {"category": "Category 0"})
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {"category": "category 0"})
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+
+        stats = get_cache_stats(CATALOG)
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_different_filters_use_different_entries(self):
+        url = reverse("product-list")
+        self.client.get(url, {"min_price": "100"})
+        self.assertEqual(self.client.get(url, {"min_price": "100.00"})["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(url, {"min_price": "101"})["X-Cache"], "MISS")
+
+    def test_scheme_is_part_of_the_key(self):
+        url = reverse("product-list")
+        first = self.client.get(url)
+        secure = self.client.get(url, secure=True)
+        self.assertEqual(secure["X-Cache"], "MISS")
+        self.assertNotEqual(secure["ETag"], first["ETag"])
+        self.assertTrue(secure.json()["products"][0]["image1"].startswith("https://"))
+
+    def test_variant_save_invalidates_list_and_detail(self):
+        list_url = reverse("product-list")
+        detail_url = reverse("product-detail", args=[self.product.pk])
+        self.client.get(list_url)
+        self.client.get(detail_url)
+
+        variant = self.product.variants.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.price = Decimal("55.00")
+            variant.save()
+
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["variants"][0]["price"], "55.00")
+        self.assertEqual(self.client.get(list_url)["X-Cache"], "MISS")
+
+    def test_category_delete_invalidates(self):
+        url = reverse("product-list")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.filter(name="Category 2").delete()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["categories"]), 2)
+
+    def test_missing_product_is_not_cached(self):
+        url = reverse("product-detail", args=[999999])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+
+    def test_stats_endpoint_requires_admin(self):
+        url = reverse("catalog-cache-stats")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        admin = User.objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_authenticate(admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hit_ratio", response.data)
+
+
+class ConditionalGetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_catalog(2, variants_per_product=1)[0]
+        Saloon.objects.create(
+            name="Jajis", description="d", image="saloon_images/s.jpg", location="Kollam"
+        )
+
+    def assert_revalidates(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", first)
+
+        self.assertEqual(first["Cache-Control"], "no-cache")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        for header in ("ETag", "Last-Modified", "Cache-Control"):
+            self.assertEqual(response[header], first[header])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+        return first
+
+    def test_read_endpoints_answer_304(self):
+        for url in (
+            reverse("product-list"),
+            reverse("product-detail", args=[self.product.pk]),
+            "/api/", "/api/salons/", "/api/academy/", "/api/food-court/",
+        ):
+            with self.subTest(url=url):
+                self.assert_revalidates(url)
+
+    def test_etag_wins_over_if_modified_since(self):
+        url = reverse("product-list")
+        first = self.client.get(url)
+        # a bump within the same second keeps Last-Modified but not the ETag
+        with mock.patch("app.cache.time.time", return_value=int(time.time())):
+            bump_cache_version(CATALOG)
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=first["ETag"], HTTP_IF_MODIFIED_SINCE=first["Last-Modified"],
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_bootstrap_304_repeats_validators(self):
+        first = self.client.get(reverse("bootstrap"))
+        response = self.client.get(reverse("bootstrap"), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((response["ETag"], response["Cache-Control"]), (first["ETag"], "no-cache"))
+
+    def test_etag_varies_with_query(self):
+        url = reverse("product-list")
+        self.assertNotEqual(
+            self.client.get(url)["ETag"],
+            self.client.get(url, {"category": "Category 1"})["ETag"],
+        )
+
+    def test_model_change_invalidates_etag(self):
+        first = self.client.get("/api/food-court/")
+        with self.captureOnCommitCallbacks(execute=True):
+            FoodMenu.objects.create(title="Tea", description="d", image="food_images/t.jpg", price=10)
+        response = self.client.get("/api/food-court/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["data"]), 1)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_other_namespaces_keep_their_etag(self):
+        first = self.client.get("/api/salons/")
+        with self.captureOnCommitCallbacks(execute=True):
+            FoodMenu.objects.create(title="Tea", description="d", image="food_images/t.jpg", price=10)
+        response = self.client.get("/api/salons/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+
+class SparseFieldsetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_catalog(5, variants_per_product=2)[0]
+        self.url = reverse("product-list")
+
+    def test_grid_fields_skip_relations(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"fields": "id,title,image1,lowest_price"})
+        product = response.data["products"][0]
+        self.assertEqual(set(product), {"id", "title", "image1", "lowest_price"})
+        self.assertEqual(product["lowest_price"], "100.00")
+        # products + categories sidecar + facets; no variant prefetch, no category join
+        self.assertEqual(len(ctx.captured_queries), 3)
+        product_sql = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("description", product_sql)
+        self.assertNotIn("app_category", product_sql)
+
+    def test_omit_nested_path(self):
+        response = self.client.get(self.url, {"omit": "variants.product,category_name"})
+        product = response.data["products"][0]
+        self.assertNotIn("category_name", product)
+        self.assertIn("variants", product)
+        self.assertNotIn("product", product["variants"][0])
+        self.assertIn("price", product["variants"][0])
+
+    def test_nested_fields_prune_variant_columns(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, {"fields": "id,variants.id,variants.price"})
+        self.assertEqual(set(response.data["products"][0]["variants"][0]), {"id", "price"})
+        variant_sql = ctx.captured_queries[1]["sql"]
+        self.assertNotIn("sku", variant_sql)
+
+    def test_expand_collapses_other_relations(self):
+        response = self.client.get(self.url, {"expand": "category"})
+        product = response.data["products"][0]
+        self.assertIsInstance(product["category"], dict)
+        self.assertTrue(all(isinstance(v, int) for v in product["variants"]))
+
+    def test_expand_nested_relation(self):
+        response = self.client.get(self.url, {"expand": "variants"})
+        variant = response.data["products"][0]["variants"][0]
+        self.assertIsInstance(variant, dict)
+        self.assertIsInstance(variant["product"], int)
+
+    def test_detail_query_count_is_bounded(self):
+        url = reverse("product-detail", args=[self.product.pk])
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"fields": "id,title,description"})
+        self.assertEqual(set(response.data), {"id", "title", "description"})
+
+
+class ProductFacetTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(6, variants_per_product=1)
+        cheap = Product.objects.order_by("id").first()
+        cheap.brand = "Glow"
+        cheap.save()
+        ProductVariant.objects.filter(product=cheap).update(price=Decimal("1500.00"))
+        Product.refresh_variant_totals([cheap.pk])
+
+    def test_facets_for_whole_catalog(self):
+        with CaptureQueriesContext(connection) as ctx:
+            facets = compute_product_facets(Product.objects.all())
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in facets["categories"]],
+            [("Category 0", 2), ("Category 1", 2), ("Category 2", 2)],
+        )
+        self.assertEqual(facets["brands"], [
+            {"name": "jajis", "count": 5},
+            {"name": "Glow", "count": 1},
+        ])
+        self.assertEqual([b["count"] for b in facets["price"]], [5, 0, 0, 1, 0])
+        self.assertEqual(facets["price"][-1], {"min": 2000, "max": None, "count": 0})
+
+    def test_facets_follow_current_filters(self):
+        response = self.client.get(reverse("product-list"), {"category": "Category 0"})
+        facets = response.data["facets"]
+        self.assertEqual([(c["name"], c["count"]) for c in facets["categories"]], [("Category 0", 2)])
+        self.assertEqual(sum(b["count"] for b in facets["price"]), 2)
+
+    def test_facets_only_on_first_page(self):
+        first = self.client.get(reverse("product-list"), {"page_size": 4})
+        self.assertIn("facets", first.data)
+        second = self.client.get(first.data["next"])
+        self.assertNotIn("facets", second.data)
+
+
+class QueryPlanTests(CatalogTestCase):
+    """
+    Run the hot views against a seeded dataset, EXPLAIN every SELECT they
+    issue and fail if any of the large tables is read with a full scan.
+    """
+    LARGE_TABLES = {
+        "app_product", "app_productvariant", "app_order", "app_paymenttransaction",
+        "app_address", "app_passwordresetotp", "app_wishlistitem", "app_cosmetics",
+    }
+    USERS = 40
+    PER_USER = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog(2000, variants_per_product=1)
+        variants = list(ProductVariant.objects.all()[:cls.PER_USER])
+        users = User.objects.bulk_create(
+            [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(cls.USERS)]
+        )
+        addresses, orders, otps, wishlists = [], [], [], []
+        for user in users:
+            for i in range(cls.PER_USER):
+                addresses.append(Address(user=user, line1="l", city="c", postal_code="1", is_default=i == 0))
+                orders.append(Order(user=user, total_amount=10))
+                otps.append(PasswordResetOTP(email=user.email, otp=f"{i:06d}", expires_at=timezone.now()))
+            wishlists.append(Wishlist(user=user))
+        Address.objects.bulk_create(addresses)
+        orders = Order.objects.bulk_create(orders)
+        PasswordResetOTP.objects.bulk_create(otps)
+        PaymentTransaction.objects.bulk_create([
+            PaymentTransaction(user=o.user, order=o, razorpay_order_id=f"order_{o.pk}", amount=10)
+            for o in orders
+        ])
+        wishlists = Wishlist.objects.bulk_create(wishlists)
+        WishlistItem.objects.bulk_create(
+            [WishlistItem(wishlist=w, variant=v) for w in wishlists for v in variants]
+        )
+        Cosmetics.objects.bulk_create([
+            Cosmetics(title=f"Cosmetic {i}", description="d", image="cosmetics_images/c.jpg", price=i % 500)
+            for i in range(2000)
+        ])
+        cls.user = users[0]
+        cls.variant = variants[0]
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def full_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = [row[0] for row in cursor.fetchall()]
+                pattern = r"Seq Scan on (\w+)"
+            else:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                pattern = r"^SCAN (\w+)$"
+        return {
+            match.group(1)
+            for line in plan
+            for match in [re.search(pattern, line.strip())]
+            if match and match.group(1) in self.LARGE_TABLES
+        }
+
+    def assert_no_full_scans(self, call):
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith("SELECT"):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = call()
+        self.assertLess(response.status_code, 500)
+        self.assertTrue(statements)
+        for sql, params in statements:
+            self.assertEqual(self.full_scans(sql, params), set(), sql)
+
+    def test_catalog_views(self):
+        url = reverse("product-list")
+        product = Product.objects.order_by("-created_at").first()
+        for params in (
+            {"category": "category 1"},
+            {"min_price": "100", "max_price": "100.5"},
+            {"page_size": 20},
+        ):
+            with self.subTest(params=params):
+                self.assert_no_full_scans(lambda: self.client.get(url, params))
+        first = self.client.get(url, {"page_size": 20, "fields": "id"})
+        self.assert_no_full_scans(lambda: self.client.get(first.data["next"]))
+        self.assert_no_full_scans(lambda: self.client.get(reverse("product-detail", args=[product.pk])))
+
+    def test_cosmetics_view(self):
+        for params in ({}, {"min_price": "100", "max_price": "120"}, {"sort": "-price", "page_size": 50}):
+            with self.subTest(params=params):
+                self.assert_no_full_scans(lambda: self.client.get("/api/cosmetics/", params))
+        first = self.client.get("/api/cosmetics/", {"min_price": "100"})
+        self.assert_no_full_scans(lambda: self.client.get(first.json()["next"]))
+
+    def test_account_views(self):
+        self.client.force_authenticate(self.user)
+        order = Order.objects.filter(user=self.user).first()
+        for url in (reverse("orders"), reverse("order_detail", args=[order.pk]), reverse("addresses")):
+            with self.subTest(url=url):
+                self.assert_no_full_scans(lambda: self.client.get(url))
+        self.assert_no_full_scans(lambda: self.client.post(
+            reverse("remove_from_wishlist"), {"variant_id": self.variant.pk}
+        ))
+
+    def test_payment_and_otp_lookups(self):
+        self.client.force_authenticate(self.user)
+        order = Order.objects.filter(user=self.user).first()
+        with mock.patch("app.views.razorpay.Client") as client:
+            client.return_value.utility.verify_payment_signature.side_effect = ValueError
+            self.assert_no_full_scans(lambda: self.client.post(reverse("verify_payment"), {
+                "razorpay_order_id": f"order_{order.pk}",
+                "razorpay_payment_id": "pay", "razorpay_signature": "sig",
+            }))
+        self.client.force_authenticate(None)
+        self.assert_no_full_scans(lambda: self.client.post(reverse("reset_password"), {
+            "email": self.user.email, "otp": "000003", "new_password": "x",
+        }))
+
+
+class ProductBatchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ids = [p.pk for p in make_catalog(5, variants_per_product=2)]
+        self.url = reverse("product-batch")
+
+    def test_returns_products_in_request_order(self):
+        wanted = [self.ids[3], self.ids[0], 999999, self.ids[3], self.ids[1]]
+        # products + prefetched variants
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {"ids": ",".join(map(str, wanted))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [p["id"] for p in response.data["products"]],
+            [self.ids[3], self.ids[0], self.ids[1]],
+        )
+        self.assertEqual(response.data["missing"], [999999])
+
+    def test_rejects_bad_input(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"ids": "1,a"}).status_code, 400)
+        too_many = ",".join(str(i) for i in range(1, 102))
+        self.assertEqual(self.client.get(self.url, {"ids": too_many}).status_code, 400)
+
+    def test_sparse_fields(self):
+        response = self.client.get(self.url, {"ids": self.ids[0], "fields": "id,title"})
+        self.assertEqual(response.data["products"], [{"id": self.ids[0], "title": "Product 0"}])
+
+
+class ProductSuggestTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        suggest_index.clear()
+        self.addCleanup(suggest_index.clear)
+        self.hair = Category.objects.create(name="Hair Care")
+        self.shampoo = Product.objects.create(
+            category=self.hair, title="Herbal Shampoo", description="d",
+            brand="Himalaya", image1="product_images/a.jpg",
+        )
+        Product.objects.create(
+            category=self.hair, title="Hair Oil", description="d",
+            brand="Himalaya", image1="product_images/b.jpg",
+        )
+        self.url = reverse("product-suggest")
+
+    def suggest(self, q, **params):
+        response = self.client.get(self.url, {"q": q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(s["type"], s["text"]) for s in response.data["suggestions"]]
+
+    def test_prefix_matches_any_word(self):
+        self.assertEqual(self.suggest("sham"), [("product", "Herbal Shampoo")])
+        self.assertEqual(self.suggest("herbal SH"), [("product", "Herbal Shampoo")])
+        self.assertEqual(
+            self.suggest("hai"),
+            [("category", "Hair Care"), ("product", "Hair Oil")],
+        )
+        self.assertEqual(self.suggest("him"), [("brand", "Himalaya")])
+        self.assertEqual(self.suggest(""), [])
+
+    def test_lookups_do_not_touch_the_db(self):
+        self.suggest("a")
+        with self.assertNumQueries(0):
+            self.suggest("herb")
+
+    def test_incremental_updates(self):
+        self.suggest("x")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shampoo.title = "Silk Conditioner"
+            self.shampoo.save()
+            Category.objects.create(name="Skin")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest("sham"), [])
+            self.assertEqual(self.suggest("s"), [("product", "Silk Conditioner"), ("category", "Skin")])
+            # brand stays while another product still carries it
+            self.assertEqual(self.suggest("him"), [("brand", "Himalaya")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.all().delete()
+        self.assertEqual(self.suggest("him"), [])
+
+    def test_rebuilds_when_another_worker_changes_the_catalog(self):
+        self.suggest("x")
+        # a write made elsewhere: row changes + version bump, no local signal
+        Product.objects.filter(pk=self.shampoo.pk).update(title="Argan Mask")
+        bump_cache_version(SUGGEST)
+        suggest_index._checked_at = 0.0
+        self.assertEqual(self.suggest("argan"), [("product", "Argan Mask")])
+
+    def test_local_writes_do_not_trigger_a_rebuild(self):
+        self.suggest("x")
+        with mock.patch.object(suggest_index, "rebuild") as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.shampoo.title = "Argan Mask"
+                self.shampoo.save()
+                # stock/price writes re-save the product with the same labels
+                self.shampoo.save()
+                bump_cache_version(CATALOG)
+            suggest_index._checked_at = 0.0
+            self.assertEqual(self.suggest("argan"), [("product", "Argan Mask")])
+        rebuild.assert_not_called()
+
+    def test_unchanged_labels_do_not_bump_the_version(self):
+        self.suggest("x")
+        version = suggest_index._version
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shampoo.save()
+            self.hair.save()
+        self.assertEqual(suggest_index._version, version)
+
+    def test_stale_index_keeps_serving_while_rebuilding_in_background(self):
+        self.suggest("x")
+        Product.objects.filter(pk=self.shampoo.pk).update(title="Argan Mask")
+        bump_cache_version(SUGGEST)
+        suggest_index._checked_at = 0.0
+
+        threads = []
+        with mock.patch("app.suggest.connection.in_atomic_block", False), \
+                mock.patch("app.suggest.threading.Thread") as thread:
+            thread.side_effect = lambda target, **kwargs: threads.append(target) or mock.Mock()
+            self.assertEqual(self.suggest("sham"), [("product", "Herbal Shampoo")])
+            suggest_index._checked_at = 0.0
+            self.suggest("sham")
+        self.assertEqual(len(threads), 1)
+
+        # run the rebuild here: a real thread couldn't see the test transaction
+        with mock.patch("app.suggest.close_old_connections"):
+            threads[0]()
+        self.assertEqual(self.suggest("argan"), [("product", "Argan Mask")])
+        self.assertFalse(suggest_index._rebuilding)
+
+    def test_limit(self):
+        self.assertEqual(len(self.suggest("h", limit=1)), 1)
+
+
+class ResponsiveImageTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        buffer = BytesIO()
+        Image.new("RGB", (300, 200), "red").save(buffer, "JPEG")
+        self.product = Product.objects.create(
+            category=Category.objects.create(name="Hair"), title="Oil", description="d",
+            image1=SimpleUploadedFile("oil.jpg", buffer.getvalue(), content_type="image/jpeg"),
+        )
+
+    def test_local_storage_writes_renditions(self):
+        response = self.client.get(reverse("product-detail", args=[self.product.pk]))
+        sizes = response.data["image_sizes"]
+        self.assertEqual(set(sizes), {"thumb", "card", "small", "medium", "full", "srcset"})
+        self.assertTrue(sizes["thumb"].startswith("http://testserver/media/_resized/thumb/"))
+        self.assertTrue(sizes["thumb"].endswith(".webp"))
+        # only uncropped renditions: every candidate has the source's aspect ratio
+        self.assertEqual(
+            sizes["srcset"],
+            f"{sizes['small']} 480w, {sizes['medium']} 960w, {sizes['full']} 1600w",
+        )
+
+        storage = self.product.image1.storage
+        for size, expected in (
+            ("thumb", (128, 128)), ("card", (480, 480)), ("small", (300, 200)), ("full", (300, 200)),
+        ):
+            name = sizes[size].split("/media/", 1)[1]
+            with storage.open(name) as f, Image.open(f) as img:
+                self.assertEqual((img.format, img.size), ("WEBP", expected))
+
+    def test_missing_source_falls_back_to_original(self):
+        self.product.image1 = "product_images/missing.jpg"
+        self.assertEqual(resized_image_url(self.product.image1, "thumb"), "/media/product_images/missing.jpg")
+
+    def test_admin_thumbnail_uses_thumb_rendition(self):
+        self.assertIn("/media/_resized/thumb/", _thumb(self.product.image1))
+
+    def test_cloudinary_transformation_urls(self):
+        config = cloudinary.config()
+        previous = config.cloud_name
+        config.cloud_name = "demo"
+        self.addCleanup(setattr, config, "cloud_name", previous)
+
+        storage = ResponsiveCloudinaryStorage()
+        self.assertIn("/image/upload/c_fill,f_auto,h_128,q_auto,w_128/", storage.resized_url("product_images/a.jpg", "thumb"))
+        self.assertIn("/image/upload/c_limit,f_auto,q_auto,w_1600/", storage.resized_url("product_images/a.jpg", "full"))
+        self.assertIn("/image/upload/c_limit,f_auto,q_auto,w_960/", storage.resized_url("product_images/a.jpg", "medium"))
+
+
+class AbsoluteImageFieldTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        storage_url.cache_clear()
+        self.addCleanup(storage_url.cache_clear)
+        self.product = make_catalog(1)[0]
+        self.request = Request(APIRequestFactory().get("/api/products/"))
+
+    def test_matches_build_absolute_uri(self):
+        data = ProductListSerializer(self.product, context={"request": self.request}).data
+        self.assertEqual(data["image1"], self.request.build_absolute_uri(self.product.image1.url))
+        self.assertEqual(
+            data["variants"][0]["product"]["image1"],
+            self.request.build_absolute_uri(self.product.image1.url),
+        )
+        self.assertIsNone(data["image2"])
+
+    def test_without_request_returns_storage_url(self):
+        data = ProductListSerializer(self.product).data
+        self.assertEqual(data["image1"], self.product.image1.url)
+
+    def test_storage_url_memoized_across_requests(self):
+        ProductListSerializer(self.product, context={"request": self.request}).data
+        misses = storage_url.cache_info().misses
+
+        other = Request(APIRequestFactory().get("/api/products/"))
+        ProductListSerializer(self.product, context={"request": other}).data
+        self.assertEqual(storage_url.cache_info().misses, misses)
+
+    def test_prefix_resolved_once_per_request(self):
+        Product.objects.bulk_create([
+            Product(category=self.product.category, title=f"Extra {i}", description="d",
+                    image1=f"product_images/extra{i}.jpg", image2=f"product_images/extra{i}b.jpg")
+            for i in range(5)
+        ])
+        with mock.patch.object(
+            HttpRequest, "build_absolute_uri", autospec=True, side_effect=HttpRequest.build_absolute_uri,
+        ) as build:
+            response = self.client.get(reverse("product-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(build.call_count, 1)
+        self.assertTrue(response.data["products"][0]["image1"].startswith("http://testserver/media/"))
+
+    def test_media_url_change_clears_memo(self):
+        ProductListSerializer(self.product, context={"request": self.request}).data
+        with override_settings(MEDIA_URL="/cdn/"):
+            data = ProductListSerializer(self.product, context={"request": self.request}).data
+        self.assertEqual(data["image1"], f"http://testserver/cdn/{self.product.image1.name}")
+
+
+class FastPathParityTests(CatalogTestCase):
+    """fast_representation() must render byte-identical JSON to serializer.data."""
+
+    def setUp(self):
+        super().setUp()
+        products = make_catalog(12)
+        for i, product in enumerate(products[:4]):
+            product.image2 = f"product_images/p{i} extra é.jpg"
+        Product.objects.bulk_update(products[:4], ["image2"])
+        Product.objects.filter(pk=products[5].pk).update(image1="")
+        Product.objects.filter(pk=products[6].pk).update(brand=None)
+        Product.refresh_variant_totals([product.pk for product in products[:8]])
+        ProductVariant.objects.filter(product=products[7]).delete()
+        ProductVariant.objects.filter(product__in=products[:3]).update(sku="SKU-1", mrp=Decimal("99.5"))
+        for i, price in enumerate(("0.00", "12.50", "1999.99")):
+            Cosmetics.objects.create(title=f"C{i}", description="d", image=f"cosmetics_images/c{i}.jpg", price=Decimal(price))
+            FoodMenu.objects.create(title=f"F{i}", description="d", image="" if i else "food_images/f.jpg", price=Decimal(price))
+            Courses.objects.create(image=f"courses/c{i}.jpg", course=f"Course {i}", duration="3 months", description="d")
+            BannerImage.objects.create(image=None if i else "banner_image/b.jpg")
+        for i in range(3):
+            salon = Saloon.objects.create(
+                name=f"Salon {i}", description="d", image=f"saloon_images/s{i}.jpg",
+                google_map_url=None if i else "https://maps.example.com/?q=1", location="Kollam",
+            )
+            for n in range(i):
+                SaloonImage.objects.create(salon=salon, image=f"saloon_images/s{i}g{n}.jpg", position=n)
+
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        address = Address.objects.create(user=self.user, line1="l", city="c", postal_code="1")
+        variants = list(ProductVariant.objects.order_by("pk")[:4])
+        for n in range(3):
+            order = Order.objects.create(
+                user=self.user, total_amount=Decimal("10.50") * (n + 1),
+                shipping_address=address if n else None, billing_address=address,
+            )
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, variant=v, quantity=2, unit_price=v.price, total_price=v.price * 2)
+                for v in variants[n:]
+            ])
+            if n:
+                PaymentTransaction.objects.create(
+                    user=self.user, order=order, razorpay_order_id=f"order_{n}", amount=10,
+                )
+
+    def assert_parity(self, serializer_class, queryset, query="", rows=True):
+        """
+        Both fast paths against serializer.data: the `.values()` one over
+        the queryset (which must then load no model instance, unless
+        `rows=False`) and the instance one over the loaded list.
+        """
+        request = Request(APIRequestFactory().get("/", QUERY_STRING=query))
+        request.user = self.user
+        context = {"request": request}
+        expected = JSONRenderer().render(serializer_class(queryset.all(), many=True, context=context).data)
+
+        serializer = serializer_class(queryset.all(), many=True, context=context)
+        self.assertEqual(compile_rows(serializer.child, serializer.instance) is not None, rows)
+        with mock.patch(
+            "django.db.models.Model.from_db", side_effect=AssertionError("model instance loaded"),
+        ) if rows else contextlib.nullcontext():
+            actual = JSONRenderer().render(fast_representation(serializer))
+        self.assertEqual(actual, expected)
+
+        instances = fast_representation(serializer_class(list(queryset.all()), many=True, context=context))
+        self.assertEqual(JSONRenderer().render(instances), expected)
+        return actual
+
+    def test_product_list(self):
+        for query in (
+            "", "fields=id,title,image_sizes,variants.price", "omit=variants.product,image_sizes",
+            "expand=category", "expand=variants", "fields=id,variants&expand=",
+        ):
+            with self.subTest(query=query):
+                request = Request(APIRequestFactory().get("/", QUERY_STRING=query))
+                products = ProductListSerializer.setup_eager_loading(
+                    Product.objects.order_by("-created_at"), ProductListSerializer.fields_for_request(request),
+                )
+                self.assert_parity(ProductListSerializer, products, query)
+
+    def test_salons(self):
+        salons = Saloon.objects.all()
+        self.assertIn(
+            b"https://maps.example.com",
+            self.assert_parity(SaloonListSerializer, SaloonListSerializer.setup_eager_loading(salons)),
+        )
+        self.assertIn(b"s2g1.jpg", self.assert_parity(SaloonSerializer, SaloonSerializer.setup_eager_loading(salons)))
+
+    def test_orders(self):
+        orders = Order.objects.filter(user=self.user).order_by("-created_at")
+        # method fields read model instances: the instance path only
+        plain = self.assert_parity(OrderListSerializer, orders, rows=False)
+        self.assertEqual(
+            self.assert_parity(OrderListSerializer, OrderListSerializer.setup_eager_loading(orders), rows=False),
+            plain,
+        )
+
+    def test_model_serializers(self):
+        """Every list serializer compiled to rows, so a new field can't drift unnoticed."""
+        for serializer_class, queryset, rows in (
+            (ProductDetailSerializer, ProductDetailSerializer.setup_eager_loading(Product.objects.order_by("id")), True),
+            (ProductListSerializer, Product.objects.order_by("id"), True),
+            (SaloonImageSerializer, SaloonImage.objects.all(), True),
+            (CosmeticsSerializer, Cosmetics.objects.order_by("price"), True),
+            (FoodMenuSerializer, FoodMenu.objects.order_by("id"), True),
+            (CourseSerializer, Courses.objects.order_by("id"), True),
+            # uploaded_at is a DateTimeField, which has no row converter
+            (BannerImageSerializer, BannerImage.objects.order_by("id"), False),
+        ):
+            with self.subTest(serializer=serializer_class.__name__):
+                self.assert_parity(serializer_class, queryset, rows=rows)
+
+    def test_paginated_rows(self):
+        for serializer_class, paginator_class, queryset, query in (
+            (ProductListSerializer, ProductCursorPagination, Product.objects.all(), {"page_size": 5}),
+            (CosmeticsSerializer, CosmeticsCursorPagination, Cosmetics.objects.all(), {"page_size": 2, "sort": "-price"}),
+        ):
+            with self.subTest(serializer=serializer_class.__name__):
+                request = Request(APIRequestFactory().get("/", query))
+                context = {"request": request}
+                paginator, expected_paginator = paginator_class(), paginator_class()
+                data = paginate_representation(
+                    serializer_class(queryset, many=True, context=context), paginator, request,
+                )
+                page = expected_paginator.paginate_queryset(queryset, request)
+                self.assertEqual(
+                    JSONRenderer().render(data),
+                    JSONRenderer().render(serializer_class(page, many=True, context=context).data),
+                )
+                self.assertEqual(paginator.get_next_link(), expected_paginator.get_next_link())
+                self.assertIsNotNone(paginator.get_next_link())
+
+    def test_views_use_fast_path(self):
+        self.client.force_authenticate(self.user)
+        for url, module in (
+            (reverse("product-list"), "app.views"),
+            ("/api/salons/", "app.snapshots"),
+            (reverse("orders"), "app.views"),
+        ):
+            with self.subTest(url=url), mock.patch(
+                f"{module}.fast_representation", side_effect=fast_representation,
+            ) as fast:
+                self.assertEqual(self.client.get(url).status_code, 200)
+                fast.assert_called_once()
+
+    def test_order_list_query_count_is_constant(self):
+        self.client.force_authenticate(self.user)
+        # orders (+ addresses), items (+ variant, product), transactions
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("orders"))
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]["items_count"], 2)
+        self.assertEqual(response.data[0]["razorpay_order_id"], "order_2")
+
+
+class ORJSONRendererTests(TestCase):
+    DATA = {
+        "price": Decimal("12.50"),
+        "when": timezone.datetime(2024, 5, 1, 10, 30, 15, 123456, tzinfo=timezone.get_fixed_timezone(0)),
+        "local": timezone.datetime(2024, 5, 1, 10, 30, tzinfo=timezone.get_fixed_timezone(330)),
+        "day": timezone.datetime(2024, 5, 1).date(),
+        "lazy": gettext_lazy("Salon"),
+        "text": "Jaji’s salon \u2028 ☕",
+        "ids": (1, 2, 3),
+        "nested": [{"a": None, "b": True, "c": 1.5}],
+    }
+
+    def assert_same_bytes(self, data, accepted_media_type=None, context=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type, context),
+            JSONRenderer().render(data, accepted_media_type, context),
+        )
+
+    def test_matches_drf_renderer(self):
+        self.assert_same_bytes(self.DATA)
+        self.assert_same_bytes([self.DATA, self.DATA])
+
+    def test_falls_back_for_unsupported_data(self):
+        self.assert_same_bytes({1: "int key", "big": 2 ** 70})
+        self.assert_same_bytes(self.DATA, "application/json; indent=4")
+        self.assert_same_bytes(self.DATA, None, {"indent": 2})
+
+    def test_is_default_renderer(self):
+        make_catalog(3)
+        response = APIClient().get(reverse("product-list"))
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+class StreamingResponseTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(450)
+        self.user = User.objects.create_user("buyer", "buyer@example.com", "pw")
+        variants = list(ProductVariant.objects.order_by("pk")[:3])
+        for n in range(5):
+            order = Order.objects.create(user=self.user, total_amount=Decimal("10.50"))
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, variant=v, quantity=1, unit_price=v.price, total_price=v.price)
+                for v in variants
+            ])
+
+    def test_stream_json_matches_full_document(self):
+        items = [{"id": i} for i in range(5)]
+        for chunk_size in (1, 2, 10):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(b"".join(stream_json(iter(items), chunk_size=chunk_size)), dumps(items))
+                data = {"a": 1, "items": None, "z": [2]}
+                self.assertEqual(
+                    b"".join(stream_json(iter(items), data, "items", chunk_size)),
+                    dumps({**data, "items": items}),
+                )
+        self.assertEqual(b"".join(stream_json(iter([]), {"items": None}, "items")), b'{"items":[]}')
+
+    def test_product_dump_streams_same_bytes(self):
+        full = self.client.get(reverse("product-list"))
+        streamed = self.client.get(reverse("product-list"), {"stream": "1"})
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(streamed["Content-Type"], "application/json")
+        self.assertEqual(streamed["ETag"], full["ETag"])
+        self.assertEqual(b"".join(streamed.streaming_content), full.content)
+
+    def test_order_history_streams_same_bytes(self):
+        self.client.force_authenticate(self.user)
+        full = self.client.get(reverse("orders"))
+        streamed = self.client.get(reverse("orders"), {"stream": "true"})
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(b"".join(streamed.streaming_content), full.content)
+
+    def test_rows_are_fetched_while_streaming(self):
+        response = self.client.get(reverse("product-list"), {"stream": "1"})
+        chunks = iter(response.streaming_content)
+        head = next(chunks)     # categories and facets are rendered up front
+        with CaptureQueriesContext(connection) as first:
+            first_chunk = next(chunks)
+        with CaptureQueriesContext(connection) as rest:
+            remaining = b"".join(chunks)
+
+        self.assertEqual(first_chunk.count(b'"category_name"'), STREAM_CHUNK_SIZE)
+        # later chunks fetch (and prefetch variants for) their own rows
+        self.assertGreaterEqual(len(first), 2)
+        self.assertGreaterEqual(len(rest), 2)
+        self.assertEqual(len(json.loads(head + first_chunk + remaining)["products"]), 450)
+
+
+class CompressionMiddlewareTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(50)
+        self.url = reverse("product-list")
+
+    def test_gzip_json(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertLess(len(response.content) * 5, len(plain.content))
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(response["ETag"], "W/" + plain["ETag"])
+
+    @skipUnless(brotli, "brotli is not installed")
+    def test_brotli_preferred(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_skips_small_or_unaccepted(self):
+        response = self.client.get(reverse("product-suggest"), {"q": "zzz"}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response)
+        for header in ("identity", "gzip;q=0", "deflate"):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=header)
+                self.assertNotIn("Content-Encoding", response)
+
+    def test_weak_etag_revalidates(self):
+        first = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_compressed_body_is_cached(self):
+        with mock.patch("app.middleware._compress", side_effect=middleware._compress) as compress:
+            first = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+            second = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(compress.call_count, 1)
+            self.assertEqual(gzip.decompress(second.content), gzip.decompress(first.content))
+
+            # absolute URLs differ by scheme, so https has an entry of its own
+            secure = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", secure=True)
+            self.assertEqual(compress.call_count, 2)
+            self.assertIn(b"https://", gzip.decompress(secure.content))
+
+            # a new catalog version means a new ETag, so a fresh compression
+            bump_cache_version(CATALOG)
+            self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(compress.call_count, 3)
+
+    def test_compressed_body_is_keyed_on_the_query_string(self):
+        def view(request):
+            # same ETag whatever the query: the body must still not be shared
+            response = JsonResponse({"q": request.GET.get("q"), "pad": "x" * 2000})
+            response["ETag"] = '"same"'
+            return response
+
+        compression = middleware.CompressionMiddleware(view)
+        for q in ("a", "b", "a"):
+            with self.subTest(q=q):
+                response = compression(RequestFactory().get("/page/", {"q": q}, HTTP_ACCEPT_ENCODING="gzip"))
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertEqual(json.loads(gzip.decompress(response.content))["q"], q)
+
+    def test_gzip_padding_is_per_response(self):
+        bodies = [self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip").content for _ in range(10)]
+        self.assertEqual({gzip.decompress(body) for body in bodies}, {gzip.decompress(bodies[0])})
+        # BREACH padding: a random-length name in the gzip header, even for cached bodies
+        self.assertGreater(len({len(body) for body in bodies}), 1)
+
+    def test_streaming_response(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, {"stream": "1"}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", response)
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain.content)
+
+    @mock.patch("app.middleware.COMPRESSION_MIN_SIZE", 0)
+    def test_view_opt_out(self):
+        User.objects.create_user("buyer", "buyer@example.com", "pw")
+        response = self.client.post(
+            reverse("login"), {"username": "buyer", "password": "pw"}, format="json",
+            HTTP_ACCEPT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response)
+
+        view = middleware.no_compression(lambda request: JsonResponse({"a": 1}))
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        compression = middleware.CompressionMiddleware(view)
+        compression.process_view(request, view, (), {})
+        self.assertNotIn("Content-Encoding", compression.process_response(request, view(request)))
+
+
+class ContentSnapshotTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.salon = Saloon.objects.create(
+            name="Jajis", description="d", image="saloon_images/s.jpg", location="Kollam",
+        )
+        SaloonImage.objects.create(salon=self.salon, image="saloon_images/s1.jpg")
+        FoodMenu.objects.create(title="Tea", description="d", image="food_images/t.jpg", price=10)
+        Courses.objects.create(image="courses/c.jpg", course="Makeup", duration="3m", description="d")
+        BannerImage.objects.create(image="banner_image/b.jpg")
+        self.urls = (
+            "/api/", "/api/salons/", f"/api/salons/{self.salon.pk}/",
+            "/api/food-court/", "/api/academy/",
+        )
+
+    def regular_body(self, url):
+        # sparse fieldset params take the regular serialization path
+        return self.client.get(url, {"omit": "none"}).content
+
+    def test_pages_served_without_queries(self):
+        content_snapshot.warm()
+        for url in self.urls:
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "application/json")
+                self.assertIn("ETag", response)
+
+    def test_snapshot_matches_regular_path(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                body = self.client.get(url).content
+                self.assertIn(b"http://testserver/media/", body)
+                self.assertEqual(body, self.regular_body(url))
+
+    def test_urls_use_the_requesting_host(self):
+        self.client.get("/api/salons/")
+        body = self.client.get("/api/salons/", secure=True).content
+        self.assertIn(b"https://testserver/media/saloon_images/s.jpg", body)
+        self.assertNotIn(b"snapshot.invalid", body)
+
+    def test_save_rebuilds_namespace(self):
+        self.client.get("/api/food-court/")
+        with self.captureOnCommitCallbacks(execute=True):
+            FoodMenu.objects.create(title="Juice", description="d", image="food_images/j.jpg", price=20)
+        response = self.client.get("/api/food-court/")
+        self.assertEqual(len(response.json()["data"]), 2)
+
+    def test_version_bump_from_another_worker_rebuilds(self):
+        self.client.get("/api/salons/")
+        # a write elsewhere: this worker only sees the shared version change
+        Saloon.objects.filter(pk=self.salon.pk).update(name="Jajis Kollam")
+        self.assertIn(b'"Jajis"', self.client.get("/api/salons/").content)
+        bump_cache_version(SALONS)
+        self.assertIn(b'"Jajis Kollam"', self.client.get("/api/salons/").content)
+
+    def test_unrelated_namespace_kept(self):
+        content_snapshot.warm()
+        bump_cache_version(FOOD)
+        with self.assertNumQueries(0):
+            self.client.get("/api/salons/")
+        with self.assertNumQueries(1):
+            self.client.get("/api/food-court/")
+
+    def test_missing_salon_is_404(self):
+        response = self.client.get(f"/api/salons/{self.salon.pk + 100}/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_browsable_api_skips_snapshot(self):
+        response = self.client.get("/api/salons/", HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"<html", response.content)
+
+
+class BootstrapTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(25, variants_per_product=1)
+        Saloon.objects.create(name="Jajis", description="d", image="saloon_images/s.jpg", location="Kollam")
+        FoodMenu.objects.create(title="Tea", description="d", image="food_images/t.jpg", price=10)
+        Courses.objects.create(image="courses/c.jpg", course="Makeup", duration="3m", description="d")
+        self.url = reverse("bootstrap")
+
+    def test_matches_individual_endpoints(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(list(data), ["banner", "salons", "courses", "food", "categories", "products"])
+        self.assertIsNone(data["banner"])
+        self.assertEqual(data["salons"], self.client.get("/api/salons/").json()["data"])
+        self.assertEqual(data["courses"], self.client.get("/api/academy/").json()["data"])
+        self.assertEqual(data["food"], self.client.get("/api/food-court/").json()["data"])
+
+        page = self.client.get(reverse("product-list"), {"page_size": 20}).json()
+        self.assertEqual(data["categories"], page["categories"])
+        self.assertEqual(data["products"]["products"], page["products"])
+        # the cursor continues on the product list
+        self.assertTrue(data["products"]["next"].startswith("http://testserver/api/products/?cursor="))
+        rest = self.client.get(data["products"]["next"]).json()
+        self.assertEqual(len(rest["products"]), 5)
+
+    def test_query_string_ignored(self):
+        plain = self.client.get(self.url).content
+        cache.clear()
+        self.assertEqual(self.client.get(self.url, {"fields": "id", "page_size": 2}).content, plain)
+
+    def test_cached_sections_cost_no_queries(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.content, first.content)
+
+    def test_bump_rebuilds_only_that_section(self):
+        self.client.get(self.url)
+        bump_cache_version(COURSES)
+        with mock.patch.dict(bootstrap.BOOTSTRAP_SECTIONS, {
+            name: (namespace, mock.Mock(wraps=build))
+            for name, (namespace, build) in bootstrap.BOOTSTRAP_SECTIONS.items()
+        }):
+            self.client.get(self.url)
+            built = [name for name, (_, build) in bootstrap.BOOTSTRAP_SECTIONS.items() if build.called]
+        self.assertEqual(built, ["courses"])
+
+    def test_revalidates(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FoodMenu.objects.create(title="Juice", description="d", image="food_images/j.jpg", price=20)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["food"]), 2)
+
+
+@override_settings(STORAGES=TEST_STORAGES, MEDIA_ROOT=tempfile.gettempdir())
+class BootstrapConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        make_catalog(5, variants_per_product=1)
+        Saloon.objects.create(name="Jajis", description="d", image="saloon_images/s.jpg", location="Kollam")
+
+    def test_sections_built_on_worker_threads(self):
+        threads = {}
+
+        def recording(name, build):
+            def wrapper(request):
+                threads[name] = threading.current_thread().name
+                return build(request)
+            return wrapper
+
+        with mock.patch.dict(bootstrap.BOOTSTRAP_SECTIONS, {
+            name: (namespace, recording(name, build))
+            for name, (namespace, build) in bootstrap.BOOTSTRAP_SECTIONS.items()
+        }):
+            data = APIClient().get(reverse("bootstrap")).json()
+
+        self.assertEqual(set(threads), set(bootstrap.BOOTSTRAP_SECTIONS))
+        self.assertTrue(all(name.startswith("bootstrap") for name in threads.values()))
+        self.assertEqual(len(data["products"]["products"]), 5)
+        self.assertEqual(data["salons"][0]["name"], "Jajis")
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class MapUrlCoordinatesTests(TestCase):
+    def test_formats(self):
+        cases = {
+            "https://www.google.com/maps/place/Jajis/@8.8932,76.6141,17z/data=!3m1!4b1!4m6!3m5!1s0x0:0x1!8m2!3d8.8935!4d76.6150":
+                (8.8935, 76.6150),
+            "https://www.google.com/maps/@-33.8688,151.2093,15z": (-33.8688, 151.2093),
+            "https://maps.google.com/?q=9.9312,76.2673": (9.9312, 76.2673),
+            "https://www.google.com/maps/search/?api=1&query=10.5276%2C76.2144": (10.5276, 76.2144),
+            "https://www.google.com/maps/dir/?api=1&destination=8.5241,76.9366": (8.5241, 76.9366),
+        }
+        for url, expected in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(coordinates_from_map_url(url), expected)
+
+    def test_unparseable(self):
+        for url in (None, "", "https://maps.app.goo.gl/AbCdEf", "https://maps.google.com/?q=Jajis+Kollam",
+                    "https://www.google.com/maps/@95.0,76.0,15z"):
+            with self.subTest(url=url):
+                self.assertIsNone(coordinates_from_map_url(url))
+
+
+class SalonNearbyTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        salon_locator.clear()
+        self.addCleanup(salon_locator.clear)
+        self.url = reverse("salons-nearby")
+
+    def make_salon(self, name, lat=None, lng=None, **kwargs):
+        return Saloon.objects.create(
+            name=name, description="d", image="saloon_images/s.jpg", location="Kerala",
+            latitude=lat, longitude=lng, **kwargs
+        )
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        points = {}
+        for i in range(300):
+            lat, lng = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            points[self.make_salon(f"S{i}", lat, lng).pk] = (lat, lng)
+
+        for _ in range(50):
+            lat, lng = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            expected = sorted((haversine_km(lat, lng, *point), pk) for pk, point in points.items())[:7]
+            nearest = salon_locator.nearest(lat, lng, 7)
+            self.assertEqual([pk for pk, _ in nearest], [pk for _, pk in expected])
+            for (_, distance), (expected_distance, _) in zip(nearest, expected):
+                self.assertAlmostEqual(distance, expected_distance, places=6)
+
+    def test_across_the_antimeridian(self):
+        east = self.make_salon("Fiji", -17.7, 179.9)
+        self.make_salon("Far", -17.7, 170.0)
+        self.assertEqual(salon_locator.nearest(-17.7, -179.9, 1)[0][0], east.pk)
+
+    def test_endpoint(self):
+        kollam = self.make_salon("Kollam", 8.8932, 76.6141)
+        kochi = self.make_salon("Kochi", 9.9312, 76.2673)
+        self.make_salon("No coordinates")
+
+        response = self.client.get(self.url, {"lat": 8.52, "lng": 76.94, "limit": 5})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual([item["id"] for item in data], [kollam.pk, kochi.pk])
+        self.assertAlmostEqual(data[0]["distance_km"], haversine_km(8.52, 76.94, 8.8932, 76.6141), places=2)
+        self.assertEqual(data[0]["image"], "http://testserver/media/saloon_images/s.jpg")
+
+        response = self.client.get(self.url, {"lat": 8.52, "lng": 76.94, "limit": 1})
+        self.assertEqual(len(response.json()["data"]), 1)
+
+    def test_bad_params(self):
+        for params in ({}, {"lat": "x", "lng": 1}, {"lat": 91, "lng": 0}, {"lat": 1, "lng": 2, "limit": "many"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_coordinates_filled_from_map_url(self):
+        salon = self.make_salon("Kollam", google_map_url="https://www.google.com/maps/@8.8932,76.6141,17z")
+        salon.refresh_from_db()
+        self.assertEqual((salon.latitude, salon.longitude), (8.8932, 76.6141))
+
+    def test_coordinates_follow_map_url_edits(self):
+        salon = self.make_salon("Kollam", google_map_url="https://www.google.com/maps/@8.8932,76.6141,17z")
+
+        salon.google_map_url = "https://maps.google.com/?q=9.9312,76.2673"
+        salon.save()
+        salon.refresh_from_db()
+        self.assertEqual((salon.latitude, salon.longitude), (9.9312, 76.2673))
+
+        # coordinates set in the same save win over the link
+        salon.google_map_url = "https://maps.google.com/?q=10.5276,76.2144"
+        salon.latitude, salon.longitude = 10.0, 76.0
+        salon.save()
+        salon.refresh_from_db()
+        self.assertEqual((salon.latitude, salon.longitude), (10.0, 76.0))
+
+        salon.name = "Kollam Beach"
+        salon.save()
+        salon.refresh_from_db()
+        self.assertEqual((salon.latitude, salon.longitude), (10.0, 76.0))
+
+        salon.google_map_url = "https://maps.app.goo.gl/AbCdEf"
+        salon.save()
+        salon.refresh_from_db()
+        self.assertEqual((salon.latitude, salon.longitude), (None, None))
+
+    def test_salon_changes_rebuild_index(self):
+        self.make_salon("Kollam", 8.8932, 76.6141)
+        self.assertEqual(len(salon_locator.nearest(9.9, 76.2)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            kochi = self.make_salon("Kochi", 9.9312, 76.2673)
+        self.assertEqual(salon_locator.nearest(9.9, 76.2, 1)[0][0], kochi.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            kochi.delete()
+        self.assertEqual(len(salon_locator.nearest(9.9, 76.2)), 1)
+
+    def test_backfill_migration(self):
+        migration = importlib.import_module("app.migrations.0009_saloon_coordinates")
+        salon = self.make_salon("Kollam")
+        Saloon.objects.filter(pk=salon.pk).update(google_map_url="https://maps.google.com/?q=8.8932,76.6141")
+        untouched = self.make_salon("Short link")
+        Saloon.objects.filter(pk=untouched.pk).update(google_map_url="https://maps.app.goo.gl/AbCdEf")
+
+        migration.backfill_coordinates(apps, None)
+        salon.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual((salon.latitude, salon.longitude), (8.8932, 76.6141))
+        self.assertIsNone(untouched.latitude)
+
+
+class SalonGalleryTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.salon = Saloon.objects.create(
+            name="Jajis", description="d", image="saloon_images/cover.jpg", location="Kollam",
+        )
+        # saved out of order: position decides
+        for position in (2, 0, 1, 3, 4):
+            SaloonImage.objects.create(salon=self.salon, image=f"saloon_images/g{position}.jpg", position=position)
+        Saloon.objects.create(name="Empty", description="d", image="saloon_images/e.jpg", location="Kochi")
+
+    def test_list_has_cover_and_count_only(self):
+        # past the snapshot: the cards and their counts are one query
+        with self.assertNumQueries(1):
+            data = self.client.get("/api/salons/", {"omit": "none"}).json()["data"]
+        self.assertEqual([item["gallery_count"] for item in data], [5, 0])
+        self.assertEqual(data[0]["image"], "http://testserver/media/saloon_images/cover.jpg")
+        self.assertNotIn("gallery", data[0])
+        self.assertNotIn("image1", data[0])
+
+    def test_detail_has_ordered_gallery(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(f"/api/salons/{self.salon.pk}/", {"omit": "none"}).json()["data"]
+        self.assertEqual(data["gallery_count"], 5)
+        self.assertEqual(
+            [image["image"] for image in data["gallery"]],
+            [f"http://testserver/media/saloon_images/g{n}.jpg" for n in range(5)],
+        )
+
+    def test_gallery_pages(self):
+        url = reverse("salon-gallery", args=[self.salon.pk])
+        first = self.client.get(url, {"page_size": 2}).json()
+        self.assertEqual(first["count"], 5)
+        self.assertEqual([image["position"] for image in first["results"]], [0, 1])
+        last = self.client.get(url, {"page_size": 2, "page": 3}).json()
+        self.assertEqual([image["position"] for image in last["results"]], [4])
+        self.assertIsNone(last["next"])
+        self.assertIn("480w", last["results"][0]["image_sizes"]["srcset"])
+        self.assertNotIn("128w", last["results"][0]["image_sizes"]["srcset"])
+
+        self.assertEqual(self.client.get(reverse("salon-gallery", args=[self.salon.pk + 100])).status_code, 404)
+
+    def test_sparse_fieldsets_vary_cache_and_etag(self):
+        url = reverse("salon-gallery", args=[self.salon.pk])
+        trimmed = self.client.get(url, {"fields": "id"})
+        self.assertEqual(trimmed["X-Cache"], "MISS")
+        self.assertEqual(set(trimmed.json()["results"][0]), {"id"})
+        full = self.client.get(url)
+        self.assertEqual(full["X-Cache"], "MISS")
+        self.assertIn("image_sizes", full.json()["results"][0])
+        self.assertNotEqual(trimmed["ETag"], full["ETag"])
+
+        for page in ("/api/salons/", f"/api/salons/{self.salon.pk}/", "/api/", "/api/food-court/", "/api/academy/"):
+            with self.subTest(url=page):
+                etag = self.client.get(page)["ETag"]
+                response = self.client.get(page, {"omit": "description"}, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_gallery_change_invalidates_salons(self):
+        first = self.client.get("/api/salons/")
+        with self.captureOnCommitCallbacks(execute=True):
+            SaloonImage.objects.create(salon=self.salon, image="saloon_images/g5.jpg", position=5)
+        response = self.client.get("/api/salons/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"][0]["gallery_count"], 6)
+
+
+class SalonGalleryMigrationTests(TransactionTestCase):
+    before = [("app", "0009_saloon_coordinates")]
+    after = [("app", "0011_remove_saloon_image_columns")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def test_columns_copied_to_gallery_and_back(self):
+        old_apps = self.migrate(self.before)
+        self.addCleanup(self.migrate, MigrationExecutor(connection).loader.graph.leaf_nodes("app"))
+        OldSaloon = old_apps.get_model("app", "Saloon")
+        salon = OldSaloon.objects.create(
+            name="Jajis", description="d", image="saloon_images/cover.jpg", location="Kollam",
+            image1="saloon_images/a.jpg", image3="saloon_images/b.jpg", image6="saloon_images/c.jpg",
+        )
+
+        new_apps = self.migrate(self.after)
+        images = new_apps.get_model("app", "SaloonImage").objects.filter(salon_id=salon.pk)
+        self.assertEqual(
+            list(images.values_list("image", "position")),
+            [("saloon_images/a.jpg", 0), ("saloon_images/b.jpg", 1), ("saloon_images/c.jpg", 2)],
+        )
+
+        old_apps = self.migrate(self.before)
+        salon = old_apps.get_model("app", "Saloon").objects.get(pk=salon.pk)
+        self.assertEqual(
+            [salon.image1.name, salon.image2.name, salon.image3.name],
+            ["saloon_images/a.jpg", "saloon_images/b.jpg", "saloon_images/c.jpg"],
+        )
+        self.assertFalse(salon.image4)
+
+
+class CosmeticsCatalogTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        Cosmetics.objects.bulk_create([
+            Cosmetics(
+                title=f"{'Lipstick' if i % 3 == 0 else 'Serum'} {i}", description="d",
+                image=f"cosmetics_images/c{i}.jpg", price=Decimal(100 + (i % 10) * 25),
+            )
+            for i in range(45)
+        ])
+        self.url = "/api/cosmetics/"
+
+    def walk(self, params, direction="next"):
+        items, url, pages = [], self.url, 0
+        response = self.client.get(url, params)
+        while True:
+            data = response.json()
+            items.extend(data["data"])
+            pages += 1
+            if not data[direction]:
+                return items, pages
+            response = self.client.get(data[direction])
+
+    def test_pages_in_price_order(self):
+        items, pages = self.walk({"page_size": 10})
+        self.assertEqual(pages, 5)
+        keys = [(Decimal(item["price"]), item["id"]) for item in items]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(item["id"] for item in items)), 45)
+
+    def test_descending_and_back(self):
+        first = self.client.get(self.url, {"page_size": 10, "sort": "-price"}).json()
+        prices = [Decimal(item["price"]) for item in first["data"]]
+        self.assertEqual(prices, sorted(prices, reverse=True))
+        self.assertIsNone(first["previous"])
+
+        second = self.client.get(first["next"]).json()
+        self.assertLessEqual(Decimal(second["data"][0]["price"]), prices[-1])
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["data"], first["data"])
+
+    def test_price_range_and_search(self):
+        items, _ = self.walk({"min_price": "150", "max_price": "200.00", "search": "LIPSTICK", "page_size": 2})
+        expected = Cosmetics.objects.filter(price__gte=150, price__lte=200, title__icontains="lipstick")
+        self.assertEqual(sorted(item["id"] for item in items), sorted(expected.values_list("id", flat=True)))
+        self.assertTrue(all(item["title"].startswith("Lipstick") for item in items))
+
+    def test_bad_params(self):
+        for params in ({"min_price": "cheap"}, {"max_price": "NaN"}, {"cursor": "garbage"}):
+            with self.subTest(params=params):
+                self.assertIn(self.client.get(self.url, params).status_code, (400, 404))
+
+    def test_cached_until_cosmetics_change(self):
+        first = self.client.get(self.url, {"page_size": 5})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, {"page_size": 5})["X-Cache"], "HIT")
+
+        cheapest = Cosmetics.objects.order_by("price", "id").first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Cosmetics.objects.create(title="Balm", description="d", image="cosmetics_images/b.jpg", price=1)
+        response = self.client.get(self.url, {"page_size": 5}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"][0]["title"], "Balm")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Cosmetics.objects.get(title="Balm").delete()
+        self.assertEqual(self.client.get(self.url, {"page_size": 5}).json()["data"][0]["id"], cheapest.pk)
+
+
+class CartSummaryTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(12, variants_per_product=2)
+        self.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+        self.cart = Cart.objects.create(user=self.user)
+        self.variants = list(ProductVariant.objects.order_by("pk"))
+        self.client.force_authenticate(self.user)
+        self.url = reverse("cart_detail")
+
+    def fill(self, count):
+        CartItem.objects.bulk_create([
+            CartItem(cart=self.cart, variant=variant, quantity=n % 3 + 1)
+            for n, variant in enumerate(self.variants[:count])
+        ])
+
+    def test_query_count_is_constant(self):
+        for count in (1, 20):
+            CartItem.objects.all().delete()
+            self.fill(count)
+            with self.subTest(count=count), self.assertNumQueries(2):
+                data = self.client.get(self.url).json()
+            self.assertEqual(len(data["items"]), count)
+
+    def test_totals_computed_in_sql(self):
+        self.fill(6)
+        data = self.client.get(self.url).json()
+        items = CartItem.objects.select_related("variant").order_by("pk")
+        self.assertEqual([item["total_price"] for item in data["items"]], [float(i.total_price) for i in items])
+        self.assertEqual(data["cart_total"], float(sum(i.total_price for i in items)))
+        self.assertEqual(data["items"][0]["product_image"], "http://testserver/media/product_images/p0.jpg")
+
+    def test_low_stock_flagged(self):
+        self.fill(3)
+        self.assertFalse(self.client.get(self.url).json()["has_low_stock"])
+        short = CartItem.objects.order_by("pk")[1]
+        ProductVariant.objects.filter(pk=short.variant_id).update(stock=short.quantity - 1)
+
+        data = self.client.get(self.url).json()
+        self.assertTrue(data["has_low_stock"])
+        self.assertEqual([item["low_stock"] for item in data["items"]], [False, True, False])
+
+    def test_empty_and_new_cart(self):
+        self.assertEqual(self.client.get(self.url).json()["cart_total"], 0)
+        self.client.force_authenticate(User.objects.create_user("new", "new@example.com", "pw"))
+        data = self.client.get(self.url).json()
+        self.assertEqual((data["items"], data["cart_total"], data["has_low_stock"]), ([], 0, False))
+
+    def test_matches_serializer_data(self):
+        self.fill(5)
+        cart = CartSerializer.setup_eager_loading(Cart.objects.all()).get(pk=self.cart.pk)
+        request = Request(APIRequestFactory().get(self.url))
+        serializer = CartSerializer(cart, context={"request": request})
+        self.assertEqual(dumps(fast_representation(serializer)), JSONRenderer().render(serializer.data))
+
+
+class CartBatchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(30, variants_per_product=1)
+        self.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+        self.variants = list(ProductVariant.objects.order_by("pk"))
+        self.client.force_authenticate(self.user)
+        self.url = reverse("cart_batch")
+
+    def batch(self, *operations):
+        return self.client.post(self.url, {"operations": list(operations)}, format="json")
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list("variant_id", "quantity"))
+
+    def test_operations_applied_in_order(self):
+        a, b, c, d = (v.pk for v in self.variants[:4])
+        self.batch({"op": "add", "variant_id": a, "quantity": 2}, {"op": "add", "variant_id": c})
+        response = self.batch(
+            {"op": "add", "variant_id": a, "quantity": 3},
+            {"op": "set", "variant_id": b, "quantity": 4},
+            {"op": "remove", "variant_id": c},
+            {"op": "add", "variant_id": d},
+            {"op": "set", "variant_id": d, "quantity": 0},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {a: 5, b: 4})
+        data = response.json()
+        self.assertEqual([item["variant"]["id"] for item in data["items"]], [a, b])
+        self.assertEqual(data["cart_total"], float(5 * self.variants[0].price + 4 * self.variants[1].price))
+
+    def test_restore_is_constant_queries(self):
+        operations = [{"op": "set", "variant_id": v.pk, "quantity": 2} for v in self.variants]
+        Cart.objects.create(user=self.user)
+        with CaptureQueriesContext(connection) as small:
+            self.batch(*operations[:2])
+        CartItem.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.batch(*operations).status_code, 200)
+        # cart, lock, current items, stock check, bulk insert, then the cart
+        # response: the same statements for 2 lines as for 30
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(self.quantities()), 30)
+
+    def test_stock_failure_applies_nothing(self):
+        a, b = self.variants[0].pk, self.variants[1].pk
+        self.batch({"op": "set", "variant_id": a, "quantity": 1})
+        response = self.batch(
+            {"op": "set", "variant_id": a, "quantity": 3},
+            {"op": "add", "variant_id": b, "quantity": 8},
+            {"op": "add", "variant_id": b, "quantity": 3},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["items"], [{"variant_id": b, "requested": 11, "stock": 10}])
+        self.assertEqual(self.quantities(), {a: 1})
+
+    def test_unknown_variant(self):
+        response = self.batch({"op": "add", "variant_id": 999999})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["variant_ids"], [999999])
+        # removing something that isn't there is fine
+        self.assertEqual(self.batch({"op": "remove", "variant_id": 999999}).status_code, 200)
+
+    def test_invalid_payload(self):
+        for payload in (
+            {},
+            {"operations": []},
+            {"operations": [{"op": "explode", "variant_id": 1}]},
+            {"operations": [{"op": "set", "variant_id": 1}]},
+            {"operations": [{"op": "add", "variant_id": 1, "quantity": 0}]},
+            {"operations": [{"op": "add", "variant_id": 1}] * 101},
+        ):
+            with self.subTest(payload=str(payload)[:60]):
+                self.assertEqual(self.client.post(self.url, payload, format="json").status_code, 400)
+
+    def test_requires_login(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.batch({"op": "add", "variant_id": self.variants[0].pk}).status_code, 401)
+
+
+class CartWriteTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        make_catalog(2, variants_per_product=1)
+        self.variant = ProductVariant.objects.order_by("pk").first()
+        self.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+        self.client.force_authenticate(self.user)
+
+    def add(self, quantity):
+        return self.client.post(reverse("add_to_cart"), {"variant_id": self.variant.pk, "quantity": quantity})
+
+    def test_add_is_a_conditional_update(self):
+        self.assertEqual(self.add(4).json()["rows_affected"], 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add(5)
+        self.assertEqual(response.json()["rows_affected"], 1)
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("EXISTS", updates[0])
+        self.assertEqual(CartItem.objects.get().quantity, 9)
+
+        response = self.add(2)
+        self.assertEqual((response.status_code, response.json()["rows_affected"]), (400, 0))
+        self.assertEqual(CartItem.objects.get().quantity, 9)
+
+    def test_update_checks_stock_in_the_update(self):
+        self.add(1)
+        item = CartItem.objects.get()
+        url = reverse("update_cart_quantity")
+        self.assertEqual(self.client.post(url, {"item_id": item.pk, "quantity": 10}).json()["rows_affected"], 1)
+        self.assertEqual(self.client.post(url, {"item_id": item.pk, "quantity": 11}).status_code, 400)
+        self.assertEqual(CartItem.objects.get().quantity, 10)
+        self.assertEqual(self.client.post(url, {"item_id": item.pk + 100, "quantity": 1}).status_code, 404)
+
+        other = User.objects.create_user("other", "other@example.com", "pw")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.post(url, {"item_id": item.pk, "quantity": 1}).status_code, 404)
+        self.client.force_authenticate(self.user)
+
+        self.assertEqual(self.client.post(url, {"item_id": item.pk, "quantity": 0}).json()["rows_affected"], 1)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_bad_quantity(self):
+        for quantity in ("many", 0, -2):
+            with self.subTest(quantity=quantity):
+                self.assertEqual(self.add(quantity).status_code, 400)
+
+
+@override_settings(STORAGES=TEST_STORAGES, MEDIA_ROOT=tempfile.gettempdir())
+class CartConcurrencyTests(TransactionTestCase):
+    """Concurrent writes from many threads, each on its own connection."""
+    THREADS = 16
+    ADDS = 300
+
+    def setUp(self):
+        cache.clear()
+        make_catalog(2, variants_per_product=1)
+        self.variants = list(ProductVariant.objects.order_by("pk"))
+        self.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+
+    def run_concurrently(self, calls):
+        def run(call):
+            try:
+                return call()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            return list(pool.map(run, calls))
+
+    def post(self, url, data):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.post(url, data).status_code
+
+    def quantity(self, variant):
+        return CartItem.objects.get(variant=variant).quantity
+
+    def test_concurrent_adds_are_exact(self):
+        ProductVariant.objects.filter(pk=self.variants[0].pk).update(stock=10_000)
+        Cart.objects.create(user=self.user)
+        url = reverse("add_to_cart")
+        calls = [
+            (lambda variant: lambda: self.post(url, {"variant_id": variant.pk, "quantity": 2}))(variant)
+            for variant in (self.variants[0],)
+        ] * self.ADDS
+        statuses = self.run_concurrently(calls)
+        self.assertEqual(statuses, [200] * self.ADDS)
+        self.assertEqual(self.quantity(self.variants[0]), 2 * self.ADDS)
+
+    def test_concurrent_adds_never_exceed_stock(self):
+        stock = 50
+        ProductVariant.objects.filter(pk=self.variants[1].pk).update(stock=stock)
+        Cart.objects.create(user=self.user)
+        url = reverse("add_to_cart")
+        calls = [lambda: self.post(url, {"variant_id": self.variants[1].pk, "quantity": 1})] * 200
+        statuses = self.run_concurrently(calls)
+        self.assertEqual(statuses.count(200), stock)
+        self.assertEqual(self.quantity(self.variants[1]), stock)
+
+
+REDIS_CARTS = {"CART_STORAGE": "redis", "CART_REDIS_URL": None}
+
+
+class LocalRedisTests(TestCase):
+    def test_watch_fails_the_transaction_on_change(self):
+        client = LocalRedis()
+        client.hset("h", mapping={"a": 1})
+        with client.pipeline() as pipe:
+            pipe.watch("h")
+            self.assertEqual(pipe.hget("h", "a"), "1")
+            client.hset("h", "a", 3)
+            pipe.multi()
+            pipe.hset("h", "a", 5)
+            with self.assertRaises(WatchError):
+                pipe.execute()
+        self.assertEqual(client.hgetall("h"), {"a": "3"})
+
+        with client.pipeline() as pipe:
+            pipe.watch("h")
+            pipe.multi()
+            pipe.hset("h", "b", 1)
+            pipe.sadd("s", 1, 2)
+            self.assertEqual(pipe.execute(), [1, 2])
+
+    def test_expiry(self):
+        client = LocalRedis()
+        client.set("k", 1, ex=60)
+        self.assertEqual(client.get("k"), "1")
+        with mock.patch("app.cartstore.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(client.get("k"))
+            self.assertTrue(client.set("k", 2, nx=True))
+
+
+@override_settings(**REDIS_CARTS)
+class RedisCartTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        cart_store().client.flushall()
+        make_catalog(4, variants_per_product=1)
+        self.variants = [variant.pk for variant in ProductVariant.objects.order_by("pk")]
+        self.user = User.objects.create_user("shopper", "shopper@example.com", "pw")
+        self.client.force_authenticate(self.user)
+
+    def run_script(self, user):
+        """The same requests in either storage mode; [(status, body)]."""
+        client = APIClient()
+        client.force_authenticate(user)
+        a, b, c, d = self.variants
+        responses = []
+
+        def call(name, data):
+            response = client.post(reverse(name), data, format="json")
+            responses.append((response.status_code, response.json()))
+
+        def item(variant_id):
+            items = client.get(reverse("cart_detail")).json()["items"]
+            return next(item["id"] for item in items if item["variant"]["id"] == variant_id)
+
+        call("add_to_cart", {"variant_id": a, "quantity": 2})
+        call("add_to_cart", {"variant_id": a, "quantity": 3})
+        call("add_to_cart", {"variant_id": b})
+        call("add_to_cart", {"variant_id": c, "quantity": 4})
+        call("add_to_cart", {"variant_id": a, "quantity": 6})
+        call("add_to_cart", {"variant_id": 10 ** 6})
+        call("update_cart_quantity", {"item_id": item(b), "quantity": 7})
+        call("update_cart_quantity", {"item_id": item(b), "quantity": 11})
+        call("remove_cart_item", {"item_id": item(c)})
+        call("remove_cart_item", {"item_id": 10 ** 6})
+        call("cart_batch", {"operations": [
+            {"op": "add", "variant_id": d, "quantity": 2},
+            {"op": "set", "variant_id": a, "quantity": 1},
+            {"op": "remove", "variant_id": b},
+        ]})
+        call("cart_batch", {"operations": [{"op": "add", "variant_id": d, "quantity": 9}]})
+        call("update_cart_quantity", {"item_id": item(a), "quantity": 0})
+        call("add_to_cart", {"variant_id": c})
+        call("cart_batch", {"operations": [{"op": "add", "variant_id": a}]})
+        responses.append((200, client.get(reverse("cart_detail")).json()))
+        return responses
+
+    @staticmethod
+    def without_ids(responses):
+        for status_code, body in responses:
+            if "items" in body:
+                body["id"] = None
+                for item in body["items"]:
+                    item["id"] = None
+        return responses
+
+    def test_endpoints_match_database_mode(self):
+        redis_responses = self.run_script(self.user)
+        other = User.objects.create_user("other", "other@example.com", "pw")
+        with self.settings(CART_STORAGE="database"):
+            database_responses = self.run_script(other)
+        self.assertEqual(self.without_ids(redis_responses), self.without_ids(database_responses))
+        a, b, c, d = self.variants
+        self.assertEqual(
+            [item["variant"]["id"] for item in redis_responses[-1][1]["items"]], [d, c, a]
+        )
+
+    def test_flush_writes_the_rows(self):
+        self.run_script(self.user)
+        served = self.client.get(reverse("cart_detail")).json()
+        self.assertEqual(cart_store().flush_dirty(), 1)
+        self.assertEqual(cart_store().flush_dirty(), 0)
+        with self.settings(CART_STORAGE="database"):
+            self.assertEqual(self.client.get(reverse("cart_detail")).json(), served)
+        # removed lines are dropped from the hash once their rows are gone
+        fields = cart_store().client.hgetall(f"cart:{self.user.pk}")
+        self.assertIn(f"q:{self.variants[0]}", fields)
+        self.assertNotIn(f"q:{self.variants[1]}", fields)
+
+    def test_quantity_changes_stay_in_redis(self):
+        a = self.variants[0]
+        self.client.post(reverse("add_to_cart"), {"variant_id": a, "quantity": 1})
+        cart_store().flush_dirty()
+        item = CartItem.objects.get()
+
+        # the variant's stock is the only query
+        with self.assertNumQueries(1):
+            self.client.post(reverse("add_to_cart"), {"variant_id": a, "quantity": 2})
+        with self.assertNumQueries(1):
+            self.client.post(reverse("update_cart_quantity"), {"item_id": item.pk, "quantity": 5})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse("cart_detail")).json()["items"][0]["quantity"], 5)
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+
+        cart_store().flush_dirty()
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+        self.client.post(reverse("remove_cart_item"), {"item_id": item.pk})
+        self.assertTrue(CartItem.objects.exists())
+        cart_store().flush_dirty()
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_new_lines_inserted_in_one_batch(self):
+        a, b, c, d = self.variants
+        self.client.post(reverse("add_to_cart"), {"variant_id": a})
+
+        def batch_queries(*variant_ids):
+            operations = [{"op": "add", "variant_id": v} for v in variant_ids]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(reverse("cart_batch"), {"operations": operations}, format="json")
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(batch_queries(b), batch_queries(c, d))
+        self.assertEqual(
+            list(CartItem.objects.order_by("pk").values_list("variant_id", flat=True)), [a, b, c, d]
+        )
+
+    def test_cart_loaded_from_rows(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, variant_id=self.variants[2], quantity=3)
+        with self.settings(CART_STORAGE="database"):
+            expected = self.client.get(reverse("cart_detail")).json()
+        self.assertEqual(self.client.get(reverse("cart_detail")).json(), expected)
+
+    def test_checkout_flushes_and_clears(self):
+        a, b = self.variants[:2]
+        self.client.post(reverse("add_to_cart"), {"variant_id": a, "quantity": 2})
+        self.client.post(reverse("add_to_cart"), {"variant_id": b, "quantity": 3})
+        self.client.post(reverse("add_to_cart"), {"variant_id": a, "quantity": 1})
+        address = Address.objects.create(user=self.user, line1="1 Main St", city="Kochi", postal_code="682001")
+        PaymentTransaction.objects.create(
+            user=self.user, razorpay_order_id="order_1", amount=Decimal("10"),
+            shipping_address_id=address.pk, billing_address_id=address.pk,
+        )
+        with mock.patch("app.views.razorpay.Client"), mock.patch("app.views.send_order_success_email"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("verify_payment"), {
+                "razorpay_order_id": "order_1", "razorpay_payment_id": "pay", "razorpay_signature": "sig",
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(OrderItem.objects.values_list("variant_id", "quantity")), {a: 3, b: 3}
+        )
+        self.assertFalse(CartItem.objects.exists())
+        cart_store().flush_dirty()
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get(reverse("cart_detail")).json()["items"], [])
+
+
+@override_settings(**REDIS_CARTS)
+class RedisCartConcurrencyTests(CartConcurrencyTests):
+    def setUp(self):
+        super().setUp()
+        cart_store().client.flushall()
+
+    def quantity(self, variant):
+        cart_store().flush_dirty()
+        return super().quantity(variant)
@@ -3,8 +3,11 @@ from . import views
 
 urlpatterns = [
     path('', views.home.as_view()),
+    path('bootstrap/', views.bootstrap_view.as_view(), name='bootstrap'),
     path('salons/', views.salons_view.as_view()),
+    path('salons/nearby/', views.salons_nearby_view.as_view(), name='salons-nearby'),
     path('salons/<int:id>/', views.salons_detail_view.as_view()),
+    path('salons/<int:id>/gallery/', views.salon_gallery_view.as_view(), name='salon-gallery'),
     path('cosmetics/', views.cosmetics_view.as_view()),
     path('event-hall/', views.event_hall_view.as_view()),
     path('food-court/', views.food_court_view.as_view()),
@@ -27,12 +30,16 @@ urlpatterns = [
 
     path("products/", views.ProductListAPIView.as_view(), name="product-list"),
     path('products/<int:pk>/', views.ProductDetailAPIView.as_view(), name='product-detail'),
+    path('products/batch/', views.ProductBatchAPIView.as_view(), name='product-batch'),
+    path('products/suggest/', views.ProductSuggestAPIView.as_view(), name='product-suggest'),
+    path('products/cache-stats/', views.CatalogCacheStatsView.as_view(), name='catalog-cache-stats'),
 
 
     path('cart/add/', views.AddToCartView.as_view(), name='add_to_cart'),
     path('cart/', views.CartDetailView.as_view(), name='cart_detail'),
     path('cart/update/', views.UpdateCartQuantityView.as_view(), name='update_cart_quantity'),
     path('cart/remove/', views.RemoveCartItemView.as_view(), name='remove_cart_item'),
+    path('cart/batch/', views.CartBatchView.as_view(), name='cart_batch'),
 
 
     # ---------------- Wishlist -----------------
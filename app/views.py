@@ -1,11 +1,11 @@
 # views.py
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
-from .models import BannerImage,Saloon,FoodMenu,Courses,Cart,CartItem,Category,Product,ProductVariant,Wishlist,WishlistItem,PasswordResetOTP
-from .serializers import BannerImageSerializer,SaloonSerializer,FoodMenuSerializer,CourseSerializer,CartItemSerializer,CartSerializer
+from .models import Saloon,Cosmetics,Cart,CartItem,Category,Product,ProductVariant,Wishlist,WishlistItem,PasswordResetOTP
+from .serializers import FIELDSET_PARAMS, SaloonSerializer,SaloonListSerializer,SaloonImageSerializer,CosmeticsSerializer,CartItemSerializer,CartSerializer,CartBatchSerializer,CartOperationSerializer
 
 from rest_framework import permissions
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from .serializers import (
     SignupSerializer,
     LoginSerializer,
@@ -26,16 +26,29 @@ from .models import Category, Product, ProductVariant,WishlistItem,Wishlist,Orde
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView
 from rest_framework import status
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
 from django.conf import settings
 import razorpay
 from django.shortcuts import get_object_or_404
 from .email import send_password_reset_otp_email
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 import random
 import string
 from django.contrib.auth.models import User
+from .cache import BANNER, SALONS, FOOD, COURSES, COSMETICS, CATALOG, bump_cache_version, versioned_response, get_cache_stats
+from .fastpath import fast_representation, iter_representation, paginate_representation
+from .renderers import STREAM_CHUNK_SIZE, StreamingJSONResponse, wants_streaming
+from .bootstrap import bootstrap_response
+from .cartstore import CartConflict, cart_store
+from .pagination import CosmeticsCursorPagination, SalonGalleryPagination
+from .geo import salon_locator
+from .snapshots import (
+    academy_page, food_court_page, home_page, salon_detail_page, salons_page, snapshot_response,
+)
 
 
 
@@ -44,17 +57,21 @@ class home(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        latest_image = BannerImage.objects.order_by('-uploaded_at').first()
-        serializer = (
-            BannerImageSerializer(latest_image, context={'request': request})
-            if latest_image else None
+        return versioned_response(
+            request, BANNER, "home", lambda: self.build(request),
+            params=FIELDSET_PARAMS, cache_data=False,
         )
 
-        return Response({
-            "page": "Home",
-            "content": "This is the Home page.",
-            "video": serializer.data if serializer else None
-        })
+    def build(self, request):
+        return snapshot_response(request, BANNER, "home") or Response(home_page(request))
+
+
+class bootstrap_view(APIView):
+    """Banner, salons, courses, food, categories and the first product page."""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return bootstrap_response(request)
 
 
 # --------------------------------------------------
@@ -65,25 +82,88 @@ class salons_view(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        salon = Saloon.objects.all()
-        serializer = SaloonSerializer(salon, many=True, context={'request': request})
+        return versioned_response(
+            request, SALONS, "salons", lambda: self.build(request),
+            params=FIELDSET_PARAMS, cache_data=False,
+        )
 
-        return Response({
-            "page": "Salons page",
-            "data": serializer.data
-        })
+    def build(self, request):
+        return snapshot_response(request, SALONS, "salons") or Response(salons_page(request))
 
 
 class salons_detail_view(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, id):
-        salon = get_object_or_404(Saloon, id=id)
-        serializer = SaloonSerializer(salon, context={'request': request})
+        return versioned_response(
+            request, SALONS, "salon-detail", lambda: self.build(request, id),
+            params=FIELDSET_PARAMS, cache_data=False, id=id,
+        )
+
+    def build(self, request, id):
+        response = snapshot_response(request, SALONS, f"salon:{id}")
+        if response is not None:
+            return response
+        salon = get_object_or_404(SaloonSerializer.setup_eager_loading(Saloon.objects.all()), id=id)
+        return Response(salon_detail_page(request, salon))
+
+
+class salon_gallery_view(APIView):
+    """The salon's photos, a page at a time (?page=&page_size=)."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, id):
+        return versioned_response(
+            request, SALONS, "salon-gallery", lambda: self.build(request, id),
+            params=("page", "page_size", *FIELDSET_PARAMS), id=id,
+        )
+
+    def build(self, request, id):
+        salon = get_object_or_404(Saloon.objects.only("id"), id=id)
+        paginator = SalonGalleryPagination()
+        serializer = SaloonImageSerializer(salon.gallery.all(), many=True, context={'request': request})
+        data = paginate_representation(serializer, paginator, request, view=self)
+        return paginator.get_paginated_response(data)
 
+
+class salons_nearby_view(APIView):
+    """?lat=&lng=&limit= -> the closest salons, nearest first."""
+    permission_classes = [AllowAny]
+    default_limit = 5
+    max_limit = 50
+
+    def get(self, request):
+        return versioned_response(
+            request, SALONS, "salons-nearby", lambda: self.build(request),
+            params=("lat", "lng", "limit"), cache_data=False,
+        )
+
+    def build(self, request):
+        try:
+            lat = float(request.GET["lat"])
+            lng = float(request.GET["lng"])
+        except (KeyError, ValueError):
+            return Response({"error": "lat and lng are required numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({"error": "lat/lng out of range"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.GET.get("limit", self.default_limit))
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), self.max_limit)
+
+        nearest = salon_locator.nearest(lat, lng, limit)
+        salons = SaloonListSerializer.setup_eager_loading(Saloon.objects.all()).in_bulk([pk for pk, _ in nearest])
+        # a salon deleted since the index was built is just skipped
+        nearest = [(salons[pk], distance) for pk, distance in nearest if pk in salons]
+        serializer = SaloonListSerializer([salon for salon, _ in nearest], many=True, context={'request': request})
+
+        data = fast_representation(serializer)
+        for item, (_, distance) in zip(data, nearest):
+            item["distance_km"] = round(distance, 3)
         return Response({
-            "page": "Salon Detail",
-            "data": serializer.data
+            "page": "Nearby Salons",
+            "data": data
         })
 
 
@@ -95,26 +175,20 @@ class Food_menu_view(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        food_items = FoodMenu.objects.all()
-        serializer = FoodMenuSerializer(food_items, many=True, context={'request': request})
-
-        return Response({
-            "page": "Food Menu",
-            "data": serializer.data
-        })
+        return Response(food_court_page(request))
 
 
 class food_court_view(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        food_items = FoodMenu.objects.all()
-        serializer = FoodMenuSerializer(food_items, many=True, context={'request': request})
+        return versioned_response(
+            request, FOOD, "food-court", lambda: self.build(request),
+            params=FIELDSET_PARAMS, cache_data=False,
+        )
 
-        return Response({
-            "page": "Food Menu",
-            "data": serializer.data
-        })
+    def build(self, request):
+        return snapshot_response(request, FOOD, "food-court") or Response(food_court_page(request))
 
 
 # --------------------------------------------------
@@ -122,12 +196,46 @@ class food_court_view(APIView):
 # --------------------------------------------------
 
 class cosmetics_view(APIView):
+    """
+    Cosmetics catalog: ?min_price=&max_price=&search=&sort=price|-price,
+    a page at a time (?cursor=&page_size=).
+    """
     permission_classes = [AllowAny]
+    cache_params = (
+        "min_price", "max_price", "search", "sort", "cursor", "page_size", *FIELDSET_PARAMS,
+    )
 
     def get(self, request):
+        return versioned_response(
+            request, COSMETICS, "cosmetics", lambda: self.build(request), params=self.cache_params,
+        )
+
+    def build(self, request):
+        cosmetics = Cosmetics.objects.all()
+        for param, lookup in (("min_price", "price__gte"), ("max_price", "price__lte")):
+            value = request.GET.get(param)
+            if not value:
+                continue
+            try:
+                value = Decimal(value)
+            except InvalidOperation:
+                value = None
+            if value is None or not value.is_finite():
+                return Response({"error": f"{param} must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+            cosmetics = cosmetics.filter(**{lookup: value})
+
+        search = request.GET.get("search", "").strip()
+        if search:
+            cosmetics = cosmetics.filter(title__icontains=search)
+
+        paginator = CosmeticsCursorPagination()
+        serializer = CosmeticsSerializer(cosmetics, many=True, context={'request': request})
+        data = paginate_representation(serializer, paginator, request, view=self)
         return Response({
             "page": "Cosmetics",
-            "content": "This is the Cosmetics page."
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "data": data,
         })
 
 
@@ -199,15 +307,13 @@ class academy_view(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        courses = Courses.objects.all()
-        course_serializer = CourseSerializer(
-            courses, many=True, context={"request": request}
+        return versioned_response(
+            request, COURSES, "academy", lambda: self.build(request),
+            params=FIELDSET_PARAMS, cache_data=False,
         )
 
-        return Response({
-            "page": "course",
-            "data": course_serializer.data
-        })
+    def build(self, request):
+        return snapshot_response(request, COURSES, "academy") or Response(academy_page(request))
 
 
 
@@ -221,6 +327,8 @@ class academy_view(APIView):
 
 class SignupView(APIView):
     permission_classes = [permissions.AllowAny]
+    # the body carries the auth token; keep it out of BREACH reach
+    compress_response = False
 
     def post(self, request):
         serializer = SignupSerializer(data=request.data)
@@ -236,6 +344,8 @@ class SignupView(APIView):
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    # the body carries the auth token; keep it out of BREACH reach
+    compress_response = False
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
@@ -334,12 +444,26 @@ class UserProfileView(APIView):
 
 
 
-from django.db.models import Min, Q
+from django.db.models import Q
+from .pagination import ProductCursorPagination, SearchResultsPagination
+from .search import search_products, uses_postgres_search
+from .facets import compute_product_facets
+from .suggest import suggest_index
 
 class ProductListAPIView(APIView):
     permission_classes = [AllowAny]
+    cache_params = (
+        "category", "min_price", "max_price", "search", "cursor", "page_size", *FIELDSET_PARAMS,
+    )
 
     def get(self, request):
+        # streamed bodies can't be cached, but still revalidate via ETag
+        return versioned_response(
+            request, CATALOG, "product-list", lambda: self.list_products(request),
+            params=self.cache_params, cache_data=not wants_streaming(request),
+        )
+
+    def list_products(self, request):
         category_name = request.GET.get("category")
         min_price = request.GET.get("min_price")
         max_price = request.GET.get("max_price")
@@ -351,20 +475,63 @@ class ProductListAPIView(APIView):
         if category_name and category_name.lower() != "all":
             products = products.filter(category__name__iexact=category_name)
 
-        if search:
-            products = products.filter(title__icontains=search)
-
-        products = products.annotate(
-            lowest_price=Min("variants__price")
-        )
-
+        # lowest_price is denormalized onto Product (see app.signals)
         if min_price:
             products = products.filter(lowest_price__gte=min_price)
 
         if max_price:
             products = products.filter(lowest_price__lte=max_price)
 
-        products = products.distinct().order_by("-created_at")
+        products = products.order_by("-created_at")
+
+        # Full-text + trigram on Postgres, icontains elsewhere; ranked by relevance
+        if search:
+            products = search_products(products, search)
+
+        filtered_products = products
+
+        products = ProductListSerializer.setup_eager_loading(
+            products, ProductListSerializer.fields_for_request(request)
+        )
+
+        # Cursor mode (?page_size= / ?cursor=); without it the full list is returned.
+        # Ranked search results page in relevance order, not by created_at.
+        if search and uses_postgres_search():
+            paginator = SearchResultsPagination()
+        else:
+            paginator = ProductCursorPagination()
+        if paginator.is_requested(request):
+            serializer = ProductListSerializer(products, many=True, context={"request": request})
+            page = paginate_representation(serializer, paginator, request, view=self)
+            data = {
+                "next": paginator.get_next_link(),
+                "previous": paginator.get_previous_link(),
+                "products": page,
+            }
+            if paginator.is_first_page:
+                data["categories"] = CategorySerializer(Category.objects.all(), many=True).data
+                data["facets"] = compute_product_facets(filtered_products)
+            return Response(data, status=status.HTTP_200_OK)
+
+        categories = Category.objects.all()
+        category_serializer = CategorySerializer(categories, many=True)
+
+        # ?stream=1: full catalog dump, rendered chunk by chunk
+        if wants_streaming(request):
+            serializer = ProductListSerializer(
+                products.iterator(chunk_size=STREAM_CHUNK_SIZE),
+                many=True,
+                context={"request": request}
+            )
+            return StreamingJSONResponse(
+                iter_representation(serializer),
+                data={
+                    "products": None,
+                    "categories": category_serializer.data,
+                    "facets": compute_product_facets(filtered_products),
+                },
+                key="products",
+            )
 
         serializer = ProductListSerializer(
             products,
@@ -372,13 +539,11 @@ class ProductListAPIView(APIView):
             context={"request": request}
         )
 
-        categories = Category.objects.all()
-        category_serializer = CategorySerializer(categories, many=True)
-
         return Response(
             {
-                "products": serializer.data,
+                "products": fast_representation(serializer),
                 "categories": category_serializer.data,
+                "facets": compute_product_facets(filtered_products),
             },
             status=status.HTTP_200_OK,
         )
@@ -391,46 +556,175 @@ class ProductDetailAPIView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, pk):
+        return versioned_response(
+            request, CATALOG, "product-detail", lambda: self.retrieve_product(request, pk),
+            params=FIELDSET_PARAMS, pk=pk,
+        )
+
+    def retrieve_product(self, request, pk):
         try:
-            product = Product.objects.get(pk=pk)
+            product = ProductDetailSerializer.setup_eager_loading(
+                Product.objects.all(), ProductDetailSerializer.fields_for_request(request)
+            ).get(pk=pk)
             serializer = ProductDetailSerializer(product, context={'request': request})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except Product.DoesNotExist:
             return Response({"detail": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class ProductBatchAPIView(APIView):
+    permission_classes = [AllowAny]
+    max_ids = 100
+
+    def get(self, request):
+        try:
+            ids = [int(i) for i in request.GET.get("ids", "").split(",") if i.strip()]
+        except ValueError:
+            return Response({"error": "ids must be a comma-separated list of integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not ids:
+            return Response({"error": "ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = list(dict.fromkeys(ids))  # drop duplicates, keep request order
+        if len(ids) > self.max_ids:
+            return Response({"error": f"At most {self.max_ids} ids per request"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return versioned_response(
+            request, CATALOG, "product-batch", lambda: self.retrieve_products(request, ids),
+            params=FIELDSET_PARAMS, ids=",".join(map(str, ids)),
+        )
+
+    def retrieve_products(self, request, ids):
+        products = ProductListSerializer.setup_eager_loading(
+            Product.objects.filter(pk__in=ids), ProductListSerializer.fields_for_request(request)
+        )
+        by_id = {product.pk: product for product in products}
+
+        serializer = ProductListSerializer(
+            [by_id[i] for i in ids if i in by_id],
+            many=True,
+            context={"request": request}
+        )
+        return Response(
+            {
+                "products": serializer.data,
+                "missing": [i for i in ids if i not in by_id],
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class ProductSuggestAPIView(APIView):
+    permission_classes = [AllowAny]
+    default_limit = 10
+    max_limit = 20
+
+    def get(self, request):
+        query = request.GET.get("q", "")
+        try:
+            limit = min(max(int(request.GET.get("limit", self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+
+        return Response(
+            {
+                "query": query,
+                "suggestions": suggest_index.search(query, limit),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_cache_stats(CATALOG), status=status.HTTP_200_OK)
         
 
 
 
+def _stock_allows(quantity):
+    """
+    Filter for CartItem rows whose variant has stock for `quantity` (an
+    int or an expression over the row). A correlated EXISTS rather than a
+    join, so it stays in the UPDATE's own WHERE clause and is re-checked
+    against the latest row version when a concurrent write got there first.
+    """
+    return Exists(ProductVariant.objects.filter(pk=OuterRef("variant_id"), stock__gte=quantity))
+
+
+def add_to_cart(cart, variant_id, quantity, attempts=3):
+    """
+    Add `quantity` of a variant to the cart without a read-modify-write:
+
+        UPDATE cartitem SET quantity = quantity + n
+        WHERE cart_id = ... AND variant_id = ... AND <stock >= quantity + n>
+
+    and insert the line (with the variant row locked) when there is none
+    yet. Returns the number of rows affected; 0 means the stock doesn't
+    allow it.
+    """
+    items = CartItem.objects.filter(cart=cart, variant_id=variant_id)
+    line_exists = False
+    for _ in range(attempts):
+        updated = items.filter(_stock_allows(OuterRef("quantity") + quantity)).update(
+            quantity=F("quantity") + quantity
+        )
+        if updated or line_exists:
+            # the line was there before the UPDATE: 0 rows is the stock check
+            return updated
+        if items.exists():
+            # inserted by a concurrent request after the UPDATE: run it again
+            line_exists = True
+            continue
+        try:
+            with transaction.atomic():
+                stock = ProductVariant.objects.select_for_update().values_list("stock", flat=True).get(pk=variant_id)
+                if stock < quantity:
+                    return 0
+                CartItem.objects.create(cart=cart, variant_id=variant_id, quantity=quantity)
+                return 1
+        except IntegrityError:
+            # a concurrent request inserted the line first: add to it instead
+            line_exists = True
+            continue
+    raise CartConflict()
+
+
 class AddToCartView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
         variant_id = request.data.get("variant_id")
-        quantity = int(request.data.get("quantity", 1))
+        try:
+            quantity = int(request.data.get("quantity", 1))
+        except (TypeError, ValueError):
+            return Response({"error": "quantity must be an integer"}, status=400)
+        if quantity < 1:
+            return Response({"error": "quantity must be at least 1"}, status=400)
 
         try:
-            variant = ProductVariant.objects.get(id=variant_id)
-        except ProductVariant.DoesNotExist:
+            variant = ProductVariant.objects.only("pk", "stock").get(id=variant_id)
+        except (ProductVariant.DoesNotExist, ValueError, TypeError):
             return Response({"error": "Variant not found"}, status=404)
 
         if variant.stock < quantity:
             return Response({"error": "Not enough stock"}, status=400)
 
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart_item, item_created = CartItem.objects.get_or_create(
-            cart=cart,
-            variant=variant,
-            defaults={'quantity': quantity}
-        )
-
-        if not item_created:
-            if cart_item.quantity + quantity > variant.stock:
-                return Response({"error": "Stock limit reached"}, status=400)
-
-            cart_item.quantity += quantity
-            cart_item.save()
+        store = cart_store()
+        try:
+            if store is not None:
+                rows = store.add(request.user, variant.pk, quantity, variant.stock)
+            else:
+                cart, created = Cart.objects.get_or_create(user=request.user)
+                rows = add_to_cart(cart, variant.pk, quantity)
+        except CartConflict:
+            return Response({"error": "Cart is being updated, please retry"}, status=409)
+        if not rows:
+            return Response({"error": "Stock limit reached", "rows_affected": 0}, status=400)
 
-        return Response({"message": "Added to cart successfully"}, status=200)
+        return Response({"message": "Added to cart successfully", "rows_affected": rows}, status=200)
 
 
 
@@ -439,24 +733,53 @@ class UpdateCartQuantityView(APIView):
 
     def post(self, request):
         item_id = request.data.get("item_id")
-        quantity = int(request.data.get("quantity"))
+        try:
+            quantity = int(request.data.get("quantity"))
+        except (TypeError, ValueError):
+            return Response({"error": "quantity must be an integer"}, status=400)
 
+        store = cart_store()
+        if store is not None:
+            return self.post_redis(request, store, item_id, quantity)
+
+        cart_id = Cart.objects.filter(user=request.user).values_list("pk", flat=True).first()
         try:
-            cart_item = CartItem.objects.get(id=item_id, cart__user=request.user)
-        except CartItem.DoesNotExist:
+            items = CartItem.objects.filter(id=item_id, cart_id=cart_id)
+            if quantity < 1:
+                deleted, _ = items.delete()
+                if not deleted:
+                    return Response({"error": "Cart item not found"}, status=404)
+                return Response({"message": "Item removed from cart", "rows_affected": deleted}, status=200)
+
+            # set only if the stock covers it, in the same statement
+            updated = items.filter(_stock_allows(quantity)).update(quantity=quantity)
+            if not updated and not items.exists():
+                return Response({"error": "Cart item not found"}, status=404)
+        except (ValueError, TypeError):
             return Response({"error": "Cart item not found"}, status=404)
 
-        if quantity < 1:
-            cart_item.delete()
-            return Response({"message": "Item removed from cart"}, status=200)
+        if not updated:
+            return Response({"error": "Stock limit exceeded", "rows_affected": 0}, status=400)
 
-        if quantity > cart_item.variant.stock:
-            return Response({"error": "Stock limit exceeded"}, status=400)
+        return Response({"message": "Quantity updated successfully", "rows_affected": updated}, status=200)
 
-        cart_item.quantity = quantity
-        cart_item.save()
+    def post_redis(self, request, store, item_id, quantity):
+        variant_id = store.item_variant(request.user, item_id)
+        if variant_id is None:
+            return Response({"error": "Cart item not found"}, status=404)
 
-        return Response({"message": "Quantity updated successfully"}, status=200)
+        if quantity < 1:
+            rows = store.set_quantity(request.user, variant_id, 0)
+        else:
+            stock = ProductVariant.objects.filter(pk=variant_id).values_list("stock", flat=True).first() or 0
+            rows = store.set_quantity(request.user, variant_id, quantity, stock)
+        if rows is None:
+            return Response({"error": "Cart item not found"}, status=404)
+        if quantity < 1:
+            return Response({"message": "Item removed from cart", "rows_affected": rows}, status=200)
+        if not rows:
+            return Response({"error": "Stock limit exceeded", "rows_affected": 0}, status=400)
+        return Response({"message": "Quantity updated successfully", "rows_affected": rows}, status=200)
 
 
 
@@ -469,13 +792,22 @@ class UpdateCartQuantityView(APIView):
 #         serializer = CartSerializer(cart)
 #         return Response(serializer.data)
 
+def cart_data(request):
+    """The user's cart as served by /api/cart/ (two queries, one from Redis)."""
+    store = cart_store()
+    if store is not None:
+        cart = store.cart(request.user)
+    else:
+        cart, created = CartSerializer.setup_eager_loading(Cart.objects.all()).get_or_create(user=request.user)
+    serializer = CartSerializer(cart, context={'request': request})
+    return fast_representation(serializer)
+
+
 class CartDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data)
+        return Response(cart_data(request))
 
         
 
@@ -485,6 +817,13 @@ class RemoveCartItemView(APIView):
     def post(self, request):
         item_id = request.data.get("item_id")
 
+        store = cart_store()
+        if store is not None:
+            variant_id = store.item_variant(request.user, item_id)
+            if variant_id is None or store.set_quantity(request.user, variant_id, 0) is None:
+                return Response({"error": "Item not found"}, status=404)
+            return Response({"message": "Item removed"}, status=200)
+
         try:
             cart_item = CartItem.objects.get(id=item_id, cart__user=request.user)
             cart_item.delete()
@@ -493,6 +832,119 @@ class RemoveCartItemView(APIView):
             return Response({"error": "Item not found"}, status=404)
 
 
+class CartBatchView(APIView):
+    """
+    Apply a list of cart operations atomically:
+
+        {"operations": [
+            {"op": "add", "variant_id": 1, "quantity": 2},
+            {"op": "set", "variant_id": 2, "quantity": 5},
+            {"op": "remove", "variant_id": 3}
+        ]}
+
+    Operations run in order against the current cart ("set" to 0 removes
+    the line); the final quantities are checked against stock with one
+    query and written with bulk_create / bulk_update / one delete (or one
+    MULTI on the cart's hash, see app.cartstore). Returns the resulting
+    cart, or an error with nothing applied.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        operations = serializer.validated_data["operations"]
+        variant_ids = {operation["variant_id"] for operation in operations}
+
+        store = cart_store()
+        try:
+            if store is not None:
+                error = store.update_lines(
+                    request.user, variant_ids, lambda current: self.plan(current, operations)
+                )
+            else:
+                error = self.apply(request, operations, variant_ids)
+        except (IntegrityError, CartConflict):
+            # concurrent writes to the same lines kept winning
+            return Response({"error": "Cart is being updated, please retry"}, status=status.HTTP_409_CONFLICT)
+        if error is not None:
+            return error
+        return Response(cart_data(request), status=status.HTTP_200_OK)
+
+    @staticmethod
+    def plan(current, operations):
+        """
+        ``(final quantities, None)`` of the lines `operations` touch, given
+        the `current` {variant id: quantity} of the cart, or ``(None, error
+        response)`` if a variant is missing or short of stock.
+        """
+        quantities = dict(current)
+        for operation in operations:
+            variant_id = operation["variant_id"]
+            if operation["op"] == CartOperationSerializer.ADD:
+                quantities[variant_id] = quantities.get(variant_id, 0) + operation["quantity"]
+            elif operation["op"] == CartOperationSerializer.SET:
+                quantities[variant_id] = operation["quantity"]
+            else:
+                quantities[variant_id] = 0
+
+        wanted = {variant_id: quantity for variant_id, quantity in quantities.items() if quantity > 0}
+        stock = dict(ProductVariant.objects.filter(pk__in=wanted).values_list("pk", "stock"))
+        missing = sorted(set(wanted) - set(stock))
+        if missing:
+            return None, Response(
+                {"error": "Variant not found", "variant_ids": missing},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        short = [
+            {"variant_id": variant_id, "requested": quantity, "stock": stock[variant_id]}
+            for variant_id, quantity in sorted(wanted.items())
+            if quantity > stock[variant_id]
+        ]
+        if short:
+            return None, Response({"error": "Not enough stock", "items": short}, status=status.HTTP_400_BAD_REQUEST)
+        return quantities, None
+
+    def apply(self, request, operations, variant_ids):
+        """Apply `operations`; returns an error response (nothing applied) or None."""
+        with transaction.atomic():
+            cart, created = Cart.objects.get_or_create(user=request.user)
+            # one batch per cart at a time; the touched lines are locked too,
+            # so single-item conditional UPDATEs wait for the batch to commit
+            cart = Cart.objects.select_for_update().get(pk=cart.pk)
+            items = {
+                item.variant_id: item
+                for item in cart.items.select_for_update().filter(variant_id__in=variant_ids)
+            }
+
+            quantities, error = self.plan(
+                {variant_id: item.quantity for variant_id, item in items.items()}, operations
+            )
+            if error is not None:
+                return error
+
+            to_create, to_update, to_delete = [], [], []
+            for variant_id, quantity in quantities.items():
+                item = items.get(variant_id)
+                if item is None:
+                    if quantity > 0:
+                        to_create.append(CartItem(cart=cart, variant_id=variant_id, quantity=quantity))
+                elif quantity == 0:
+                    to_delete.append(item.pk)
+                elif quantity != item.quantity:
+                    item.quantity = quantity
+                    to_update.append(item)
+
+            if to_delete:
+                CartItem.objects.filter(pk__in=to_delete).delete()
+            if to_update:
+                CartItem.objects.bulk_update(to_update, ["quantity"])
+            if to_create:
+                CartItem.objects.bulk_create(to_create)
+        return None
+
+
 
 
 
@@ -654,7 +1106,10 @@ class CreatePaymentOrderView(APIView):
         else:
             billing_address = shipping_address  # fallback
 
-        # Get cart
+        # Get cart (rows are written behind when carts live in Redis)
+        store = cart_store()
+        if store is not None:
+            store.flush([request.user.pk], wait=True)
         cart, _ = Cart.objects.get_or_create(user=request.user)
         items = cart.items.select_related("variant", "variant__product")
 
@@ -760,6 +1215,10 @@ class VerifyPaymentView(APIView):
         )
 
         # Convert cart items into OrderItems
+        store = cart_store()
+        if store is not None:
+            # kept locked so no background flush writes them back afterwards
+            store.flush([request.user.pk], wait=True, hold=True)
         cart, _ = Cart.objects.get_or_create(user=request.user)
         items = cart.items.select_related("variant", "variant__product")
 
@@ -771,11 +1230,20 @@ class VerifyPaymentView(APIView):
                 unit_price=item.variant.price,
                 total_price=item.total_price,
             )
-            item.variant.stock = max(0, item.variant.stock - item.quantity)
-            item.variant.save(update_fields=["stock"])
+            # decrement in SQL: a concurrent checkout can't overwrite it
+            ProductVariant.objects.filter(pk=item.variant_id).update(
+                stock=Greatest(F("stock") - item.quantity, 0)
+            )
+
+        # update() skips the ProductVariant signals: refresh what they would
+        product_ids = {item.variant.product_id for item in items}
+        Product.refresh_variant_totals(product_ids)
+        transaction.on_commit(lambda: bump_cache_version(CATALOG))
 
         # Clear cart
         items.delete()
+        if store is not None:
+            transaction.on_commit(lambda: store.clear(request.user))
 
         # Update payment transaction
         tx.order = order
@@ -806,9 +1274,19 @@ class OrderListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        orders = Order.objects.filter(user=request.user).order_by("-created_at")
+        orders = OrderListSerializer.setup_eager_loading(
+            Order.objects.filter(user=request.user).order_by("-created_at")
+        )
+
+        # ?stream=1: full order history, rendered chunk by chunk
+        if wants_streaming(request):
+            serializer = OrderListSerializer(
+                orders.iterator(chunk_size=STREAM_CHUNK_SIZE), many=True, context={"request": request}
+            )
+            return StreamingJSONResponse(iter_representation(serializer))
+
         serializer = OrderListSerializer(orders, many=True, context={"request": request})
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(fast_representation(serializer), status=status.HTTP_200_OK)
 
 
 class OrderDetailView(APIView):